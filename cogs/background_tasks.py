@@ -3,15 +3,17 @@ import discord
 from discord.ext import tasks
 from discord.ext.commands import Cog
 from src.bot import Bot
-from datetime import datetime, timedelta, UTC
+from datetime import date, datetime, timedelta, UTC
 import logging
+import time
 from typing import Any, Sequence
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert, Insert
 from aiohttp import ClientResponse
 import feedparser
 import io
-from src.message_queue import QueueMessage
-from src.database import Guild, Mute, Repository, Notification, Poll, NewsPost, Uptime, OSRSItem, RS3Item
+from src.message_queue import MessagePriority, MessageSource, QueueMessage
+from src.database import Guild, NotificationWebhook, Mute, Repository, Notification, Poll, NewsPost, UptimeInterval, UptimeDay, OSRSItem, RS3Item
 from github.Commit import Commit
 from github.Repository import Repository as GitRepository
 from github.AuthenticatedUser import AuthenticatedUser
@@ -20,6 +22,10 @@ from github.PaginatedList import PaginatedList
 from src.runescape_utils import prif_districts
 from src.discord_utils import get_text_channel, find_text_channel, find_guild_text_channel, get_guild_text_channel
 from src.exceptions import PriceTrackingException
+from src.price_store import ItemPrices
+from src.price_writer import PriceWriter
+from src.async_utils import ConcurrencyLimiter
+from src.date_utils import uptime_per_day
 
 class BackgroundTasks(Cog):
     notification_state_initialized: bool = False
@@ -47,9 +53,25 @@ class BackgroundTasks(Cog):
     # Last error, if any. May indicate HTTP status code or exception class name, depending on the type of error. None if no exception occurred in last iteration
     last_error_osrs_price_tracking: str | int | None = None
     last_error_rs3_price_tracking: str | int | None = None
+
+    # Price updates are written to the database in batches
+    osrs_price_writer: PriceWriter
+    rs3_price_writer: PriceWriter
+
+    # Webhooks are created lazily in the background, slowly, as creating them is subject to a strict rate limit
+    webhook_creation: ConcurrencyLimiter
+    pending_webhook_channel_ids: set[int]
+    webhook_avatar: bytes | None = None
+
+    # Maximum time in seconds that a broadcast holds off while the message queue is full, before queuing the rest of its messages anyway
+    max_queue_wait: float = 300
     
     def __init__(self, bot: Bot) -> None:
         self.bot: Bot = bot
+        self.webhook_creation = ConcurrencyLimiter(1, 1)
+        self.pending_webhook_channel_ids = set()
+        self.osrs_price_writer = PriceWriter(bot.db, OSRSItem, 'osrs', bot.cache.osrs_items.get, bot.cache.osrs_item)
+        self.rs3_price_writer = PriceWriter(bot.db, RS3Item, 'rs3', bot.cache.rs3_items.get, bot.cache.rs3_item)
         self.test_notification_channel = get_text_channel(bot, bot.config['testNotificationChannel'])
         self.log_channel = get_text_channel(bot, bot.config['testChannel'])
 
@@ -66,6 +88,10 @@ class BackgroundTasks(Cog):
         self.git_tracking.start()
         self.price_tracking_osrs.start()
         self.price_tracking_rs3.start()
+        self.cache_snapshots.start()
+        # Snapshots of the item caches must not contain price updates that were not written yet
+        self.bot.cache.snapshot_flushers['osrs_items'] = self.osrs_price_writer.flush
+        self.bot.cache.snapshot_flushers['rs3_items'] = self.rs3_price_writer.flush
 
     async def cog_unload(self) -> None:
         '''
@@ -80,19 +106,34 @@ class BackgroundTasks(Cog):
         self.git_tracking.cancel()
         self.price_tracking_osrs.cancel()
         self.price_tracking_rs3.cancel()
+        self.cache_snapshots.cancel()
+        self.bot.cache.snapshot_flushers.pop('osrs_items', None)
+        self.bot.cache.snapshot_flushers.pop('rs3_items', None)
+        # Write any price updates that are still pending
+        for writer in [self.osrs_price_writer, self.rs3_price_writer]:
+            try:
+                await writer.flush()
+            except Exception as e:
+                error: str = f'Error encountered while writing pending price updates: {e.__class__.__name__}: {e}'
+                print(error)
+                logging.error(error)
 
     @tasks.loop(seconds=10)
     async def uptime_tracking(self) -> None:
         try:
             now: datetime = datetime.now(UTC).replace(microsecond=0)
-            today: datetime = now.replace(hour=0, minute=0, second=0)
-            
+
+            # Extend the interval that was opened at startup, and add the time since the previous heartbeat to the daily rollups
             async with self.bot.db.get_session() as session:
-                latest_event_today: Uptime | None = (await session.execute(select(Uptime).where(Uptime.time >= today).order_by(Uptime.time.desc()))).scalars().first()
-                if latest_event_today and latest_event_today.status == 'running':
-                    latest_event_today.time = now
-                else:
-                    session.add(Uptime(time=now, status='running'))
+                interval: UptimeInterval | None = await session.get(UptimeInterval, self.bot.start_time, with_for_update=True)
+                if not interval:
+                    interval = UptimeInterval(start=self.bot.start_time, last_heartbeat=self.bot.start_time)
+                    session.add(interval)
+                uptime: dict[date, timedelta] = uptime_per_day(interval.last_heartbeat, now)
+                if uptime:
+                    statement: Insert = insert(UptimeDay).values([{'day': day, 'seconds': round(up.total_seconds())} for day, up in uptime.items()])
+                    await session.execute(statement.on_conflict_do_update(index_elements=[UptimeDay.day], set_={'seconds': UptimeDay.seconds + statement.excluded.seconds}))
+                interval.last_heartbeat = now
                 await session.commit()
         except Exception as e:
             error: str = f'Error encountered in uptime tracking: {e.__class__.__name__}: {e}'
@@ -143,13 +184,91 @@ class BackgroundTasks(Cog):
 
         self.notification_state_initialized = True
 
-    async def send_notifications(self, message: str, role_dict: dict[str, str] | None = None) -> None:
+    def get_notification_webhook(self, channel: discord.TextChannel) -> discord.Webhook | None:
+        '''
+        Get the webhook to use for broadcasts to a channel.
+        Webhook executions are rate limited separately from the bot, so broadcasts do not use up the global rate limit.
+        If the channel does not have a webhook yet, or its webhook was deleted, a new one is created in the background.
+
+        Args:
+            channel (discord.TextChannel): The channel
+
+        Returns:
+            discord.Webhook | None: The webhook, or None if the message should be sent through the channel instead.
+        '''
+        if not self.bot.cache.is_ready('notification_webhooks'):
+            # Unknown whether the channel already has a webhook, so don't create one yet
+            return None
+        db_webhook: NotificationWebhook | None = self.bot.cache.get_notification_webhook(channel.id)
+        if db_webhook and db_webhook.webhook_id in self.bot.message_queue.invalid_webhooks:
+            self.bot.message_queue.invalid_webhooks.discard(db_webhook.webhook_id)
+            self.bot.cache.remove_notification_webhook(channel.id)
+            db_webhook = None
+        if db_webhook:
+            return discord.Webhook.partial(db_webhook.webhook_id, db_webhook.webhook_token, client=self.bot)
+        if channel.id not in self.pending_webhook_channel_ids and channel.permissions_for(channel.guild.me).manage_webhooks:
+            self.pending_webhook_channel_ids.add(channel.id)
+            self.webhook_creation.submit(self.create_notification_webhook(channel))
+        return None
+
+    async def create_notification_webhook(self, channel: discord.TextChannel) -> None:
+        '''
+        Create a webhook for broadcasts to a channel, and store it in the database and cache.
+
+        Args:
+            channel (discord.TextChannel): The channel
+        '''
+        try:
+            if self.webhook_avatar is None and self.bot.user:
+                self.webhook_avatar = await self.bot.user.display_avatar.read()
+            webhook: discord.Webhook = await channel.create_webhook(name=self.bot.user.name if self.bot.user else 'RuneClock', avatar=self.webhook_avatar, reason='Notifications')
+            if not webhook.token:
+                return
+            async with self.bot.db.get_session() as session:
+                db_webhook: NotificationWebhook = await session.merge(NotificationWebhook(channel_id=channel.id, guild_id=channel.guild.id, webhook_id=webhook.id, webhook_token=webhook.token))
+                await session.commit()
+            self.bot.cache.notification_webhook(db_webhook)
+        except discord.HTTPException:
+            pass
+        except Exception as e:
+            logging.error(f'Error creating webhook in channel {channel.id}: {e}')
+        finally:
+            self.pending_webhook_channel_ids.discard(channel.id)
+
+    def broadcast_deadline(self, expiration: datetime | None = None) -> float:
+        '''
+        Get the time until which a broadcast holds off while the message queue is full, see wait_for_queue_space.
+
+        Args:
+            expiration (datetime | None, optional): Time at which the messages of the broadcast become irrelevant. Defaults to None.
+
+        Returns:
+            float: The monotonic time after max_queue_wait, or at expiration if that is earlier
+        '''
+        wait: float = self.max_queue_wait
+        if expiration:
+            wait = min(wait, (expiration - datetime.now(UTC)).total_seconds())
+        return time.monotonic() + wait
+
+    async def wait_for_queue_space(self, deadline: float) -> None:
+        '''
+        Hold off a broadcast while the message queue is full, such that it does not push its own earlier messages out of the queue.
+        Once the deadline has passed, the remaining messages are queued without waiting.
+
+        Args:
+            deadline (float): The monotonic time until which to wait, see broadcast_deadline
+        '''
+        if self.bot.message_queue.is_full():
+            await self.bot.message_queue.wait_until_not_full(max(0, deadline - time.monotonic()))
+
+    async def send_notifications(self, message: str, role_dict: dict[str, str] | None = None, expiration: datetime | None = None) -> None:
         '''
         Get coroutines to send notifications to the configured notification channels.
 
         Args:
             message (str): The notification message.
             role_name (str): The name of the role to mentioned (if found).
+            expiration (datetime | None, optional): Time at which the notification becomes irrelevant. Notifications that are still queued by then are dropped. Defaults to None.
 
         Returns:
             _type_: A list of coroutines which can be awaited to send the notifications.
@@ -159,14 +278,20 @@ class BackgroundTasks(Cog):
             guilds: Sequence[Guild] = (await session.execute(select(Guild).where(Guild.notification_channel_id.is_not(None)))).scalars().all()
         
         channels: list[discord.TextChannel] = [channel for channel in [find_text_channel(self.bot, guild.notification_channel_id) for guild in guilds] if channel]
+        deadline: float = self.broadcast_deadline(expiration)
 
         for c in channels:
             msg: str = message
+            mentionable: bool = True
             for role_name, text_to_replace in (role_dict.items() if role_dict else []):
                 roles: list[discord.Role] = [r for r in c.guild.roles if role_name.upper() in r.name.upper()]
                 role_mention: str = roles[0].mention if roles else ''
+                mentionable = mentionable and (not roles or roles[0].mentionable)
                 msg = msg.replace(text_to_replace, role_mention)
-            self.bot.queue_message(QueueMessage(c, msg))
+            # Webhooks can only ping mentionable roles, so fall back to the channel otherwise
+            webhook: discord.Webhook | None = self.get_notification_webhook(c) if mentionable else None
+            await self.wait_for_queue_space(deadline)
+            self.bot.queue_message(QueueMessage(c, msg, priority=MessagePriority.LOW, expiration=expiration, webhook=webhook, source=MessageSource.NOTIFICATIONS))
 
     async def send_news(self, post: NewsPost, osrs: bool) -> None:
         '''
@@ -195,10 +320,12 @@ class BackgroundTasks(Cog):
             else:
                 guilds = (await session.execute(select(Guild).where(Guild.rs3_news_channel_id.is_not(None)))).scalars().all()
 
+        deadline: float = self.broadcast_deadline()
         for guild in guilds:
             news_channel: discord.TextChannel | None = find_text_channel(self.bot, guild.osrs_news_channel_id) if osrs else find_text_channel(self.bot, guild.rs3_news_channel_id)
             if news_channel:
-                self.bot.queue_message(QueueMessage(news_channel, embed=embed))
+                await self.wait_for_queue_space(deadline)
+                self.bot.queue_message(QueueMessage(news_channel, embed=embed, priority=MessagePriority.LOW, webhook=self.get_notification_webhook(news_channel), source=MessageSource.NEWS))
 
     @tasks.loop(seconds=15)
     async def notify(self) -> None:
@@ -212,51 +339,53 @@ class BackgroundTasks(Cog):
         
         try:
             now: datetime = datetime.now(UTC)
+            # Most notifications are sent ahead of an event that starts on the next hour, after which they are no longer relevant
+            next_hour: datetime = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
 
             if not self.notified_this_day_merchant and now.hour <= 2 and self.bot.next_merchant and self.bot.next_merchant > now + timedelta(hours=1):
                 msg: str = f'__role_mention__\n**Traveling Merchant** stock {now.strftime("%d %b")}\n{self.bot.merchant}'
-                await self.send_notifications(msg, {'MERCHANT': '__role_mention__'})
+                await self.send_notifications(msg, {'MERCHANT': '__role_mention__'}, self.bot.next_merchant)
                 self.notified_this_day_merchant = True
 
             if not self.notified_this_day_spotlight and now.hour <= 1 and self.bot.next_spotlight and self.bot.next_spotlight > now + timedelta(days=2, hours=1):
                 msg = f'{self.bot.config["spotlightEmoji"]} **{self.bot.spotlight}** is now the spotlighted minigame. __role_mention__'
-                await self.send_notifications(msg, {'SPOTLIGHT': '__role_mention__'})
+                await self.send_notifications(msg, {'SPOTLIGHT': '__role_mention__'}, self.bot.next_spotlight)
                 self.notified_this_day_spotlight = True
 
             if not self.notified_this_hour_vos and now.minute <= 1 and self.bot.vos and self.bot.next_vos and self.bot.next_vos > now + timedelta(minutes=1):
                 msg = '\n'.join([self.bot.config[f'msg{d}'] + f'__role_{d}__' for d in self.bot.vos['vos']])
                 role_dict: dict[str, str] = {d: f'__role_{d}__' for d in self.bot.vos['vos']}
-                await self.send_notifications(msg, role_dict)
+                await self.send_notifications(msg, role_dict, self.bot.next_vos)
                 self.notified_this_hour_vos = True
                     
             if not self.notified_this_hour_warbands and now.minute >= 45 and now.minute <= 46 and self.bot.next_warband and self.bot.next_warband - now <= timedelta(minutes=15):
                 msg = self.bot.config['msgWarbands'] + '__role_mention__'
-                await self.send_notifications(msg, {'WARBAND': '__role_mention__'})
+                await self.send_notifications(msg, {'WARBAND': '__role_mention__'}, self.bot.next_warband)
                 self.notified_this_hour_warbands = True
                         
             if not self.notified_this_hour_cache and now.minute >= 55 and now.minute <= 56:
                 msg = self.bot.config['msgCache'] + '__role_mention__'
-                await self.send_notifications(msg, {'CACHE': '__role_mention__'})
+                await self.send_notifications(msg, {'CACHE': '__role_mention__'}, next_hour)
                 self.notified_this_hour_cache = True
 
             if not self.notified_this_hour_yews_48 and now.hour == 23 and now.minute >= 45 and now.minute <= 46:
                 msg = self.bot.config['msgYews48'] + '__role_mention__'
-                await self.send_notifications(msg, {'YEW': '__role_mention__'})
+                await self.send_notifications(msg, {'YEW': '__role_mention__'}, next_hour)
                 self.notified_this_hour_yews_48 = True
 
             if not self.notified_this_hour_yews_140 and now.hour == 16 and now.minute >= 45 and now.minute <= 46:
                 msg = self.bot.config['msgYews140'] + '__role_mention__'
-                await self.send_notifications(msg, {'YEW': '__role_mention__'})
+                await self.send_notifications(msg, {'YEW': '__role_mention__'}, next_hour)
                 self.notified_this_hour_yews_140 = True
                 
             if not self.notified_this_hour_goebies and now.hour in [11, 23] and now.minute >= 45 and now.minute <= 46:
                 msg = self.bot.config['msgGoebies'] + '__role_mention__'
-                await self.send_notifications(msg, {'GOEBIE': '__role_mention__'})
+                await self.send_notifications(msg, {'GOEBIE': '__role_mention__'}, next_hour)
                 self.notified_this_hour_goebies = True
 
             if not self.notified_this_hour_sinkhole and now.minute >= 25 and now.minute <= 26:
                 msg = self.bot.config['msgSinkhole'] + '__role_mention__'
-                await self.send_notifications(msg, {'SINKHOLE': '__role_mention__'})
+                await self.send_notifications(msg, {'SINKHOLE': '__role_mention__'}, now.replace(minute=30, second=0, microsecond=0))
                 self.notified_this_hour_sinkhole = True
 
             if now.minute > 1 and self.reset:
@@ -300,7 +429,7 @@ class BackgroundTasks(Cog):
                         await session.delete(notification)
                         await session.commit()
                         continue
-                    self.bot.queue_message(QueueMessage(channel, notification.message))
+                    self.bot.queue_message(QueueMessage(channel, notification.message, source=MessageSource.NOTIFICATIONS))
 
                     interval = timedelta(seconds = notification.interval)
                     if interval.total_seconds() != 0:
@@ -543,12 +672,12 @@ class BackgroundTasks(Cog):
         except:
             pass
 
-    def get_next_item_osrs(self) -> OSRSItem:
+    def get_next_item_osrs(self) -> ItemPrices:
         '''
         Gets the next OSRS item to have its price updated.
 
         Returns:
-            OSRSItem: The next item to be updated
+            ItemPrices: The next item to be updated
         '''
         next_item_id: int
         if self.last_osrs_item_id is None or self.last_osrs_item_id >= max(self.bot.cache.osrs_items.keys()):
@@ -565,7 +694,7 @@ class BackgroundTasks(Cog):
         '''
         # Interval may have been changed in previous iteration due to rate limits. So we reset it here.
         self.price_tracking_osrs.change_interval(seconds=10)
-        item: OSRSItem = self.get_next_item_osrs()
+        item: ItemPrices = self.get_next_item_osrs()
 
         graph_url: str = f'http://services.runescape.com/m=itemdb_oldschool/api/graph/{item.id}.json'
         graph_data: dict[str, dict[str, str]] = {}
@@ -607,22 +736,10 @@ class BackgroundTasks(Cog):
             day90: str = '{:.1f}'.format((int(current) - int(three_months_ago)) / int(three_months_ago) * 100) + '%'
             day180: str = '{:.1f}'.format((int(current) - int(half_year_ago)) / int(half_year_ago) * 100) + '%'
 
-            # To update the item, we first obtain a new database session
-            # as the original session used to retrieve the item has been disposed.
-            async with self.bot.db.get_session() as session:
-                db_item: OSRSItem = (await session.execute(select(OSRSItem).where(OSRSItem.id == item.id))).scalar_one()
-            
-                db_item.current = current
-                db_item.today = today
-                db_item.day30 = day30
-                db_item.day90 = day90
-                db_item.day180 = day180
-                db_item.graph_data = graph_data
-
-                await session.commit()
-                self.bot.cache.osrs_items[item.id] = db_item # Update the cached item
-
+            # The cache is updated immediately, the database in batches
+            self.osrs_price_writer.add(item, current, today, day30, day90, day180, graph_data)
             self.last_osrs_item_id = item.id # Continue to the next item by marking this item as done
+            await self.osrs_price_writer.flush_if_due()
             self.last_error_osrs_price_tracking = None # No error occurred in this iteration
         except PriceTrackingException as e:
             self.handle_price_tracking_error(e, True, e.status, e.delay_before_retry)
@@ -630,12 +747,12 @@ class BackgroundTasks(Cog):
             # Catch all exceptions to avoid closing the loop
             self.handle_price_tracking_error(e, True, None)
         
-    def get_next_item_rs3(self) -> RS3Item:
+    def get_next_item_rs3(self) -> ItemPrices:
         '''
         Gets the next RS3 item to have its price updated.
 
         Returns:
-            RS3Item: The next item to be updated
+            ItemPrices: The next item to be updated
         '''
         next_item_id: int
         if self.last_rs3_item_id is None or self.last_rs3_item_id >= max(self.bot.cache.rs3_items.keys()):
@@ -652,7 +769,7 @@ class BackgroundTasks(Cog):
         '''
         # Interval may have been changed in previous iteration due to rate limits. So we reset it here.
         self.price_tracking_rs3.change_interval(seconds=10)
-        item: RS3Item = self.get_next_item_rs3()
+        item: ItemPrices = self.get_next_item_rs3()
 
         graph_url: str = f'http://services.runescape.com/m=itemdb_rs/api/graph/{item.id}.json'
         graph_data: dict[str, dict[str, str]] = {}
@@ -694,22 +811,10 @@ class BackgroundTasks(Cog):
             day90: str = '{:.1f}'.format((int(current) - int(three_months_ago)) / int(three_months_ago) * 100) + '%'
             day180: str = '{:.1f}'.format((int(current) - int(half_year_ago)) / int(half_year_ago) * 100) + '%'
 
-            # To update the item, we first obtain a new database session
-            # as the original session used to retrieve the item has been disposed.
-            async with self.bot.db.get_session() as session:
-                db_item: RS3Item = (await session.execute(select(RS3Item).where(RS3Item.id == item.id))).scalar_one()
-            
-                db_item.current = current
-                db_item.today = today
-                db_item.day30 = day30
-                db_item.day90 = day90
-                db_item.day180 = day180
-                db_item.graph_data = graph_data
-
-                await session.commit()
-                self.bot.cache.rs3_items[item.id] = db_item # Update the cached item
-
+            # The cache is updated immediately, the database in batches
+            self.rs3_price_writer.add(item, current, today, day30, day90, day180, graph_data)
             self.last_rs3_item_id = item.id # Continue to the next item by marking this item as done
+            await self.rs3_price_writer.flush_if_due()
             self.last_error_rs3_price_tracking = None # No error occurred in this iteration
         except PriceTrackingException as e:
             self.handle_price_tracking_error(e, False, e.status, e.delay_before_retry)
@@ -757,14 +862,29 @@ class BackgroundTasks(Cog):
         else:
             self.last_error_rs3_price_tracking = status if status else e.__class__.__name__
     
+    @tasks.loop(minutes=30)
+    async def cache_snapshots(self) -> None:
+        '''
+        Periodically write snapshots of the item caches to disk, such that restarts only need to load recent changes from the database.
+        '''
+        try:
+            await self.bot.cache.write_snapshots()
+        except Exception as e:
+            error: str = f'Error encountered while writing cache snapshots: {e.__class__.__name__}: {e}'
+            print(error)
+            logging.error(error)
+
     @price_tracking_osrs.before_loop
     @price_tracking_rs3.before_loop
     async def delayed_start_price_tracking(self) -> None:
         '''
         Inserts a delay of 5 minutes before the start of price tracking for both OSRS and RS3 items.
         This delay serves to avoid exceeding rate limits during frequent successive restarts, e.g. when testing new features of the bot.
+        Price tracking also waits for the item caches to be loaded, as it iterates over the cached items.
         '''
         await asyncio.sleep(300)
+        await self.bot.cache.wait_until_ready('osrs_items')
+        await self.bot.cache.wait_until_ready('rs3_items')
 
 async def setup(bot: Bot) -> None:
     await bot.add_cog(BackgroundTasks(bot))
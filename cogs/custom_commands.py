@@ -4,7 +4,7 @@ from discord.ext import commands
 from discord.ext.commands import Cog, CommandError, Context
 from sqlalchemy import select
 from src.bot import Bot
-from src.database import Command
+from src.database import Command, Row
 import re
 from src.checks import is_admin
 from src.number_utils import is_int
@@ -97,8 +97,7 @@ class CustomCommands(Cog):
         if not ctx.invoked_with or not ctx.guild or not isinstance(ctx.channel, discord.TextChannel) or not isinstance(ctx.author, discord.Member):
             raise CommandError(message=f'Could not find the guild, channel, or alias that was used to invoke the command. This is unexpected.')
         alias: str = ctx.invoked_with.lower()
-        async with self.bot.db.get_session() as session:
-            custom_db_command: Command | None = await find_custom_db_command(session, ctx.guild, alias)
+        custom_db_command: Row | None = await self.bot.cache.find_custom_command(ctx.guild.id, alias)
         if not custom_db_command:
             return
         
@@ -4,7 +4,7 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import Cog
 from sqlalchemy import select
-from src.message_queue import QueueMessage
+from src.message_queue import MessagePriority, MessageSource, QueueMessage
 from src.bot import Bot
 from src.database import Guild, Role
 from datetime import datetime, UTC
@@ -63,7 +63,7 @@ class Logs(Cog):
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
         embed.set_thumbnail(url=url)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_member_remove(self, member: discord.Member) -> None:
@@ -91,7 +91,7 @@ class Logs(Cog):
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
         embed.set_thumbnail(url=url)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: discord.User) -> None:
@@ -114,7 +114,7 @@ class Logs(Cog):
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
         embed.set_thumbnail(url=url)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: discord.User) -> None:
@@ -137,7 +137,7 @@ class Logs(Cog):
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
         embed.set_thumbnail(url=url)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_message_delete(self, message: discord.Message) -> None:
@@ -167,7 +167,7 @@ class Logs(Cog):
         embed.add_field(name='Message', value=msg, inline=False)
         embed.set_footer(text=f'Message ID: {message.id}')
         embed.set_thumbnail(url=message.author.display_avatar.url)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
     
     @Cog.listener()
     async def on_bulk_message_delete(self, messages: list[discord.Message]) -> None:
@@ -186,7 +186,7 @@ class Logs(Cog):
 
         txt: str = f'{len(messages)} messages deleted in {messages[0].channel.mention}'
         embed = discord.Embed(title='**Bulk delete**', colour=0x00b2ff, timestamp=datetime.now(UTC), description=txt)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
@@ -231,7 +231,7 @@ class Logs(Cog):
             embed.add_field(name='After', value=afterContent, inline=False)
             embed.set_footer(text=id)
             embed.set_thumbnail(url=url)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_channel_delete(self, channel: GuildChannel) -> None:
@@ -255,7 +255,7 @@ class Logs(Cog):
                f'Channel creation: {time}.')
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
-        self.bot.queue_message(QueueMessage(log_channel, None, embed))
+        self.bot.queue_message(QueueMessage(log_channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_channel_create(self, channel: GuildChannel) -> None:
@@ -276,7 +276,7 @@ class Logs(Cog):
         txt: str = f'{channel.mention}'
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
-        self.bot.queue_message(QueueMessage(log_channel, None, embed))
+        self.bot.queue_message(QueueMessage(log_channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
@@ -308,7 +308,7 @@ class Logs(Cog):
             embed.add_field(name='After', value=after_nick, inline=False)
             embed.set_footer(text=id)
             embed.set_thumbnail(url=url)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
         elif set(before.roles) != set(after.roles):
             self.log_event()
             added_roles: list[discord.Role] = []
@@ -346,7 +346,7 @@ class Logs(Cog):
                 embed.add_field(name='Removed', value=removed, inline=False)
             embed.set_footer(text=id)
             embed.set_thumbnail(url=url)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_update(self, before: discord.Guild, after: discord.Guild) -> None:
@@ -379,7 +379,7 @@ class Logs(Cog):
             embed.add_field(name='After', value=after_name, inline=False)
             embed.set_footer(text=id)
             embed.set_thumbnail(url=url)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_role_create(self, role: discord.Role) -> None:
@@ -400,7 +400,7 @@ class Logs(Cog):
         txt: str = f'{role.mention}'
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_role_delete(self, role: discord.Role) -> None:
@@ -425,7 +425,7 @@ class Logs(Cog):
         txt: str = f'{role.name}'
         embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
         embed.set_footer(text=id)
-        self.bot.queue_message(QueueMessage(channel, None, embed))
+        self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
@@ -449,7 +449,7 @@ class Logs(Cog):
             embed.add_field(name='Before', value=before.name, inline=False)
             embed.add_field(name='After', value=after.name, inline=False)
             embed.set_footer(text=id)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
     @Cog.listener()
     async def on_guild_emojis_update(self, guild: discord.Guild, before: Sequence[discord.Emoji], after: Sequence[discord.Emoji]) -> None:
@@ -516,7 +516,7 @@ class Logs(Cog):
 
             embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
             embed.set_footer(text=id)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
             return
         before_names: list[str] = []
         for e in before:
@@ -546,7 +546,7 @@ class Logs(Cog):
             id = f'Server ID: {guild.id}'
             embed = discord.Embed(title=title, colour=colour, timestamp=timestamp, description=txt)
             embed.set_footer(text=id)
-            self.bot.queue_message(QueueMessage(channel, None, embed))
+            self.bot.queue_message(QueueMessage(channel, None, embed, priority=MessagePriority.HIGH, source=MessageSource.LOGS))
 
 async def setup(bot: Bot) -> None:
     await bot.add_cog(Logs(bot))
@@ -12,10 +12,11 @@ from github.Repository import Repository as GitRepository
 from github.Commit import Commit
 from gspread_asyncio import AsyncioGspreadClient, AsyncioGspreadSpreadsheet
 from numpy import ndarray
-from sqlalchemy import select, func
+from sqlalchemy import delete, select, func
 from src.bot import Bot
-from src.database import Guild, Uptime, Command, Repository, RS3Item, OSRSItem, BannedGuild
-from datetime import datetime, timedelta, UTC
+from src.database import Guild, PriceHistory, Row, UptimeDay, Repository, RS3Item, OSRSItem, BannedGuild
+from src.price_store import history_to_rows, parse_graph_data
+from datetime import date, datetime, timedelta, UTC
 import psutil
 from pathlib import Path
 import traceback
@@ -24,18 +25,20 @@ import inspect
 from contextlib import redirect_stdout
 import io
 import itertools
+import time
 from src.checks import is_owner, is_admin
-from src.message_queue import QueueMessage
+from src.message_queue import MessageSource, QueueMessage
+from src.metrics import HoldTimeStats
 from src.number_utils import is_int
 import matplotlib.pyplot as plt
 from matplotlib.dates import date2num
 import matplotlib.dates as mdates
 from matplotlib.dates import DateFormatter
-from src.date_utils import timedelta_to_string, uptime_fraction
+from src.date_utils import timedelta_to_string, daily_uptime_fractions, uptime_fraction
 from src.string_utils import remove_code_blocks
 from src.exception_utils import format_syntax_error
 from src.discord_utils import find_guild_text_channel, find_text_channel_by_name, get_custom_command, get_guild_text_channel, get_text_channel_by_name
-from src.database_utils import find_custom_db_command, get_db_guild, find_osrs_item_by_id, get_osrs_item_by_id, find_rs3_item_by_id, get_rs3_item_by_id
+from src.database_utils import get_db_guild, find_osrs_item_by_id, get_osrs_item_by_id, find_rs3_item_by_id, get_rs3_item_by_id
 
 class Management(Cog):
     def __init__(self, bot: Bot) -> None:
@@ -86,8 +89,7 @@ class Management(Cog):
                 else:
                     extension = command
             elif cmd == custom_command:
-                async with self.bot.db.get_session() as session:
-                    db_cmd: Command | None = await find_custom_db_command(session, ctx.guild, command)
+                db_cmd: Row | None = await self.bot.cache.find_custom_command(ctx.guild.id, command) if ctx.guild else None
                 if not db_cmd:
                     raise commands.CommandError(message=f'Invalid argument: `{command}`.')
                 alias_str: str = ' | '.join(db_cmd.aliases) if db_cmd.aliases else ''
@@ -312,7 +314,7 @@ class Management(Cog):
                 guild.disabled_commands = [cmd]
                 message = f'The command **{cmd}** has been **disabled**.'
             elif cmd in guild.disabled_commands:
-                guild.disabled_commands = guild.disabled_commands.remove(cmd)
+                guild.disabled_commands = [c for c in guild.disabled_commands if c != cmd]
                 message = f'The command **{cmd}** has been **enabled**.'
             else:
                 guild.disabled_commands = guild.disabled_commands + [cmd]
@@ -548,6 +550,13 @@ class Management(Cog):
         processed = f'**Commands:** {self.bot.get_command_counter()}\n**Events:** {self.bot.events_logged}\n**Notifications:** {notifications}'
         embed.add_field(name='__Processed__', value=processed)
 
+        queue: str = '\n'.join(f'**{priority.name.capitalize()}:** {depth} ({age:.1f} s)' for priority, (depth, age) in self.bot.message_queue.depth().items())
+        queue += f'\n**Dropped:** {sum(self.bot.message_queue.dropped.values())}'
+        embed.add_field(name='__Queue__', value=queue)
+
+        latency: str = '\n'.join(f'**{source.capitalize()}:** {" / ".join(f"{p:.1f}" for p in queue_time)} s' for source, (queue_time, _, _) in self.bot.message_queue.latency(50, 95, 99).items())
+        embed.add_field(name='__Queue time (p50 / p95 / p99)__', value=latency if latency else 'No messages sent')
+
         embed.set_author(name='@schattie', url='https://github.com/ChattyRS/RuneClock', icon_url=self.bot.config['profile_picture_url'])
 
         embed.set_thumbnail(url=ctx.me.display_avatar.url)
@@ -826,18 +835,20 @@ class Management(Cog):
         now: datetime = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
 
         async with self.bot.db.get_session() as session:
-            events: Sequence[Uptime] = (await session.execute(select(Uptime).order_by(Uptime.time.asc()))).scalars().all()
+            days: Sequence[UptimeDay] = (await session.execute(select(UptimeDay))).scalars().all()
+
+        fractions: dict[date, float] = daily_uptime_fractions(days)
 
-        uptime_today: float = uptime_fraction(events, now.year, now.month, now.day)
+        uptime_today: float = uptime_fraction(fractions, now.year, now.month, now.day)
         uptime_today_round: str = '{:.2f}'.format(uptime_today*100)
 
-        uptime_month: float = uptime_fraction(events, now.year, now.month)
+        uptime_month: float = uptime_fraction(fractions, now.year, now.month)
         uptime_month_round: str = '{:.2f}'.format(uptime_month*100)
 
-        uptime_year: float = uptime_fraction(events, now.year)
+        uptime_year: float = uptime_fraction(fractions, now.year)
         uptime_year_round: str = '{:.2f}'.format(uptime_year*100)
 
-        uptime_lifetime: float = uptime_fraction(events)
+        uptime_lifetime: float = uptime_fraction(fractions)
         uptime_lifetime_round: str = '{:.2f}'.format(uptime_lifetime*100)
 
         loc = mdates.WeekdayLocator()
@@ -853,7 +864,7 @@ class Management(Cog):
         for i in range(30):
             day: datetime = now - timedelta(days=i)
             times.append(day)
-            uptimes.append(100 * uptime_fraction(events, day.year, day.month, day.day))
+            uptimes.append(100 * uptime_fraction(fractions, day.year, day.month, day.day))
 
         dates: ndarray = date2num(times)
         plt.plot_date(dates, uptimes, color='#47a0ff', linestyle='-', ydate=False, xdate=True)
@@ -963,8 +974,9 @@ class Management(Cog):
         async with self.bot.db.get_session() as session:
             new_item: OSRSItem = OSRSItem(id=int(id), name=name, icon_url=icon_url, type=type, description=description, members=members, current=str(current), today=str(today), day30=day30, day90=day90, day180=day180, graph_data=graph_data)
             session.add(new_item)
+            session.add_all(PriceHistory(**row) for row in history_to_rows('osrs', new_item.id, *parse_graph_data(graph_data)))
             await session.commit()
-            self.bot.cache.osrs_items[new_item.id] = new_item
+            self.bot.cache.osrs_item(new_item)
 
         await ctx.send(f'Item added: `{name}`: `{current}`.')
     
@@ -982,8 +994,9 @@ class Management(Cog):
         id = int(id)
         async with self.bot.db.get_session() as session:
             item: OSRSItem = await get_osrs_item_by_id(session, id)
-            del self.bot.cache.osrs_items[item.id]
+            self.bot.cache.remove_osrs_item(item.id)
             await session.delete(item)
+            await session.execute(delete(PriceHistory).where(PriceHistory.game == 'osrs', PriceHistory.item_id == item.id))
             await session.commit()
 
         await ctx.send(f'Item removed: `{id}`: `{item.name}`.')
@@ -1060,8 +1073,9 @@ class Management(Cog):
         async with self.bot.db.get_session() as session:
             new_item: RS3Item = RS3Item(id=int(id), name=name, icon_url=icon_url, type=type, description=description, members=members, current=str(current), today=str(today), day30=day30, day90=day90, day180=day180, graph_data=graph_data)
             session.add(new_item)
+            session.add_all(PriceHistory(**row) for row in history_to_rows('rs3', new_item.id, *parse_graph_data(graph_data)))
             await session.commit()
-            self.bot.cache.rs3_items[new_item.id] = new_item
+            self.bot.cache.rs3_item(new_item)
 
         await ctx.send(f'Item added: `{name}`: `{current}`.')
     
@@ -1079,12 +1093,61 @@ class Management(Cog):
         id = int(id)
         async with self.bot.db.get_session() as session:
             item: RS3Item = await get_rs3_item_by_id(session, id)
-            del self.bot.cache.rs3_items[item.id]
+            self.bot.cache.remove_rs3_item(item.id)
             await session.delete(item)
+            await session.execute(delete(PriceHistory).where(PriceHistory.game == 'rs3', PriceHistory.item_id == item.id))
             await session.commit()
 
         await ctx.send(f'Item removed: `{id}`: `{item.name}`.')
     
+    @commands.command(hidden=True)
+    @is_owner()
+    async def queue_latency(self, ctx: commands.Context) -> None:
+        '''
+        Returns the p50, p95 and p99 time spent in the message queue and send duration per message source, over the last hour.
+        '''
+        self.bot.increment_command_counter()
+
+        latency: dict[MessageSource, tuple[list[float], list[float], int]] = self.bot.message_queue.latency(50, 95, 99)
+        embed = discord.Embed(title='**Queue latency**', colour=0x00e400, timestamp=datetime.now(UTC), description='p50 / p95 / p99 over the last hour')
+        for source, (queue_time, send_time, count) in latency.items():
+            embed.add_field(name=f'__{source.capitalize()}__', value=f'**Messages:** {count}\n**Queue:** {" / ".join(f"{p:.2f}" for p in queue_time)} s\n**Send:** {" / ".join(f"{p:.2f}" for p in send_time)} s')
+        if not latency:
+            embed.description = 'No messages were sent in the last hour.'
+
+        await ctx.send(embed=embed)
+
+    @commands.command(hidden=True)
+    @is_owner()
+    async def db_sessions(self, ctx: commands.Context, rank: int = 0) -> None:
+        '''
+        Returns the database pool status and the call sites that held sessions the longest.
+        Pass the rank of a call site to get the stack of its longest hold over the threshold.
+        '''
+        self.bot.increment_command_counter()
+
+        top: list[tuple[str, HoldTimeStats]] = self.bot.db.top_session_holders(10)
+        if rank:
+            if rank < 1 or rank > len(top):
+                raise commands.CommandError(message=f'Invalid argument: `{rank}`. Rank must be between 1 and {len(top)}.')
+            call_site, stats = top[rank-1]
+            if not stats.long_hold_stack:
+                raise commands.CommandError(message=f'`{call_site}` has not held a session longer than {self.bot.db.long_hold_threshold} seconds.')
+            await ctx.send(f'**{call_site}** ({stats.maximum:.1f} s)\n```{stats.long_hold_stack[-1900:]}```')
+            return
+
+        embed = discord.Embed(title='**Database sessions**', colour=0x00e400, timestamp=datetime.now(UTC), description=self.bot.db.pool_status())
+        for i, (call_site, stats) in enumerate(top):
+            p50, p99 = stats.histogram.percentiles(50, 99)
+            embed.add_field(name=f'{i+1}. {call_site}'[:256], value=f'**Sessions:** {stats.count}\n**Total:** {stats.total:.1f} s\n**p50 / p99 / max:** {p50:.2f} / {p99:.2f} / {stats.maximum:.2f} s\n**Long holds:** {stats.long_holds}', inline=False)
+
+        now: float = time.monotonic()
+        long_open: list[tuple[str, float]] = sorted(((call_site, now - start) for call_site, start in self.bot.db.open_sessions.values() if now - start >= self.bot.db.long_hold_threshold), key=lambda s: s[1], reverse=True)
+        if long_open:
+            embed.add_field(name='__Open sessions__', value='\n'.join(f'{call_site}: {duration:.0f} s' for call_site, duration in long_open[:10])[:1024], inline=False)
+
+        await ctx.send(embed=embed)
+
     @commands.command(hidden=True)
     @is_owner()
     async def server_top(self, ctx: commands.Context) -> None:
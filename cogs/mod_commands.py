@@ -4,7 +4,7 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import Cog, Context, CommandError
 from sqlalchemy import select
-from src.message_queue import QueueMessage
+from src.message_queue import MessagePriority, MessageSource, QueueMessage
 from src.bot import Bot
 from src.database import Mute, Guild
 from datetime import datetime, timedelta, UTC
@@ -59,38 +59,49 @@ class ModCommands(Cog):
 
         await ctx.send(f'Modmail public and private channels for server **{ctx.guild.name}** have been set to {public.mention} and {private.mention}.')
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
+    async def cog_load(self) -> None:
         '''
-        Modmail listener
+        Registers the modmail handler, which the bot calls for messages in public modmail channels.
+        '''
+        self.bot.message_handlers['modmail'] = self.on_modmail_message
+
+    async def cog_unload(self) -> None:
+        '''
+        Unregisters the modmail handler.
+        '''
+        self.bot.message_handlers.pop('modmail', None)
+
+    async def on_modmail_message(self, message: discord.Message) -> None:
+        '''
+        Modmail handler, called by the bot for messages by users in the public modmail channel of a guild.
+        Copies the message to the private modmail channel, and deletes it.
 
         Args:
             message (discord.Message): The discord message
         '''
-        if message.author.bot or message.guild is None or not isinstance(message.channel, discord.TextChannel):
+        if message.guild is None or not isinstance(message.channel, discord.TextChannel):
             return
         
         guild: Guild | None = self.bot.cache.get_guild(message.guild)
-        if not guild:
+        if not guild or not guild.modmail_private:
             return
         
-        if guild.modmail_public and guild.modmail_private and message.channel.id == guild.modmail_public:
-            embed = discord.Embed(description=f'In: {message.channel.mention}\n“{message.content}”', colour=0x00b2ff, timestamp=message.created_at)
-            embed.set_author(name=f'{message.author.display_name} ({message.author.name})', icon_url=message.author.display_avatar.url)
-            embed.set_footer(text=f'ID: {message.id}')
-
-            private: discord.TextChannel = get_guild_text_channel(message.guild, guild.modmail_private)
-
-            files: list[discord.File] = []
-            if message.attachments:
-                for attachment in message.attachments:
-                    file: discord.File = await attachment.to_file(filename=attachment.filename, description=attachment.description, use_cached=True)
-                    files.append(file)
-                embed.set_image(url=f'attachment://{message.attachments[0].filename}')
-            
-            self.bot.queue_message(QueueMessage(private, None, embed, files))
-
-            await message.delete()
+        embed = discord.Embed(description=f'In: {message.channel.mention}\n“{message.content}”', colour=0x00b2ff, timestamp=message.created_at)
+        embed.set_author(name=f'{message.author.display_name} ({message.author.name})', icon_url=message.author.display_avatar.url)
+        embed.set_footer(text=f'ID: {message.id}')
+
+        private: discord.TextChannel = get_guild_text_channel(message.guild, guild.modmail_private)
+
+        files: list[discord.File] = []
+        if message.attachments:
+            for attachment in message.attachments:
+                file: discord.File = await attachment.to_file(filename=attachment.filename, description=attachment.description, use_cached=True)
+                files.append(file)
+            embed.set_image(url=f'attachment://{message.attachments[0].filename}')
+        
+        self.bot.queue_message(QueueMessage(private, None, embed, files, MessagePriority.HIGH, source=MessageSource.MODMAIL))
+
+        await message.delete()
 
     @commands.command()
     @is_admin()
@@ -8,7 +8,7 @@ from src.database import Guild, Notification, OnlineNotification
 from datetime import datetime, timedelta, UTC
 from src.database_utils import get_db_guild
 from src.discord_utils import find_text_channel, find_guild_text_channel, get_text_channel_by_name, send_code_block_over_multiple_messages
-from src.message_queue import QueueMessage
+from src.message_queue import MessageSource, QueueMessage
 from src.number_utils import is_int
 from src.checks import is_admin
 from src.runescape_utils import dnd_names
@@ -449,6 +449,10 @@ class Notifications(Cog):
         if before.status == after.status:
             return
         
+        # Presence updates are very frequent, so look for a notification in the cache first
+        if not await self.bot.cache.find_online_notification(after.guild.id, after.id):
+            return
+
         async with self.bot.db.get_session() as session:
             online_notification: OnlineNotification | None = (await session.execute(select(OnlineNotification)
                 .where(OnlineNotification.guild_id == after.guild.id, OnlineNotification.member_id == after.id))).scalar_one_or_none()
@@ -463,7 +467,7 @@ class Notifications(Cog):
             if channel and user and ((online_notification.type in [1,2,3] and str(after.status) == 'online') or (online_notification.type in [2,3] and str(after.status) == 'idle') 
                 or (online_notification.type == 2 and str(after.status) == 'dnd') or (online_notification.type == 4 and str(after.status) == 'offline')):
                 on_or_offline: str = 'offline' if online_notification.type == 4 else 'online'
-                self.bot.queue_message(QueueMessage(channel, f'`{after.display_name}` is {on_or_offline}! {user.mention}'))
+                self.bot.queue_message(QueueMessage(channel, f'`{after.display_name}` is {on_or_offline}! {user.mention}', source=MessageSource.NOTIFICATIONS))
 
 async def setup(bot: Bot) -> None:
     await bot.add_cog(Notifications(bot))
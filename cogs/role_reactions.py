@@ -3,9 +3,9 @@ import discord
 from discord import RawReactionActionEvent, SelectOption, TextStyle, app_commands
 from discord.ext.commands import Cog
 import traceback
-from sqlalchemy import delete, select
+from sqlalchemy import delete
 from src.bot import Bot
-from src.database import Guild, CustomRoleReaction
+from src.database import Guild, CustomRoleReaction, Row
 from src.database_utils import get_db_guild, get_role_reactions
 from src.discord_utils import get_guild_text_channel, get_text_channel
 
@@ -263,7 +263,8 @@ class RoleReactions(Cog):
             return
 
         emoji: discord.PartialEmoji = payload.emoji
-        if not hasattr(emoji, 'id'):
+        # Role reactions use custom emojis, unicode emojis have no id
+        if emoji.id is None:
             return
         
         message: discord.Message = await channel.fetch_message(payload.message_id)
@@ -274,13 +275,10 @@ class RoleReactions(Cog):
         if not user or user.bot:
             return
 
-        role_reaction: CustomRoleReaction | None = None
-        async with self.bot.db.get_session() as session:
-            guild: Guild = await get_db_guild(session, payload.guild_id)
-            if guild and guild.custom_role_reaction_channel_id == channel.id:
-                role_reaction = (await session.execute(select(CustomRoleReaction).where(CustomRoleReaction.guild_id == guild.id, CustomRoleReaction.emoji_id == emoji.id))).scalar_one_or_none()
+        guild: Guild | None = self.bot.cache.get_guild(payload.guild_id)
         if not guild or not guild.custom_role_reaction_channel_id == channel.id:
             return
+        role_reaction: Row | None = await self.bot.cache.find_role_reaction(guild.id, emoji.id)
             
         if role_reaction:
             role: discord.Role | None = discord.utils.get(channel.guild.roles, id=role_reaction.role_id)
@@ -304,7 +302,8 @@ class RoleReactions(Cog):
             return
 
         emoji: discord.PartialEmoji = payload.emoji
-        if not hasattr(emoji, 'id'):
+        # Role reactions use custom emojis, unicode emojis have no id
+        if emoji.id is None:
             return
 
         message: discord.Message = await channel.fetch_message(payload.message_id)
@@ -315,13 +314,10 @@ class RoleReactions(Cog):
         if not user or user.bot:
             return
         
-        role_reaction: CustomRoleReaction | None = None
-        async with self.bot.db.get_session() as session:
-            guild: Guild = await get_db_guild(session, payload.guild_id)
-            if guild and guild.custom_role_reaction_channel_id == channel.id:
-                role_reaction = (await session.execute(select(CustomRoleReaction).where(CustomRoleReaction.guild_id == guild.id, CustomRoleReaction.emoji_id == emoji.id))).scalar_one_or_none()
+        guild: Guild | None = self.bot.cache.get_guild(payload.guild_id)
         if not guild or not guild.custom_role_reaction_channel_id == channel.id:
             return
+        role_reaction: Row | None = await self.bot.cache.find_role_reaction(guild.id, emoji.id)
             
         if role_reaction:
             role: discord.Role | None = discord.utils.get(channel.guild.roles, id=role_reaction.role_id)
@@ -8,7 +8,8 @@ from matplotlib.axis import Tick
 from matplotlib.text import Text
 from sqlalchemy import select
 from src.bot import Bot
-from src.database import User, NewsPost, RS3Item, OSRSItem
+from src.database import Row, User, NewsPost
+from src.price_store import ItemPrices
 import re
 from datetime import datetime, timedelta, UTC
 import matplotlib.pyplot as plt
@@ -37,6 +38,8 @@ class Runescape(Cog):
     vis_wax_combo: list = []
     vis_wax_released = False
     vis_wax_check_frequency: int = 60*15 # seconds
+    # Price history is kept beyond the 180 days returned by the GE API, see PriceHistory
+    max_graph_days: int = 3650
     vis_time = 0
     stats_interface_osrs: Array
     stats_interface_rs3: Array
@@ -191,8 +194,7 @@ class Runescape(Cog):
         await ctx.channel.typing()
 
         if not username:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == ctx.author.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(ctx.author.id)
             if user:
                 username = user.rsn
             if not username:
@@ -396,8 +398,8 @@ class Runescape(Cog):
 
         if is_int(days_or_item):
             days: int = int(days_or_item)
-            if days < 1 or days > 180:
-                await ctx.send('Graph period must be between 1 and 180 days. Defaulted to 30.')
+            if days < 1 or days > self.max_graph_days:
+                await ctx.send(f'Graph period must be between 1 and {self.max_graph_days} days. Defaulted to 30.')
                 days = 30
         else:
             item_name = days_or_item + (' ' + item_name if item_name else '')
@@ -408,14 +410,18 @@ class Runescape(Cog):
         if len(item_name) < 2:
             raise commands.CommandError(message=f'Invalid argument: `item_name`. Length must be at least 2 characters.')
         
-        item: OSRSItem | None = self.bot.cache.get_osrs_item_by_name(item_name)
+        item: ItemPrices | None
+        suggestions: list[ItemPrices]
+        await self.bot.cache.wait_until_ready('osrs_items')
+        item, suggestions = self.bot.cache.search_osrs_items(item_name)
         if not item:
-            raise commands.CommandError(message=f'Could not find item: `{item_name}`.')
+            did_you_mean: str = f' Did you mean: {", ".join(f"`{s.name}`" for s in suggestions)}?' if suggestions else ''
+            raise commands.CommandError(message=f'Could not find item: `{item_name}`.{did_you_mean}')
 
         item_name = item.name
-        price: str = f'{int(item.current.replace(' ', '')):,}'
+        price: str = f'{item.current:,}'
         link: str = f'http://services.runescape.com/m=itemdb_oldschool/viewitem?obj={item.id}'
-        today: str = f'{int(item.today.replace(' ', '')):,}'
+        today: str = f'{item.today:,}'
         if not today.startswith('-') and not today.startswith('+'):
             today = '+' + today
         day30: str = item.day30
@@ -441,41 +447,23 @@ class Runescape(Cog):
         change += f'**180 days**: {day180}'
         embed.add_field(name='Change', value=change, inline=False)
 
-        daily: dict = item.graph_data['daily']
-
-        timestamps: list[int] = []
-        prices: list[int] = []
-
-        for ms, price in daily.items():
-            timestamps.append(round(int(ms) / 1000))
-            prices.append(int(price))
-
-        times: list[datetime] = []
-
-        last: int = timestamps[len(timestamps)-1]
-        remove: list[int] = []
-        for i, time in enumerate(timestamps):
-            if time >= last - 86400 * days:
-                date: datetime = timestamp - timedelta(seconds=last-time)
-                times.append(date)
-            else:
-                remove.append(i)
-        remove.sort(reverse=True)
-        for i in remove:
-            del prices[i]
+        # The latest price is plotted at the current time, and earlier prices relative to it
+        timestamps, prices = item.history(days)
+        dates: np.ndarray = date2num(timestamp) - (timestamps[-1] - timestamps) / 86400
 
         if days <= 60:
             loc = mdates.WeekdayLocator()
-        else:
+        elif days <= 365:
             loc = mdates.MonthLocator()
+        else:
+            loc = mdates.MonthLocator(bymonth=[1, 7])
 
-        formatter = DateFormatter('%d %b')
+        formatter = DateFormatter('%d %b' if days <= 365 else '%b %Y')
 
         plt.style.use('dark_background')
 
         fig, ax = plt.subplots()
 
-        dates: np.ndarray = date2num(times)
         plt.plot_date(dates, prices, color='#47a0ff', linestyle='-', ydate=False, xdate=True)
 
         ax.xaxis.set_major_locator(loc)
@@ -517,8 +505,8 @@ class Runescape(Cog):
 
         if is_int(days_or_item):
             days: int = int(days_or_item)
-            if days < 1 or days > 180:
-                await ctx.send('Graph period must be between 1 and 180 days. Defaulted to 30.')
+            if days < 1 or days > self.max_graph_days:
+                await ctx.send(f'Graph period must be between 1 and {self.max_graph_days} days. Defaulted to 30.')
                 days = 30
         else:
             item_name = days_or_item + (' ' + item_name if item_name else '')
@@ -529,14 +517,18 @@ class Runescape(Cog):
         if len(item_name) < 2:
             raise commands.CommandError(message=f'Invalid argument: `item_name`. Length must be at least 2 characters.')
 
-        item: RS3Item | None = self.bot.cache.get_rs3_item_by_name(item_name)
+        item: ItemPrices | None
+        suggestions: list[ItemPrices]
+        await self.bot.cache.wait_until_ready('rs3_items')
+        item, suggestions = self.bot.cache.search_rs3_items(item_name)
         if not item:
-            raise commands.CommandError(message=f'Could not find item: `{item_name}`.')
+            did_you_mean: str = f' Did you mean: {", ".join(f"`{s.name}`" for s in suggestions)}?' if suggestions else ''
+            raise commands.CommandError(message=f'Could not find item: `{item_name}`.{did_you_mean}')
 
         item_name = item.name
-        price: str = f'{int(item.current.replace(' ', '')):,}'
+        price: str = f'{item.current:,}'
         link: str = f'http://services.runescape.com/m=itemdb_rs/viewitem?obj={item.id}'
-        today: str = f'{int(item.today.replace(' ', '')):,}'
+        today: str = f'{item.today:,}'
         if not today.startswith('-') and not today.startswith('+'):
             today = '+' + today
         day30: str = item.day30
@@ -562,40 +554,23 @@ class Runescape(Cog):
         change += f'**180 days**: {day180}'
         embed.add_field(name='Change', value=change, inline=False)
 
-        daily: dict = item.graph_data['daily']
-
-        timestamps: list[int] = []
-        prices: list[int] = []
-
-        for ms, price in daily.items():
-            timestamps.append(round(int(ms) / 1000))
-            prices.append(int(price))
-
-        times: list[datetime] = []
-        last: int = timestamps[len(timestamps)-1]
-        remove: list[int] = []
-        for i, time in enumerate(timestamps):
-            if time >= last - 86400 * days:
-                date: datetime = timestamp - timedelta(seconds=last-time)
-                times.append(date)
-            else:
-                remove.append(i)
-        remove.sort(reverse=True)
-        for i in remove:
-            del prices[i]
+        # The latest price is plotted at the current time, and earlier prices relative to it
+        timestamps, prices = item.history(days)
+        dates: np.ndarray = date2num(timestamp) - (timestamps[-1] - timestamps) / 86400
 
         if days <= 60:
             loc = mdates.WeekdayLocator()
-        else:
+        elif days <= 365:
             loc = mdates.MonthLocator()
+        else:
+            loc = mdates.MonthLocator(bymonth=[1, 7])
 
-        formatter = DateFormatter('%d %b')
+        formatter = DateFormatter('%d %b' if days <= 365 else '%b %Y')
 
         plt.style.use('dark_background')
 
         fig, ax = plt.subplots()
 
-        dates: np.ndarray = date2num(times)
         plt.plot_date(dates, prices, color='#47a0ff', linestyle='-', ydate=False, xdate=True)
 
         ax.xaxis.set_major_locator(loc)
@@ -640,8 +615,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.osrs_rsn if user and user.osrs_rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -725,22 +699,21 @@ class Runescape(Cog):
         self.bot.increment_command_counter()
         await ctx.channel.typing()
 
-        user_1: User | None = None
-        user_2: User | None = None
-        async with self.bot.db.get_session() as session:
-            if isinstance(name_1, discord.User):
-                user_1 = (await session.execute(select(User).where(User.id == name_1.id))).scalar_one_or_none()
-            if isinstance(name_2, discord.User):
-                user_2 = (await session.execute(select(User).where(User.id == name_2.id))).scalar_one_or_none()
-
-            username_1: str = user_1.osrs_rsn if user_1 and user_1.osrs_rsn else (name_1.display_name if isinstance(name_1, discord.User) else name_1)
-            username_2: str | None = user_2.osrs_rsn if user_2 and user_2.osrs_rsn else (name_2.display_name if isinstance(name_2, discord.User) else name_2)
-
-            if not username_2:
-                user_2 = (await session.execute(select(User).where(User.id == ctx.author.id))).scalar_one_or_none()
-                if user_2 and user_2.osrs_rsn:
-                    username_2 = username_1
-                    username_1 = user_2.osrs_rsn
+        user_1: Row | None = None
+        user_2: Row | None = None
+        if isinstance(name_1, discord.User):
+            user_1 = await self.bot.cache.get_user(name_1.id)
+        if isinstance(name_2, discord.User):
+            user_2 = await self.bot.cache.get_user(name_2.id)
+
+        username_1: str = user_1.osrs_rsn if user_1 and user_1.osrs_rsn else (name_1.display_name if isinstance(name_1, discord.User) else name_1)
+        username_2: str | None = user_2.osrs_rsn if user_2 and user_2.osrs_rsn else (name_2.display_name if isinstance(name_2, discord.User) else name_2)
+
+        if not username_2:
+            user_2 = await self.bot.cache.get_user(ctx.author.id)
+            if user_2 and user_2.osrs_rsn:
+                username_2 = username_1
+                username_1 = user_2.osrs_rsn
         
         if not username_2:
             raise commands.CommandError(message=f'Required argument missing: `RSN_2`. You can set your Old School username using the `set07rsn` command, or add a second username as argument.')
@@ -848,8 +821,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.osrs_rsn if user and user.osrs_rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -948,8 +920,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.rsn if user and user.rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -1045,22 +1016,21 @@ class Runescape(Cog):
         self.bot.increment_command_counter()
         await ctx.channel.typing()
 
-        user_1: User | None = None
-        user_2: User | None = None
-        async with self.bot.db.get_session() as session:
-            if isinstance(name_1, discord.User):
-                user_1 = (await session.execute(select(User).where(User.id == name_1.id))).scalar_one_or_none()
-            if isinstance(name_2, discord.User):
-                user_2 = (await session.execute(select(User).where(User.id == name_2.id))).scalar_one_or_none()
-
-            username_1: str = user_1.rsn if user_1 and user_1.rsn else (name_1.display_name if isinstance(name_1, discord.User) else name_1)
-            username_2: str | None = user_2.rsn if user_2 and user_2.rsn else (name_2.display_name if isinstance(name_2, discord.User) else name_2)
-
-            if not username_2:
-                user_2 = (await session.execute(select(User).where(User.id == ctx.author.id))).scalar_one_or_none()
-                if user_2 and user_2.rsn:
-                    username_2 = username_1
-                    username_1 = user_2.rsn
+        user_1: Row | None = None
+        user_2: Row | None = None
+        if isinstance(name_1, discord.User):
+            user_1 = await self.bot.cache.get_user(name_1.id)
+        if isinstance(name_2, discord.User):
+            user_2 = await self.bot.cache.get_user(name_2.id)
+
+        username_1: str = user_1.rsn if user_1 and user_1.rsn else (name_1.display_name if isinstance(name_1, discord.User) else name_1)
+        username_2: str | None = user_2.rsn if user_2 and user_2.rsn else (name_2.display_name if isinstance(name_2, discord.User) else name_2)
+
+        if not username_2:
+            user_2 = await self.bot.cache.get_user(ctx.author.id)
+            if user_2 and user_2.rsn:
+                username_2 = username_1
+                username_1 = user_2.rsn
         
         if not username_2:
             raise commands.CommandError(message=f'Required argument missing: `RSN_2`. You can set your Old School username using the `setrsn` command, or add a second username as argument.')
@@ -1183,8 +1153,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.rsn if user and user.rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -1483,8 +1452,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.rsn if user and user.rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -1568,8 +1536,7 @@ class Runescape(Cog):
         if not disc_user and not username:
             disc_user = ctx.author if isinstance(ctx.author, discord.User) else ctx.author._user
         if disc_user:
-            async with self.bot.db.get_session() as session:
-                user: User | None = (await session.execute(select(User).where(User.id == disc_user.id))).scalar_one_or_none()
+            user: Row | None = await self.bot.cache.get_user(disc_user.id)
             name = user.rsn if user and user.rsn else disc_user.display_name
         if not name:
             name = username if isinstance(username, str) else None
@@ -27,9 +27,6 @@ class Servers(Cog):
         if banned_guild:
             await guild.leave()
             return
-        # Add guild to the cache
-        if db_guild:
-            self.bot.db_guild_cache[guild.id] = db_guild
 
     @Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild) -> None:
@@ -44,9 +41,6 @@ class Servers(Cog):
             if db_guild:
                 await purge_guild(session, db_guild)
                 await session.commit()
-        # Remove guild from cache
-        if guild.id in self.bot.db_guild_cache:
-            del self.bot.db_guild_cache[guild.id]
 
 async def setup(bot: Bot) -> None:
     await bot.add_cog(Servers(bot))
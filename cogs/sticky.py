@@ -1,22 +1,44 @@
+import asyncio
+import time
 from typing import Sequence
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog
-from sqlalchemy import delete
 from src.checks import is_admin
 from src.bot import Bot
 from src.database import StickyMessage
 from src.database_utils import get_sticky_messages
 
 class Sticky(Cog):
+    # Re-posting is debounced per channel: a sticky message is re-posted once its channel has been quiet for repost_delay seconds,
+    # or at the latest repost_max_delay seconds after the first message since the last re-post, such that it also shows in busy channels.
+    repost_delay: float = 3
+    repost_max_delay: float = 30
+
     def __init__(self, bot: Bot) -> None:
         self.bot: Bot = bot
+        # Time (monotonic) of the first and last message since the last re-post, and the pending re-post task, by channel id
+        self.repost_times: dict[int, tuple[float, float]] = {}
+        self.repost_tasks: dict[int, asyncio.Task] = {}
+
+    async def cog_load(self) -> None:
+        '''
+        Registers the sticky message handler, which the bot calls for messages in channels with a sticky message.
+        '''
+        self.bot.message_handlers['sticky'] = self.on_sticky_channel_message
+
+    async def cog_unload(self) -> None:
+        '''
+        Unregisters the sticky message handler, and cancels pending re-posts.
+        '''
+        self.bot.message_handlers.pop('sticky', None)
+        for task in self.repost_tasks.values():
+            task.cancel()
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
+    async def on_sticky_channel_message(self, message: discord.Message) -> None:
         '''
-        This event triggers on every message received by the bot. Including ones that it sent itself.
-        When a message is sent in a text channel with a sticky message, the sticky message will be re-sent.
+        Called by the bot for every message in a text channel with a sticky message. Including ones that it sent itself.
+        Schedules a re-post of the sticky message, see repost_delay.
 
         Args:
             message (discord.Message): The message
@@ -25,51 +47,78 @@ class Sticky(Cog):
         if not message.guild or not isinstance(message.channel, discord.TextChannel):
             return
         
-        # Get sticky message for this channel, if any
-        async with self.bot.db.get_session() as session:
-            sticky_messages: Sequence[StickyMessage] = await get_sticky_messages(session, message.guild.id, message.channel.id)
-        sticky_message: StickyMessage | None = sticky_messages[0] if sticky_messages else None
-
-        # If there is no sticky message, return
+        sticky_message: StickyMessage | None = self.bot.cache.get_sticky_message(message.channel.id)
         if not sticky_message:
             return
         
-        # If there is a sticky message for this channel, but the current message is sent by the bot itself and contains the same content, then we should ignore this event
+        # If the current message is sent by the bot itself and contains the same content, then it is the sticky message itself
         if message.author == self.bot.user and message.content == sticky_message.message:
             return
         
-        # If there is a sticky message for this channel, fetch the message
-        old_message: discord.Message | None = None
-        if sticky_message.message_id:
-            try:
-                old_message = await message.channel.fetch_message(sticky_message.message_id)
-            except discord.Forbidden:
-                pass
-        
-        # Then resend the message
-        new_message_id: int | None = None
+        now: float = time.monotonic()
+        first, _ = self.repost_times.get(message.channel.id, (now, now))
+        self.repost_times[message.channel.id] = (first, now)
+        if message.channel.id not in self.repost_tasks:
+            self.repost_tasks[message.channel.id] = asyncio.create_task(self.__debounced_repost(message.channel))
+
+    async def __debounced_repost(self, channel: discord.TextChannel) -> None:
+        '''
+        Wait until a re-post of the sticky message in a channel is due, and re-post it.
+        Messages that arrive during the re-post schedule another one.
+
+        Args:
+            channel (discord.TextChannel): The channel
+        '''
         try:
-            new_message: discord.Message = await message.channel.send(sticky_message.message)
-            new_message_id = new_message.id
-        except discord.Forbidden:
-            # If we lack permission to send messages in this channel, just remove the sticky message
-            async with self.bot.db.get_session() as session:
-                await session.execute(delete(StickyMessage).where(StickyMessage.guild_id == message.guild.id and StickyMessage.channel_id == message.channel.id))
-                await session.commit()
+            while channel.id in self.repost_times:
+                first, last = self.repost_times[channel.id]
+                wait: float = min(last + self.repost_delay, first + self.repost_max_delay) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                del self.repost_times[channel.id]
+                try:
+                    await self.repost(channel)
+                except discord.HTTPException:
+                    pass
+        finally:
+            self.repost_tasks.pop(channel.id, None)
+
+    async def repost(self, channel: discord.TextChannel) -> None:
+        '''
+        Re-send the sticky message of a channel, and delete the previous one.
+
+        Args:
+            channel (discord.TextChannel): The channel
+        '''
+        sticky_message: StickyMessage | None = self.bot.cache.get_sticky_message(channel.id)
+        if not sticky_message:
             return
+        old_message_id: int | None = sticky_message.message_id
+
+        new_message: discord.Message | None = None
+        try:
+            new_message = await channel.send(sticky_message.message)
+        except discord.Forbidden:
+            pass
 
+        # Sticky messages are updated / deleted through the session rather than in bulk, such that the cache only updates this channel
         async with self.bot.db.get_session() as session:
-            sticky_messages: Sequence[StickyMessage] = await get_sticky_messages(session, message.guild.id, message.channel.id)
-            sticky_message = sticky_messages[0] if sticky_messages else None
-            if sticky_message:
-                sticky_message.message_id = new_message_id
-                await session.commit()
+            db_sticky_message: StickyMessage | None = await session.get(StickyMessage, (channel.guild.id, channel.id))
+            if db_sticky_message and new_message:
+                db_sticky_message.message_id = new_message.id
+            elif db_sticky_message:
+                # If we lack permission to send messages in this channel, just remove the sticky message
+                await session.delete(db_sticky_message)
+            await session.commit()
+        if not new_message:
+            return
 
-        # Delete the old message, if any
-        if old_message:
+        # Delete the old message, if any. A partial message avoids fetching it first.
+        if old_message_id:
             try:
-                await old_message.delete()
-            except discord.Forbidden:
+                await channel.get_partial_message(old_message_id).delete()
+            except (discord.Forbidden, discord.NotFound):
                 pass
 
     @Cog.listener()
@@ -86,34 +135,15 @@ class Sticky(Cog):
             return
         
         # Get sticky message for this channel, if any
-        sticky_message: StickyMessage | None = None
-        
-        async with self.bot.db.get_session() as session:
-            sticky_messages: Sequence[StickyMessage] = await get_sticky_messages(session, message.guild.id, message.channel.id)
-            sticky_message = sticky_messages[0] if sticky_messages else None
+        sticky_message: StickyMessage | None = self.bot.cache.get_sticky_message(message.channel.id)
 
         # If there is no sticky message or it does not correspond to the deleted message, return
         if not sticky_message or not sticky_message.message_id or sticky_message.message_id != message.id:
             return
         
-        # Then resend the message
-        new_message_id: int | None = None
-        try:
-            new_message: discord.Message = await message.channel.send(sticky_message.message)
-            new_message_id = new_message.id
-        except discord.Forbidden:
-            # If we lack permission to send messages in this channel, just remove the sticky message
-            async with self.bot.db.get_session() as session:
-                await session.execute(delete(StickyMessage).where(StickyMessage.guild_id == message.guild.id and StickyMessage.channel_id == message.channel.id))
-                await session.commit()
-                return
-
-        async with self.bot.db.get_session() as session:
-            sticky_messages: Sequence[StickyMessage] = await get_sticky_messages(session, message.guild.id, message.channel.id)
-            sticky_message = sticky_messages[0] if sticky_messages else None
-            if sticky_message:
-                sticky_message.message_id = new_message_id
-                await session.commit()
+        # Then resend the message, unless a re-post is pending already
+        if message.channel.id not in self.repost_tasks:
+            await self.repost(message.channel)
 
     @is_admin()
     @commands.hybrid_command()
@@ -3,9 +3,9 @@ from discord.ext import commands
 from discord.ext.commands import Cog
 import asyncio
 from sqlalchemy import select
-from src.message_queue import QueueMessage
+from src.message_queue import MessagePriority, MessageSource, QueueMessage
 from src.bot import Bot
-from src.database import User
+from src.database import Row, User
 from datetime import datetime, timedelta, UTC
 from src.date_utils import timedelta_to_string, string_to_timezone
 import pytz
@@ -92,7 +92,7 @@ class Timer(Cog):
 
         await asyncio.sleep(time_seconds)
 
-        self.bot.queue_message(QueueMessage(ctx.channel, f'{ctx.author.mention} {msg if msg else "It's time!"}'))
+        self.bot.queue_message(QueueMessage(ctx.channel, f'{ctx.author.mention} {msg if msg else "It's time!"}', priority=MessagePriority.HIGH, source=MessageSource.TIMERS))
 
     @commands.command(aliases=['timezone'])
     async def tz(self, ctx: commands.Context, timezone: str = 'UTC') -> None:
@@ -148,8 +148,7 @@ class Timer(Cog):
         # US/Pacific = MST, US/Central = EST
         timezones: list[str] = ['US/Pacific', 'US/Central', 'US/Eastern', 'UTC', 'Europe/London', 'CET', 'Australia/ACT']
 
-        async with self.bot.db.get_session() as session:
-            user: User | None = (await session.execute(select(User).where(User.id == ctx.author.id))).scalar_one_or_none()
+        user: Row | None = await self.bot.cache.get_user(ctx.author.id)
 
         if user and user.timezone and not user.timezone in timezones:
             timezones.append(user.timezone)
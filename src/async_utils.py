@@ -1,23 +1,190 @@
-from asyncio import gather, sleep
-from typing import Coroutine
+from asyncio import Semaphore, Task, create_task, gather, sleep
+import time
+from typing import Any, Callable, Coroutine
 
-async def chunk_coroutines(coroutines: list[Coroutine], chunk_size: int, delay: int = 1) -> None:
+class TokenBucket:
     '''
-    Execute a list of coroutines with concurrency.
+    Token bucket rate limiter.
+    Tokens are refilled continuously at the given rate, up to the capacity of the bucket.
+    Each request takes one token, such that bursts of up to capacity requests are allowed,
+    while the sustained rate can not exceed the refill rate.
+    '''
+    rate: float
+    period: float
+    capacity: float
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: float, period: float = 1, capacity: float | None = None) -> None:
+        '''
+        Args:
+            rate (float): Number of tokens refilled per period
+            period (float, optional): The period in seconds. Defaults to 1.
+            capacity (float | None, optional): Maximum number of tokens in the bucket. Defaults to the rate.
+        '''
+        self.rate = rate
+        self.period = period
+        self.capacity = capacity if capacity else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        '''
+        Add the tokens that were refilled since the last update.
+
+        Args:
+            now (float): The current monotonic time
+        '''
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / self.period)
+        self.updated = now
+
+    def available(self, now: float) -> int:
+        '''
+        The number of tokens that can be taken right now.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            int: The number of whole tokens in the bucket
+        '''
+        self.refill(now)
+        return int(self.tokens)
+
+    def take(self, now: float, count: int = 1) -> None:
+        '''
+        Take tokens from the bucket.
+        The bucket may go into debt, which then has to be refilled before new tokens become available.
+
+        Args:
+            now (float): The current monotonic time
+            count (int, optional): The number of tokens to take. Defaults to 1.
+        '''
+        self.refill(now)
+        self.tokens -= count
+
+    def delay(self, now: float) -> float:
+        '''
+        Time until the next token is available.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            float: The delay in seconds, 0 if a token is available right now
+        '''
+        self.refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) * self.period / self.rate
+
+    async def acquire(self) -> None:
+        '''
+        Wait until a token is available, and take it.
+        '''
+        while (delay := self.delay(time.monotonic())) > 0:
+            await sleep(delay)
+        self.take(time.monotonic())
+
+class ConcurrencyLimiter:
+    '''
+    Executes coroutines with a bounded number of them in flight at any time.
+    Unlike executing fixed chunks of coroutines, a new coroutine is started as soon as any running one completes (sliding window),
+    so a single slow request does not hold up the others.
+    Optionally, starts are rate limited by a token bucket as well.
+    Note that the global rate limit = 50 requests per second.
+    '''
+    max_concurrency: int
+    semaphore: Semaphore
+    bucket: TokenBucket | None
+    tasks: set[Task]
+
+    def __init__(self, max_concurrency: int, rate: float | None = None, period: float = 1) -> None:
+        '''
+        Args:
+            max_concurrency (int): Maximum number of coroutines to execute concurrently
+            rate (float | None, optional): Maximum number of coroutines to start per period. Defaults to None (unlimited).
+            period (float, optional): The period for the rate limit in seconds. Defaults to 1.
+        '''
+        self.max_concurrency = max_concurrency
+        self.semaphore = Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, period) if rate else None
+        self.tasks = set()
+
+    def in_flight(self) -> int:
+        '''
+        The number of submitted coroutines that have not completed yet.
+
+        Returns:
+            int: The number of pending coroutines
+        '''
+        return len(self.tasks)
+
+    def free(self) -> int:
+        '''
+        The number of coroutines that can be submitted without having to wait for a slot.
+
+        Returns:
+            int: The number of free slots
+        '''
+        return max(0, self.max_concurrency - len(self.tasks))
+
+    async def run(self, coroutine: Coroutine) -> Any:
+        '''
+        Execute a coroutine once a slot (and a token, if rate limited) is available.
+
+        Args:
+            coroutine (Coroutine): The coroutine
+
+        Returns:
+            Any: The result of the coroutine
+        '''
+        async with self.semaphore:
+            if self.bucket:
+                await self.bucket.acquire()
+            return await coroutine
+
+    def submit(self, coroutine: Coroutine, on_done: Callable[[Task], Any] | None = None) -> Task:
+        '''
+        Schedule a coroutine for execution without waiting for it.
+
+        Args:
+            coroutine (Coroutine): The coroutine
+            on_done (Callable[[Task], Any] | None, optional): Callback to invoke when the coroutine completes. Defaults to None.
+
+        Returns:
+            Task: The task executing the coroutine
+        '''
+        task: Task = create_task(self.run(coroutine))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        if on_done:
+            task.add_done_callback(on_done)
+        return task
+
+    async def gather(self, coroutines: list[Coroutine]) -> list[Any]:
+        '''
+        Execute a list of coroutines and wait for all of them to complete.
+
+        Args:
+            coroutines (list[Coroutine]): The coroutines
+
+        Returns:
+            list[Any]: The results, in the same order as the coroutines
+        '''
+        return await gather(*[self.run(coroutine) for coroutine in coroutines])
+
+async def execute_concurrently(coroutines: list[Coroutine], max_concurrency: int, rate: float | None = None) -> list[Any]:
+    '''
+    Execute a list of coroutines with bounded concurrency, and optionally a rate limit.
     Note that the global rate limit = 50 requests per second.
 
     Args:
-        chunk_size (int): Number of coroutines to execute concurrently
-        delay (int, optional): Delay in seconds between execution of consecutive chunks. Defaults to 1.
+        coroutines (list[Coroutine]): The coroutines
+        max_concurrency (int): Maximum number of coroutines to execute concurrently
+        rate (float | None, optional): Maximum number of coroutines to start per second. Defaults to None (unlimited).
+
+    Returns:
+        list[Any]: The results, in the same order as the coroutines
     '''
     if not coroutines:
-        return
-    i: int = 0
-    # Split list of coroutines into chunks to avoid rate limits
-    for chunk in [coroutines[j:j + chunk_size] for j in range(0, len(coroutines), chunk_size)]:
-        i += len(chunk)
-        # Execute the chunk of coroutines
-        await gather(*chunk)
-        # Sleep for a second after each chunk of requests to avoid rate limits (all but the last chunk, because then we are already done)
-        if i < len(coroutines):
-            await sleep(delay)
\ No newline at end of file
+        return []
+    return await ConcurrencyLimiter(max_concurrency, rate).gather(coroutines)
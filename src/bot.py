@@ -1,6 +1,7 @@
+import asyncio
 from datetime import datetime, UTC
 import os
-from typing import Any, Sequence
+from typing import Any, Callable, Coroutine, Sequence
 import discord
 from discord.ext import commands
 from sqlalchemy import select
@@ -47,13 +48,22 @@ class Bot(commands.AutoShardedBot):
     events_logged: int = 0
     command_counter = 0
 
-    message_queue: MessageQueue = MessageQueue()
+    message_queue: MessageQueue
     db: Database
     cache: Cache
 
+    # Handlers for guild messages in channels with a specific feature, by feature: 'sticky' and 'modmail'.
+    # Registered by cogs, and invoked by on_message only for channels that have the feature, see ChannelFeatures.
+    message_handlers: dict[str, Callable[[discord.Message], Coroutine[Any, Any, None]]]
+    # Command prefix of messages that are being processed, by message id, as resolved by on_message
+    resolved_prefixes: dict[int, str]
+
     def __init__(self) -> None:
         self.config = get_config()
+        self.message_queue = MessageQueue(max_size=self.config.get('message_queue_max_size', 10000))
         self.start_time = datetime.now(UTC).replace(microsecond=0)
+        self.message_handlers = {}
+        self.resolved_prefixes = {}
 
         intents: discord.Intents = discord.Intents.all()
         super().__init__(
@@ -83,8 +93,9 @@ class Bot(commands.AutoShardedBot):
     async def get_command_prefix(self, bot: commands.AutoShardedBot, message: discord.message.Message) -> list[str]:
         '''
         A coroutine that returns a prefix.
-        Looks in database for prefix corresponding to the server the message was sent in
-        If none found, return default prefix '-'
+        Reuses the prefix resolved by on_message if the message is being processed,
+        and otherwise uses the precomputed prefixes of the guild the message was sent in.
+        If the message was not sent in a guild, return the default prefix '-'
 
         Args:
             bot (commands.AutoShardedBot): The bot
@@ -93,19 +104,30 @@ class Bot(commands.AutoShardedBot):
         Returns:
             List[str]: list of prefixes
         '''
+        prefix: str | None = self.resolved_prefixes.get(message.id)
+        if prefix is not None:
+            return [prefix]
         guild: Guild | None = self.cache.get_guild(message.guild.id) if message.guild else None
-        prefix: str = guild.prefix if guild and guild.prefix else '-'
-        return commands.when_mentioned_or(prefix)(bot, message)
+        if not guild:
+            return commands.when_mentioned_or('-')(bot, message)
+        return self.cache.get_channel_features(guild, self.user.id if self.user else None).command_prefixes
     
     async def restart(self, error: str | None = None) -> None:
         '''
         Restarts the bot.
         The script runs in a loop, so by quitting, the bot will automatically restart.
+        Snapshots of the item caches are written first, such that the restarted bot only needs to load recent changes.
+        Pending price updates are written to the database as part of this, see Cache.write_snapshots.
 
         Args:
             error (str | None, optional): Error to be sent. Defaults to None.
         '''
         print(f"{error}\nRestarting script...")
+        try:
+            async with asyncio.timeout(10):
+                await self.cache.write_snapshots()
+        except Exception as e:
+            print(f'Failed to write cache snapshots: {type(e).__name__}: {e}')
         if error:
             await get_text_channel(self, self.config['testChannel']).send(error)
         os._exit(0)
@@ -122,14 +144,18 @@ class Bot(commands.AutoShardedBot):
         '''
         return self.command_counter
     
-    def queue_message(self, message: QueueMessage) -> None:
+    def queue_message(self, message: QueueMessage) -> bool:
         '''
         Add a message to the message queue.
+        This wakes up the message sender, such that the message is sent as soon as rate limits allow.
 
         Args:
             message (QueueMessage): The message to add to the queue
+
+        Returns:
+            bool: True if the message was queued, False if it was dropped because it expired, was a duplicate, or the queue was full
         '''
-        self.message_queue.append(message)
+        return self.message_queue.append(message)
 
     async def get_custom_command_aliases(self) -> list[str]:
         '''
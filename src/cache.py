@@ -1,18 +1,228 @@
-from typing import Sequence
+import asyncio
+from datetime import UTC, datetime, timedelta
+import logging
+from pathlib import Path
+import time
+from typing import Any, Awaitable, Callable, Coroutine, Sequence
 import discord
-from sqlalchemy import select
+from sqlalchemy import Select, inspect, or_, select
+from sqlalchemy.orm import defer
+import numpy as np
 import src.bot
-from src.database import Database, Guild, OSRSItem, RS3Item
+from src.cache_region import CacheRegion
+from src.channel_features import ChannelFeatures
+from src.database import Base, Command, CustomRoleReaction, Database, Guild, NotificationWebhook, OnlineNotification, OSRSItem, PriceHistory, RS3Item, Row, StickyMessage, User
+from src.database_utils import match_custom_db_command
+from src.price_store import ItemPrices, history_from_rows, read_snapshot, write_snapshot
+from src.search_index import NameSearchIndex
 
 class Cache():
     db: Database
 
     guilds: dict[int, Guild] = {}
-    osrs_items: dict[int, OSRSItem] = {}
-    rs3_items: dict[int, RS3Item] = {}
+    # Items are cached in a compact form, with their price history as arrays
+    osrs_items: dict[int, ItemPrices] = {}
+    rs3_items: dict[int, ItemPrices] = {}
+    osrs_item_index: NameSearchIndex = NameSearchIndex()
+    rs3_item_index: NameSearchIndex = NameSearchIndex()
+    notification_webhooks: dict[int, NotificationWebhook] = {}
+    # All sticky messages by channel id, and the ids of the channels with a sticky message by guild id
+    sticky_messages: dict[int, StickyMessage] = {}
+    sticky_channels: dict[int, set[int]] = {}
+    # Features that apply to messages in each guild, by guild id. Built on first use, and discarded when the guild or its sticky channels change.
+    channel_features: dict[int, ChannelFeatures] = {}
+    # Reload of the sticky messages after a bulk change, if any
+    sticky_messages_reload: asyncio.Task | None = None
+
+    # Read-through cache regions for data that is read on hot paths, such as message and presence events.
+    # These are invalidated whenever changes to the underlying rows are committed.
+    # Values are read-only rows of the models, see Database.fetch_one
+    users: CacheRegion[int, Row | None] # By user id
+    custom_commands: CacheRegion[int, Sequence[Row]] # By guild id
+    role_reactions: CacheRegion[int, Sequence[Row]] # By guild id
+    online_notifications: CacheRegion[int, Sequence[Row]] # By guild id
+
+    # Directory in which snapshots of the item caches are stored, to speed up restarts.
+    # Resolved from the project root rather than the working directory, such that the bot finds its snapshots regardless of where it is started.
+    snapshot_dir: Path = Path(__file__).resolve().parent.parent / 'data' / 'cache'
+    # Snapshots are considered to reflect the database up to this long before they were written, to allow for clock differences and in-flight transactions
+    snapshot_margin: timedelta = timedelta(minutes=1)
+    # Writes pending changes of an item cache to the database, by cache name, e.g. PriceWriter.flush.
+    # Awaited after the items for a snapshot are copied, and before they are written, such that snapshots never contain changes that the database did not receive.
+    # A flusher must write all changes that were made before it was called, including those of any flush that is still in progress.
+    snapshot_flushers: dict[str, Callable[[], Awaitable[Any]]]
+
+    # Set once the corresponding data has been loaded, by name: 'guilds', 'osrs_items', 'rs3_items', 'notification_webhooks' and 'sticky_messages'
+    ready: dict[str, asyncio.Event]
+    # Time in seconds it took to load each of the above
+    load_times: dict[str, float]
 
     def __init__(self, db: Database) -> None:
         self.db = db
+        self.ready = {name: asyncio.Event() for name in ['guilds', 'osrs_items', 'rs3_items', 'notification_webhooks', 'sticky_messages']}
+        self.load_times = {}
+        self.snapshot_flushers = {}
+
+        self.users = CacheRegion('users', self.__load_user, ttl=3600)
+        self.custom_commands = CacheRegion('custom_commands', self.__load_custom_commands)
+        self.role_reactions = CacheRegion('role_reactions', self.__load_role_reactions)
+        self.online_notifications = CacheRegion('online_notifications', self.__load_online_notifications)
+
+        self.db.on_commit(Guild, self.__guild_committed)
+        self.__invalidate_on_commit(User, self.users, lambda u: u.id)
+        self.db.on_commit(StickyMessage, self.__sticky_message_committed)
+        self.__invalidate_on_commit(Command, self.custom_commands, lambda c: c.guild_id)
+        self.__invalidate_on_commit(CustomRoleReaction, self.role_reactions, lambda r: r.guild_id)
+        self.__invalidate_on_commit(OnlineNotification, self.online_notifications, lambda n: n.guild_id)
+
+    def __invalidate_on_commit(self, model: type[Base], region: CacheRegion, key: Callable[[Any], Any]) -> None:
+        '''
+        Invalidate a cache region whenever changes to a model are committed.
+        Changed objects invalidate the entry for their key, bulk updates and deletes invalidate the whole region.
+
+        Args:
+            model (type[Base]): The model class
+            region (CacheRegion): The cache region
+            key (Callable[[Any], Any]): Gets the region key of an object of the model
+        '''
+        self.db.on_commit(model, lambda obj: region.invalidate(key(obj)) if obj is not None else region.clear())
+
+    def __guild_committed(self, guild: Guild | None) -> None:
+        '''
+        Keep the guild cache up to date with committed changes to guilds.
+
+        Args:
+            guild (Guild | None): The changed guild, or None after a bulk update
+        '''
+        if guild is None:
+            return
+        if inspect(guild).was_deleted:
+            self.guilds.pop(guild.id, None)
+            self.channel_features.pop(guild.id, None)
+            for channel_id in self.sticky_channels.pop(guild.id, set()):
+                self.sticky_messages.pop(channel_id, None)
+            # Data of the guild is removed by cascading deletes in the database, which do not pass through the commit hooks
+            for region in [self.custom_commands, self.role_reactions, self.online_notifications]:
+                region.invalidate(guild.id)
+            for channel_id in [w.channel_id for w in self.notification_webhooks.values() if w.guild_id == guild.id]:
+                self.remove_notification_webhook(channel_id)
+        else:
+            self.guild(guild)
+
+    def __sticky_message_committed(self, sticky_message: StickyMessage | None) -> None:
+        '''
+        Keep the sticky message cache up to date with committed changes to sticky messages.
+        The channel features of the guild are only rebuilt when a channel gains or loses its sticky message,
+        not when a sticky message is re-posted.
+
+        Args:
+            sticky_message (StickyMessage | None): The changed sticky message, or None after a bulk update / delete
+        '''
+        if sticky_message is None:
+            # The affected channels are unknown, so reload them all
+            self.sticky_messages_reload = asyncio.create_task(self.__cache_sticky_messages())
+            return
+        channel_ids: set[int] = self.sticky_channels.setdefault(sticky_message.guild_id, set())
+        if inspect(sticky_message).was_deleted:
+            self.sticky_messages.pop(sticky_message.channel_id, None)
+            if sticky_message.channel_id in channel_ids:
+                channel_ids.discard(sticky_message.channel_id)
+                self.channel_features.pop(sticky_message.guild_id, None)
+        else:
+            self.sticky_messages[sticky_message.channel_id] = sticky_message
+            if sticky_message.channel_id not in channel_ids:
+                channel_ids.add(sticky_message.channel_id)
+                self.channel_features.pop(sticky_message.guild_id, None)
+
+    def regions(self) -> list[CacheRegion]:
+        '''
+        Get all read-through cache regions.
+
+        Returns:
+            list[CacheRegion]: The cache regions
+        '''
+        return [self.users, self.custom_commands, self.role_reactions, self.online_notifications]
+
+    # Cache misses are loaded through the database fast path, as read-only rows rather than ORM objects
+    async def __load_user(self, user_id: int) -> Row | None:
+        return await self.db.fetch_one(User, id=user_id)
+
+    async def __load_custom_commands(self, guild_id: int) -> Sequence[Row]:
+        return await self.db.fetch_all(Command, guild_id=guild_id)
+
+    async def __load_role_reactions(self, guild_id: int) -> Sequence[Row]:
+        return await self.db.fetch_all(CustomRoleReaction, guild_id=guild_id)
+
+    async def __load_online_notifications(self, guild_id: int) -> Sequence[Row]:
+        return await self.db.fetch_all(OnlineNotification, guild_id=guild_id)
+
+    async def get_user(self, user_id: int) -> Row | None:
+        '''
+        Get a user, e.g. to look up their RSN, through the cache.
+        The returned object is a shared read-only row, which can not be modified or added to a session.
+
+        Args:
+            user_id (int): The user id
+
+        Returns:
+            Row | None: The user, if found
+        '''
+        return await self.users.get(user_id)
+
+    def get_sticky_message(self, channel_id: int) -> StickyMessage | None:
+        '''
+        Get the sticky message for a channel from the cache.
+        The cache holds all sticky messages, so this never needs to query the database.
+
+        Args:
+            channel_id (int): The channel id
+
+        Returns:
+            StickyMessage | None: The sticky message, if any
+        '''
+        return self.sticky_messages.get(channel_id)
+
+    async def find_custom_command(self, guild_id: int, command_name_or_alias: str) -> Row | None:
+        '''
+        Find a custom command by name or alias through the cache.
+        The returned object is a shared read-only row, which can not be modified or added to a session.
+
+        Args:
+            guild_id (int): The guild id
+            command_name_or_alias (str): The command name or an alias
+
+        Returns:
+            Row | None: The command, if found
+        '''
+        return match_custom_db_command(await self.custom_commands.get(guild_id), command_name_or_alias)
+
+    async def find_role_reaction(self, guild_id: int, emoji_id: int) -> Row | None:
+        '''
+        Find the custom role reaction for an emoji through the cache.
+        The returned object is a shared read-only row, which can not be modified or added to a session.
+
+        Args:
+            guild_id (int): The guild id
+            emoji_id (int): The emoji id
+
+        Returns:
+            Row | None: The role reaction, if any
+        '''
+        return next((r for r in await self.role_reactions.get(guild_id) if r.emoji_id == emoji_id), None)
+
+    async def find_online_notification(self, guild_id: int, member_id: int) -> Row | None:
+        '''
+        Find an online notification for a member through the cache.
+        The returned object is a shared read-only row, which can not be modified or added to a session.
+
+        Args:
+            guild_id (int): The guild id
+            member_id (int): The id of the member whose status is tracked
+
+        Returns:
+            Row | None: The online notification, if any
+        '''
+        return next((n for n in await self.online_notifications.get(guild_id) if n.member_id == member_id), None)
 
     async def build(self) -> None:
         '''
@@ -21,10 +231,59 @@ class Cache():
         - Guild
         - OSRSItem
         - RS3Item
+        - NotificationWebhook
+        - StickyMessage
+        The caches are loaded concurrently, and each one signals its readiness as soon as it is loaded,
+        such that features only have to wait for the data they use. Guilds are started first, as they are needed to process any commands.
+        '''
+        await asyncio.gather(
+            self.__load('guilds', self.__cache_guilds()),
+            self.__load('osrs_items', self.__cache_items_osrs()),
+            self.__load('rs3_items', self.__cache_items_rs3()),
+            self.__load('notification_webhooks', self.__cache_notification_webhooks()),
+            self.__load('sticky_messages', self.__cache_sticky_messages())
+        )
+
+    async def __load(self, name: str, loader: Coroutine) -> None:
+        '''
+        Load a cache, record how long it took, and mark it as ready.
+        Errors are raised after marking the cache as ready.
+
+        Args:
+            name (str): The name of the cache
+            loader (Coroutine): The coroutine that loads the cache
+        '''
+        start: float = time.monotonic()
+        try:
+            await loader
+        finally:
+            # Mark the cache as ready even if loading failed, such that nothing waits for it indefinitely
+            self.load_times[name] = time.monotonic() - start
+            self.ready[name].set()
+        msg: str = f'Cached {name} in {self.load_times[name]:.2f} s'
+        print(msg)
+        logging.info(msg)
+
+    def is_ready(self, name: str) -> bool:
+        '''
+        Whether a cache has been loaded.
+
+        Args:
+            name (str): The name of the cache: 'guilds', 'osrs_items', 'rs3_items', 'notification_webhooks' or 'sticky_messages'
+
+        Returns:
+            bool: True if the cache is ready
+        '''
+        return self.ready[name].is_set()
+
+    async def wait_until_ready(self, name: str) -> None:
         '''
-        await self.__cache_guilds()
-        await self.__cache_items_osrs()
-        await self.__cache_items_rs3()
+        Wait until a cache has been loaded.
+
+        Args:
+            name (str): The name of the cache: 'guilds', 'osrs_items', 'rs3_items', 'notification_webhooks' or 'sticky_messages'
+        '''
+        await self.ready[name].wait()
 
     async def __cache_guilds(self) -> None:
         '''
@@ -41,21 +300,117 @@ class Cache():
         '''
         Initialize OSRS item cache
         '''
-        items: Sequence[OSRSItem] = []
-        async with self.db.get_session() as session:
-            items: Sequence[OSRSItem] = (await session.execute(select(OSRSItem))).scalars().all()
-        for i in items:
-            self.osrs_items[i.id] = i
+        await self.__cache_items(OSRSItem, 'osrs', self.osrs_items, self.osrs_item_index, 'osrs_items')
     
     async def __cache_items_rs3(self) -> None:
         '''
         Initialize RS3 item cache
         '''
-        items: Sequence[RS3Item] = []
+        await self.__cache_items(RS3Item, 'rs3', self.rs3_items, self.rs3_item_index, 'rs3_items')
+
+    async def __cache_items(self, model: type[OSRSItem] | type[RS3Item], game: str, items: dict[int, ItemPrices], index: NameSearchIndex, name: str) -> None:
+        '''
+        Initialize an item cache from its snapshot on disk, if any, and the database.
+        With a snapshot, only the items that changed since the snapshot are loaded from the database,
+        such that loading time does not grow with the size of the price histories.
+        Price histories are loaded from the price_history table.
+
+        Args:
+            model (type[OSRSItem] | type[RS3Item]): The item model
+            game (str): The game of the items in the price_history table, 'osrs' or 'rs3'
+            items (dict[int, ItemPrices]): The item cache
+            index (NameSearchIndex): The item search index
+            name (str): The name of the cache, which is also the name of the snapshot
+        '''
+        snapshot: tuple[datetime, dict[int, ItemPrices]] | None = await asyncio.to_thread(read_snapshot, self.snapshot_dir / name)
+        snapshot_items: dict[int, ItemPrices] = {}
+        changed: Sequence[OSRSItem | RS3Item] = []
+        history: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        async with self.db.get_session() as session:
+            history_query: Select = select(PriceHistory.item_id, PriceHistory.day, PriceHistory.price).where(PriceHistory.game == game).order_by(PriceHistory.item_id, PriceHistory.day)
+            if snapshot:
+                created_at, snapshot_items = snapshot
+                # Items that were removed since the snapshot are dropped
+                ids: set[int] = set((await session.execute(select(model.id))).scalars().all())
+                snapshot_items = {id: item for id, item in snapshot_items.items() if id in ids}
+                changed = (await session.execute(select(model).options(defer(model.graph_data)).where(or_(model.updated_at.is_(None), model.updated_at > created_at)))).scalars().all()
+                if changed:
+                    history = history_from_rows((await session.execute(history_query.where(PriceHistory.item_id.in_([row.id for row in changed])))).tuples().all())
+            else:
+                changed = (await session.execute(select(model).options(defer(model.graph_data)))).scalars().all()
+                history = history_from_rows((await session.execute(history_query)).tuples().all())
+        empty: tuple[np.ndarray, np.ndarray] = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        for item in snapshot_items.values():
+            items[item.id] = item
+            index.add(item.id, item.name)
+        for row in changed:
+            items[row.id] = ItemPrices(row, history.get(row.id, empty))
+            index.add(row.id, row.name)
+        if snapshot:
+            msg: str = f'Loaded {len(snapshot_items)} {name} from snapshot, {len(changed)} changed since'
+            print(msg)
+            logging.info(msg)
+
+    async def write_snapshots(self) -> None:
+        '''
+        Write snapshots of the item caches to disk, for faster loading after a restart.
+        Caches that are not loaded yet are skipped.
+        The items are copied first, and the changes made up to then are flushed to the database before the copy is written, see snapshot_flushers.
+        Changes made while flushing are not in the copy, so they are picked up from the database when the snapshot is loaded.
+        If flushing fails, the exception is raised, and the previous snapshot is kept, as the new one would contain changes that are not in the database.
+        '''
+        for name, items in [('osrs_items', self.osrs_items), ('rs3_items', self.rs3_items)]:
+            if not self.is_ready(name):
+                continue
+            # Items are replaced rather than modified when they change, so a copy of the list is consistent while it is written in another thread
+            created_at: datetime = datetime.now(UTC) - self.snapshot_margin
+            snapshot_items: list[ItemPrices] = list(items.values())
+            flush: Callable[[], Awaitable[Any]] | None = self.snapshot_flushers.get(name)
+            if flush:
+                await flush()
+            await asyncio.to_thread(write_snapshot, self.snapshot_dir / name, snapshot_items, created_at)
+
+    async def __cache_notification_webhooks(self) -> None:
+        '''
+        Initialize notification webhook cache
+        '''
+        webhooks: Sequence[NotificationWebhook] = []
+        async with self.db.get_session() as session:
+            webhooks: Sequence[NotificationWebhook] = (await session.execute(select(NotificationWebhook))).scalars().all()
+        for w in webhooks:
+            self.notification_webhooks[w.channel_id] = w
+
+    async def __cache_sticky_messages(self) -> None:
+        '''
+        Initialize sticky message cache
+        '''
         async with self.db.get_session() as session:
-            items: Sequence[RS3Item] = (await session.execute(select(RS3Item))).scalars().all()
-        for i in items:
-            self.rs3_items[i.id] = i
+            sticky_messages: Sequence[StickyMessage] = (await session.execute(select(StickyMessage))).scalars().all()
+        sticky_channels: dict[int, set[int]] = {}
+        for sticky_message in sticky_messages:
+            sticky_channels.setdefault(sticky_message.guild_id, set()).add(sticky_message.channel_id)
+        self.sticky_messages.clear()
+        self.sticky_messages.update({sticky_message.channel_id: sticky_message for sticky_message in sticky_messages})
+        self.sticky_channels.clear()
+        self.sticky_channels.update(sticky_channels)
+        self.channel_features.clear()
+
+    def get_channel_features(self, guild: Guild, user_id: int | None) -> ChannelFeatures:
+        '''
+        Get the features that apply to messages in a guild, building them if needed.
+
+        Args:
+            guild (Guild): The cached guild
+            user_id (int | None): The user id of the bot, which is the same for all guilds
+
+        Returns:
+            ChannelFeatures: The channel features of the guild
+        '''
+        features: ChannelFeatures | None = self.channel_features.get(guild.id)
+        if not features:
+            features = ChannelFeatures(guild, self.sticky_channels.get(guild.id, set()), user_id)
+            self.channel_features[guild.id] = features
+        return features
 
     def get_guild(self, guild_or_id: discord.Guild | int | None) -> Guild | None:
         '''
@@ -78,37 +433,128 @@ class Cache():
             guild (Guild): The guild to add to the cache.
         '''
         self.guilds[guild.id] = guild
+        self.channel_features.pop(guild.id, None)
+
+    def osrs_item(self, item: OSRSItem, history: tuple[np.ndarray, np.ndarray] | None = None) -> None:
+        '''
+        Add / update an OSRS item in the cache and the item search index.
+
+        Args:
+            item (OSRSItem): The item to add to the cache.
+            history (tuple[np.ndarray, np.ndarray] | None, optional): The price history, if it differs from the graph data of the item. Defaults to None.
+        '''
+        self.osrs_items[item.id] = ItemPrices(item, history)
+        self.osrs_item_index.add(item.id, item.name)
+
+    def remove_osrs_item(self, item_id: int) -> None:
+        '''
+        Remove an OSRS item from the cache and the item search index.
+
+        Args:
+            item_id (int): The item id
+        '''
+        self.osrs_items.pop(item_id, None)
+        self.osrs_item_index.remove(item_id)
+
+    def rs3_item(self, item: RS3Item, history: tuple[np.ndarray, np.ndarray] | None = None) -> None:
+        '''
+        Add / update an RS3 item in the cache and the item search index.
+
+        Args:
+            item (RS3Item): The item to add to the cache.
+            history (tuple[np.ndarray, np.ndarray] | None, optional): The price history, if it differs from the graph data of the item. Defaults to None.
+        '''
+        self.rs3_items[item.id] = ItemPrices(item, history)
+        self.rs3_item_index.add(item.id, item.name)
+
+    def remove_rs3_item(self, item_id: int) -> None:
+        '''
+        Remove an RS3 item from the cache and the item search index.
+
+        Args:
+            item_id (int): The item id
+        '''
+        self.rs3_items.pop(item_id, None)
+        self.rs3_item_index.remove(item_id)
+
+    def search_osrs_items(self, name: str) -> tuple[ItemPrices | None, list[ItemPrices]]:
+        '''
+        Search the OSRS item cache for the item with the name closest to the given input.
+        The search is case-insensitive, and prefers exact matches, then names starting with the input, then the shortest names containing the input.
+
+        Args:
+            name (str): The (part of the) item name to search for
+
+        Returns:
+            tuple[ItemPrices | None, list[ItemPrices]]: Best matching OSRS item, if any, and other suggestions (did you mean)
+        '''
+        best, suggestions = self.osrs_item_index.search(name)
+        return (self.osrs_items[best] if best is not None else None), [self.osrs_items[id] for id in suggestions]
+
+    def search_rs3_items(self, name: str) -> tuple[ItemPrices | None, list[ItemPrices]]:
+        '''
+        Search the RS3 item cache for the item with the name closest to the given input.
+        The search is case-insensitive, and prefers exact matches, then names starting with the input, then the shortest names containing the input.
+
+        Args:
+            name (str): The (part of the) item name to search for
+
+        Returns:
+            tuple[ItemPrices | None, list[ItemPrices]]: Best matching RS3 item, if any, and other suggestions (did you mean)
+        '''
+        best, suggestions = self.rs3_item_index.search(name)
+        return (self.rs3_items[best] if best is not None else None), [self.rs3_items[id] for id in suggestions]
 
-    def get_osrs_item_by_name(self, name: str) -> OSRSItem | None:
+    def get_osrs_item_by_name(self, name: str) -> ItemPrices | None:
         '''
         Get OSRS item from cache with name closest to the given input, if any.
 
         Args:
-            name (str): The substring of item name to search for
+            name (str): The (part of the) item name to search for
 
         Returns:
-            OSRSItem | None: Best matching OSRS item, if any
-        '''
-        matching_items: list[OSRSItem] = [item for item in self.osrs_items.values() if name in item.name]
-        if not matching_items:
-            return None
-        # Get the best match by picking the item with the shortest name: i.e. the one closest to the provided input
-        sorted_matches: list[OSRSItem] = sorted(matching_items, key=lambda i: len(i.name))
-        return sorted_matches[0]
+            ItemPrices | None: Best matching OSRS item, if any
+        '''
+        return self.search_osrs_items(name)[0]
     
-    def get_rs3_item_by_name(self, name: str) -> RS3Item | None:
+    def get_rs3_item_by_name(self, name: str) -> ItemPrices | None:
         '''
         Get RS3 item from cache with name closest to the given input, if any.
 
         Args:
-            name (str): The substring of item name to search for
+            name (str): The (part of the) item name to search for
+
+        Returns:
+            ItemPrices | None: Best matching RS3 item, if any
+        '''
+        return self.search_rs3_items(name)[0]
+
+    def get_notification_webhook(self, channel_id: int) -> NotificationWebhook | None:
+        '''
+        Get the notification webhook for a channel from the cache.
+
+        Args:
+            channel_id (int): The channel id
 
         Returns:
-            RS3Item | None: Best matching RS3 item, if any
-        '''
-        matching_items: list[RS3Item] = [item for item in self.rs3_items.values() if name in item.name]
-        if not matching_items:
-            return None
-        # Get the best match by picking the item with the shortest name: i.e. the one closest to the provided input
-        sorted_matches: list[RS3Item] = sorted(matching_items, key=lambda i: len(i.name))
-        return sorted_matches[0]
\ No newline at end of file
+            NotificationWebhook | None: The notification webhook, if any
+        '''
+        return self.notification_webhooks.get(channel_id)
+
+    def notification_webhook(self, webhook: NotificationWebhook) -> None:
+        '''
+        Add / update a notification webhook in the cache.
+
+        Args:
+            webhook (NotificationWebhook): The notification webhook to add to the cache.
+        '''
+        self.notification_webhooks[webhook.channel_id] = webhook
+
+    def remove_notification_webhook(self, channel_id: int) -> None:
+        '''
+        Remove a notification webhook from the cache.
+
+        Args:
+            channel_id (int): The channel id
+        '''
+        self.notification_webhooks.pop(channel_id, None)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import asyncio
+from collections import OrderedDict
+import time
+from typing import Awaitable, Callable, Generic, TypeVar
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+class CacheRegion(Generic[K, V]):
+    '''
+    Read-through cache for a single type of data, e.g. database rows of one model.
+    Values are loaded on a cache miss by the region's loader, and kept for a limited time (TTL).
+    The number of entries is bounded, evicting the least recently used entries first (LRU).
+    Concurrent misses for the same key share a single load.
+    Entries are invalidated by key (or all at once) when the underlying data changes.
+    '''
+    name: str
+    loader: Callable[[K], Awaitable[V]]
+    ttl: float
+    max_size: int
+    # Expiration time (monotonic) and value per key, least recently used first
+    entries: OrderedDict[K, tuple[float, V]]
+    # Pending loads per key
+    loading: dict[K, asyncio.Task[V]]
+    # Incremented on every invalidation, such that loads that started before an invalidation do not store stale values
+    generation: int
+    hits: int
+    misses: int
+
+    def __init__(self, name: str, loader: Callable[[K], Awaitable[V]], ttl: float = 600, max_size: int = 10000) -> None:
+        '''
+        Args:
+            name (str): The name of the region
+            loader (Callable[[K], Awaitable[V]]): Loads the value for a key on a cache miss
+            ttl (float, optional): Time in seconds after which entries are reloaded. Defaults to 600.
+            max_size (int, optional): Maximum number of entries. Defaults to 10000.
+        '''
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    async def get(self, key: K) -> V:
+        '''
+        Get the value for a key, loading it if it is not cached or has expired.
+
+        Args:
+            key (K): The key
+
+        Returns:
+            V: The value
+        '''
+        entry: tuple[float, V] | None = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        task: asyncio.Task[V] | None = self.loading.get(key)
+        if not task:
+            task = asyncio.create_task(self.load(key))
+            self.loading[key] = task
+        # Shield the load, such that a cancelled caller does not cancel the load for other callers
+        return await asyncio.shield(task)
+
+    async def load(self, key: K) -> V:
+        '''
+        Load the value for a key, and cache it unless the region was invalidated in the meantime.
+
+        Args:
+            key (K): The key
+
+        Returns:
+            V: The value
+        '''
+        generation: int = self.generation
+        try:
+            value: V = await self.loader(key)
+            if generation == self.generation:
+                self.set(key, value)
+            return value
+        finally:
+            # The load may have been replaced by a newer one after an invalidation, which must be kept
+            if self.loading.get(key) is asyncio.current_task():
+                del self.loading[key]
+
+    def set(self, key: K, value: V) -> None:
+        '''
+        Cache a value, evicting the least recently used entries if the region is full.
+
+        Args:
+            key (K): The key
+            value (V): The value
+        '''
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        '''
+        Remove the entry for a key, such that it is reloaded on the next access.
+        A load of the key that is in progress may return stale data, so later accesses start a new load instead of joining it.
+
+        Args:
+            key (K): The key
+        '''
+        self.generation += 1
+        self.entries.pop(key, None)
+        self.loading.pop(key, None)
+
+    def clear(self) -> None:
+        '''
+        Remove all entries, and detach the loads in progress, see invalidate.
+        '''
+        self.generation += 1
+        self.entries.clear()
+        self.loading.clear()
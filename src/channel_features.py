@@ -0,0 +1,130 @@
+from typing import Any, Iterable
+from src.database import Guild
+
+class CommandTrie:
+    '''
+    Prefix tree of command names, to find the command that a message invokes in a single pass over its characters,
+    rather than comparing the message to every command name.
+    '''
+    # Nested dicts by character. The empty string marks the end of a command name, and maps to that name.
+    root: dict[str, Any]
+
+    def __init__(self, names: Iterable[str]) -> None:
+        '''
+        Args:
+            names (Iterable[str]): The command names
+        '''
+        self.root = {}
+        for name in names:
+            if not name:
+                continue
+            node: dict[str, Any] = self.root
+            for char in name:
+                node = node.setdefault(char, {})
+            node[''] = name
+
+    def __bool__(self) -> bool:
+        return bool(self.root)
+
+    def match(self, content: str, start: int = 0) -> str | None:
+        '''
+        Find the shortest command name that the content starts with, from a given position.
+
+        Args:
+            content (str): The content, e.g. a message
+            start (int, optional): The position to start matching at, e.g. the length of the prefix. Defaults to 0.
+
+        Returns:
+            str | None: The command name, if any
+        '''
+        node: dict[str, Any] = self.root
+        for i in range(start, len(content)):
+            if '' in node:
+                return node['']
+            next: dict[str, Any] | None = node.get(content[i])
+            if next is None:
+                return None
+            node = next
+        return node.get('')
+
+class ChannelFeatures:
+    '''
+    Precomputed per-guild record of the features that apply to messages in its channels.
+    Used to route guild messages only to the listeners that apply to them, such that a plain chat message needs no I/O.
+    Records are immutable, and rebuilt by the cache whenever the guild or its sticky messages change.
+    '''
+    guild_id: int
+    prefix: str
+    # Prefixes that invoke commands: mentions of the bot followed by a space, and the guild prefix, in the order of commands.when_mentioned_or
+    command_prefixes: list[str]
+    # Channels with a sticky message
+    sticky_channel_ids: frozenset[int]
+    # Public modmail channel, only set if the private modmail channel is configured as well
+    modmail_channel_id: int | None
+    disabled_commands: CommandTrie
+
+    def __init__(self, guild: Guild, sticky_channel_ids: set[int], user_id: int | None) -> None:
+        '''
+        Args:
+            guild (Guild): The guild
+            sticky_channel_ids (set[int]): The ids of the channels in the guild with a sticky message
+            user_id (int | None): The user id of the bot, for mention prefixes
+        '''
+        self.guild_id = guild.id
+        self.prefix = guild.prefix if guild.prefix else '-'
+        self.command_prefixes = [f'<@{user_id}> ', f'<@!{user_id}> ', self.prefix] if user_id else [self.prefix]
+        self.sticky_channel_ids = frozenset(sticky_channel_ids)
+        self.modmail_channel_id = guild.modmail_public if guild.modmail_public and guild.modmail_private else None
+        self.disabled_commands = CommandTrie(guild.disabled_commands if guild.disabled_commands else [])
+
+    def is_sticky(self, channel_id: int) -> bool:
+        '''
+        Whether a channel has a sticky message.
+
+        Args:
+            channel_id (int): The channel id
+
+        Returns:
+            bool: True if the channel has a sticky message
+        '''
+        return channel_id in self.sticky_channel_ids
+
+    def is_modmail(self, channel_id: int) -> bool:
+        '''
+        Whether a channel is the public modmail channel.
+
+        Args:
+            channel_id (int): The channel id
+
+        Returns:
+            bool: True if messages in the channel are forwarded as modmail
+        '''
+        return channel_id == self.modmail_channel_id
+
+    def match_prefix(self, content: str) -> str | None:
+        '''
+        Find the command prefix that a message starts with, if any.
+
+        Args:
+            content (str): The message content
+
+        Returns:
+            str | None: The command prefix, or None if the message does not invoke a command
+        '''
+        for prefix in self.command_prefixes:
+            if content.startswith(prefix):
+                return prefix
+        return None
+
+    def disabled_command(self, content: str, prefix: str) -> str | None:
+        '''
+        Find the disabled command that a message invokes, if any.
+
+        Args:
+            content (str): The message content
+            prefix (str): The command prefix that the message starts with, see match_prefix
+
+        Returns:
+            str | None: The name of the disabled command, if the message invokes one
+        '''
+        return self.disabled_commands.match(content, len(prefix)) if self.disabled_commands else None
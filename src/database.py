@@ -1,13 +1,22 @@
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, make_dataclass
+import logging
+import os
+import sys
+import time
+import traceback
+from types import FrameType
 from asyncpg import TooManyConnectionsError
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker, AsyncAttrs
-from sqlalchemy import PrimaryKeyConstraint, ForeignKey
-from sqlalchemy import BigInteger, Integer, String, Boolean
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import Index, PrimaryKeyConstraint, ForeignKey, event, func, select, text
+from sqlalchemy import BigInteger, Integer, String, Boolean, Date
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session, ORMExecuteState, UOWTransaction
 from sqlalchemy.dialects.postgresql import ARRAY, JSON, TIMESTAMP
-from typing import Any, AsyncGenerator, Callable, Optional, Coroutine
-from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Callable, Optional, Coroutine
+from datetime import date, datetime
 from sqlalchemy.exc import TimeoutError
+from src.metrics import HoldTimeStats, RollingHistogram
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
@@ -58,8 +67,9 @@ class Mute(Base):
     __tablename__: str = 'mutes'
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'user_id', name='mute_pkey'),
+        Index('ix_mutes_expiration', 'expiration'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     user_id: Mapped[int] = mapped_column(BigInteger)
     expiration: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True))
     reason: Mapped[str] = mapped_column(String)
@@ -69,7 +79,7 @@ class Command(Base):
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'name', name='command_pkey'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     name: Mapped[str] = mapped_column(String)
     function: Mapped[str] = mapped_column(String)
     aliases: Mapped[Optional[list[str]]] = mapped_column(ARRAY(String))
@@ -80,7 +90,7 @@ class Repository(Base):
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'user_name', 'repo_name', name='repo_pkey'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     channel_id: Mapped[int] = mapped_column(BigInteger)
     user_name: Mapped[str] = mapped_column(String)
     repo_name: Mapped[str] = mapped_column(String)
@@ -90,8 +100,9 @@ class Notification(Base):
     __tablename__: str = 'notifications'
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'notification_id', name='notification_pkey'),
+        Index('ix_notifications_time', 'time'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     notification_id: Mapped[int] = mapped_column(Integer)
     channel_id: Mapped[int] = mapped_column(BigInteger)
     time: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True))
@@ -103,7 +114,7 @@ class OnlineNotification(Base):
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'author_id', 'member_id', name='online_notification_pkey'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     author_id: Mapped[int] = mapped_column(BigInteger)
     member_id: Mapped[int] = mapped_column(BigInteger)
     channel_id: Mapped[int] = mapped_column(BigInteger)
@@ -113,8 +124,10 @@ class Poll(Base):
     __tablename__: str = 'polls'
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'message_id', name='poll_pkey'),
+        Index('ix_polls_end_time', 'end_time'),
+        Index('ix_polls_message_id', 'message_id'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     author_id: Mapped[int] = mapped_column(BigInteger)
     channel_id: Mapped[int] = mapped_column(BigInteger)
     message_id: Mapped[int] = mapped_column(BigInteger)
@@ -122,6 +135,9 @@ class Poll(Base):
 
 class NewsPost(Base):
     __tablename__: str = 'news_posts'
+    __table_args__ = (
+        Index('ix_news_posts_game_time', 'game', 'time'),
+    )
     link: Mapped[str] = mapped_column(String, primary_key=True)
     game: Mapped[str] = mapped_column(String)
     title: Mapped[str] = mapped_column(String)
@@ -130,10 +146,21 @@ class NewsPost(Base):
     category: Mapped[str] = mapped_column(String)
     image_url: Mapped[str] = mapped_column(String)
 
-class Uptime(Base):
-    __tablename__: str = 'uptime'
-    time: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
-    status: Mapped[str] = mapped_column(String)
+class UptimeInterval(Base):
+    '''
+    A period during which the bot was running, from startup up to the latest heartbeat.
+    '''
+    __tablename__: str = 'uptime_intervals'
+    start: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    last_heartbeat: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+
+class UptimeDay(Base):
+    '''
+    Rollup of the time the bot was up on a day (UTC), incremented by every heartbeat.
+    '''
+    __tablename__: str = 'uptime_days'
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
 class RS3Item(Base):
     __tablename__: str = 'rs3_items'
@@ -148,7 +175,10 @@ class RS3Item(Base):
     day30: Mapped[str] = mapped_column(String)
     day90: Mapped[str] = mapped_column(String)
     day180: Mapped[str] = mapped_column(String)
+    # Price history as returned by the GE API when the item was added, later prices are only stored in price_history
     graph_data: Mapped[dict] = mapped_column(JSON)
+    # Time of the last change to the item, used to reconcile cache snapshots with the database
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), default=func.now(), onupdate=func.now())
 
 class OSRSItem(Base):
     __tablename__: str = 'osrs_items'
@@ -163,12 +193,31 @@ class OSRSItem(Base):
     day30: Mapped[str] = mapped_column(String)
     day90: Mapped[str] = mapped_column(String)
     day180: Mapped[str] = mapped_column(String)
+    # Price history as returned by the GE API when the item was added, later prices are only stored in price_history
     graph_data: Mapped[dict] = mapped_column(JSON)
+    # Time of the last change to the item, used to reconcile cache snapshots with the database
+    updated_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), default=func.now(), onupdate=func.now())
+
+class PriceHistory(Base):
+    '''
+    Daily GE price of an item. Days are only ever appended, so the history can extend beyond the 180 days returned by the GE API.
+    '''
+    __tablename__: str = 'price_history'
+    __table_args__ = (
+        PrimaryKeyConstraint('game', 'item_id', 'day', name='price_history_pkey'),
+    )
+    game: Mapped[str] = mapped_column(String) # 'osrs' or 'rs3'
+    item_id: Mapped[int] = mapped_column(Integer)
+    day: Mapped[date] = mapped_column(Date)
+    price: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
 class ClanBankTransaction(Base):
     __tablename__: str = 'clan_bank_transactions'
+    __table_args__ = (
+        Index('ix_clan_bank_transactions_guild_id', 'guild_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     member_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     time: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
     amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
@@ -176,8 +225,11 @@ class ClanBankTransaction(Base):
 
 class CustomRoleReaction(Base):
     __tablename__: str = 'custom_role_reactions'
+    __table_args__ = (
+        Index('ix_custom_role_reactions_guild_id_emoji_id', 'guild_id', 'emoji_id'),
+    )
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     emoji_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     role_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
@@ -192,11 +244,183 @@ class StickyMessage(Base):
     __table_args__ = (
         PrimaryKeyConstraint('guild_id', 'channel_id', name='sticky_pkey'),
     )
-    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id'), nullable=False)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
     channel_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     message: Mapped[str] = mapped_column(String, nullable=False)
     message_id: Mapped[Optional[int]] = mapped_column(BigInteger)
 
+class NotificationWebhook(Base):
+    __tablename__: str = 'notification_webhooks'
+    __table_args__ = (
+        Index('ix_notification_webhooks_guild_id', 'guild_id'),
+    )
+    channel_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    guild_id: Mapped[int] = mapped_column(BigInteger, ForeignKey('guilds.id', ondelete='CASCADE'), nullable=False)
+    webhook_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    webhook_token: Mapped[str] = mapped_column(String, nullable=False)
+
+class SchemaMigration(Base):
+    __tablename__: str = 'schema_migrations'
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    description: Mapped[str] = mapped_column(String, nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+class Migration():
+    '''
+    A versioned change to the database schema.
+    Migrations are applied in order of their version, each in its own transaction, and recorded in the schema_migrations table.
+    Statements should be idempotent (e.g. IF NOT EXISTS), as tables created by create_all may already match the models.
+    '''
+    version: int
+    description: str
+    statements: list[str]
+
+    def __init__(self, version: int, description: str, statements: list[str]) -> None:
+        self.version = version
+        self.description = description
+        self.statements = statements
+
+# All migrations, in order. Never modify or remove a migration that has been released, add a new one instead.
+migrations: list[Migration] = [
+    Migration(1, 'Add updated_at to item tables', [
+        # Existing rows get the current time, such that the next cache snapshot covers them
+        'ALTER TABLE osrs_items ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()',
+        'ALTER TABLE rs3_items ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()'
+    ]),
+    Migration(2, 'Add indexes for polling loops, news and role reactions', [
+        'CREATE INDEX IF NOT EXISTS ix_notifications_time ON notifications (time)',
+        'CREATE INDEX IF NOT EXISTS ix_mutes_expiration ON mutes (expiration)',
+        'CREATE INDEX IF NOT EXISTS ix_polls_end_time ON polls (end_time)',
+        'CREATE INDEX IF NOT EXISTS ix_polls_message_id ON polls (message_id)',
+        'CREATE INDEX IF NOT EXISTS ix_news_posts_game_time ON news_posts (game, time)',
+        'CREATE INDEX IF NOT EXISTS ix_custom_role_reactions_guild_id_emoji_id ON custom_role_reactions (guild_id, emoji_id)'
+    ]),
+    Migration(3, 'Compact uptime events into uptime intervals', [
+        # The uptime table has a 'started' event per startup, and a 'running' event per day that is moved forward by every heartbeat.
+        # A running event covers the time since the last start on the same day, or since midnight (UTC) if the bot was started on an earlier day.
+        # Intervals that continue at midnight are merged with the interval of the previous day.
+        '''
+        DO $$
+        BEGIN
+            IF to_regclass('uptime') IS NOT NULL THEN
+                WITH runs AS (
+                    SELECT
+                        COALESCE(
+                            (SELECT max(s.time) FROM uptime s WHERE s.status = 'started' AND s.time <= r.time AND s.time >= date_trunc('day', r.time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'),
+                            date_trunc('day', r.time AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                        ) AS start,
+                        r.time AS last_heartbeat
+                    FROM uptime r
+                    WHERE r.status = 'running'
+                ), marked AS (
+                    SELECT start, last_heartbeat,
+                        CASE WHEN start = date_trunc('day', start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                            AND lag(last_heartbeat) OVER (ORDER BY start) >= start - interval '30 seconds' THEN 0 ELSE 1 END AS new_interval
+                    FROM runs
+                ), grouped AS (
+                    SELECT start, last_heartbeat, sum(new_interval) OVER (ORDER BY start) AS interval_number
+                    FROM marked
+                )
+                INSERT INTO uptime_intervals (start, last_heartbeat)
+                SELECT min(start), max(last_heartbeat) FROM grouped GROUP BY interval_number
+                ON CONFLICT DO NOTHING;
+                DROP TABLE uptime;
+            END IF;
+        END $$
+        '''
+    ]),
+    Migration(4, 'Roll up uptime intervals per day', [
+        # Split every interval at midnight (UTC), and sum the uptime per day
+        '''
+        INSERT INTO uptime_days (day, seconds)
+        SELECT CAST(d AS date), ROUND(SUM(EXTRACT(EPOCH FROM LEAST(i.last_heartbeat AT TIME ZONE 'UTC', d + interval '1 day') - GREATEST(i.start AT TIME ZONE 'UTC', d))))
+        FROM uptime_intervals i
+        CROSS JOIN LATERAL generate_series(date_trunc('day', i.start AT TIME ZONE 'UTC'), i.last_heartbeat AT TIME ZONE 'UTC', interval '1 day') AS d
+        WHERE d < i.last_heartbeat AT TIME ZONE 'UTC'
+        GROUP BY CAST(d AS date)
+        ON CONFLICT (day) DO NOTHING
+        '''
+    ]),
+    Migration(5, 'Cascade guild deletes to guild data', [
+        # Replace every foreign key to guilds that does not cascade yet, keeping its name
+        '''
+        DO $$
+        DECLARE
+            fk record;
+        BEGIN
+            FOR fk IN
+                SELECT c.conname, CAST(c.conrelid AS regclass) AS table_name
+                FROM pg_constraint c
+                WHERE c.contype = 'f' AND c.confrelid = CAST('guilds' AS regclass) AND c.confdeltype <> 'c'
+            LOOP
+                EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.table_name, fk.conname);
+                EXECUTE format('ALTER TABLE %s ADD CONSTRAINT %I FOREIGN KEY (guild_id) REFERENCES guilds (id) ON DELETE CASCADE', fk.table_name, fk.conname);
+            END LOOP;
+        END $$
+        ''',
+        # Tables whose primary key does not start with guild_id need an index for cascading deletes
+        'CREATE INDEX IF NOT EXISTS ix_clan_bank_transactions_guild_id ON clan_bank_transactions (guild_id)',
+        'CREATE INDEX IF NOT EXISTS ix_notification_webhooks_guild_id ON notification_webhooks (guild_id)'
+    ]),
+    Migration(6, 'Move GE price history from graph data into the price_history table', [
+        # Graph data has prices by timestamp in ms, at midnight UTC
+        f'''
+        INSERT INTO price_history (game, item_id, day, price)
+        SELECT '{game}', i.id, CAST(to_timestamp(CAST(d.key AS bigint) / 1000) AT TIME ZONE 'UTC' AS date), CAST(d.value AS bigint)
+        FROM {game}_items i
+        CROSS JOIN LATERAL json_each_text(i.graph_data -> 'daily') AS d
+        WHERE i.graph_data IS NOT NULL
+        ON CONFLICT DO NOTHING
+        ''' for game in ['osrs', 'rs3']
+    ])
+]
+
+@dataclass(frozen=True, slots=True)
+class Row:
+    '''
+    Base class of the read-only rows returned by the Database.fetch_one / fetch_all fast path.
+    A row class is generated per model, with one attribute per column of the model. Rows have no relationships,
+    can not be modified, and can not be added to a session.
+    '''
+    if TYPE_CHECKING:
+        # Column attributes are only known at runtime
+        def __getattr__(self, name: str) -> Any: ...
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    '''
+    Connection pool that measures how long it takes to check out a connection, and the peak number of connections in use.
+    '''
+    max_overflow: int
+    wait_time: RollingHistogram
+    peak_checked_out: int
+    timeouts: int
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.max_overflow = kwargs.get('max_overflow', 10)
+        self.wait_time = RollingHistogram()
+        self.peak_checked_out = 0
+        self.timeouts = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start: float = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_time.record(time.perf_counter() - start)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+
+class TrackedSession(Session):
+    '''
+    Session that keeps track of the rows it changes, such that caches can be invalidated when the changes are committed.
+    Changed objects are collected in session.info['changes']. Bulk UPDATE / DELETE statements are collected by their model class,
+    as the affected rows are not known.
+    '''
+    pass
+
 class Database():
     config: dict[str, Any]
     restart: Callable[[str | None], Coroutine]
@@ -204,13 +428,78 @@ class Database():
     engine: AsyncEngine
     async_session: async_sessionmaker[AsyncSession]
 
+    # Callbacks per model, invoked with every committed changed object of that model, or with None after a bulk UPDATE / DELETE of the model
+    commit_hooks: dict[type[Base], list[Callable[[Any], None]]]
+
+    # Session hold times per call site (file:line (function)) of get_session
+    session_stats: dict[str, HoldTimeStats]
+    # Call site and start time (monotonic) of every open session
+    open_sessions: dict[object, tuple[str, float]]
+    # Sessions held longer than this number of seconds have the stack of their call site recorded
+    long_hold_threshold: float = 5
+
+    # Read-only row class per model, and SQL per (model, filtered columns, single row) for the fetch_one / fetch_all fast path
+    row_classes: dict[type[Base], type[Row]]
+    fetch_statements: dict[tuple[type[Base], tuple[str, ...], bool], str]
+
     def __init__(self, config: dict[str, Any], restart: Callable[[str | None], Coroutine]) -> None:
         self.config = config
         self.restart = restart
+        self.commit_hooks = {}
+        self.session_stats = {}
+        self.open_sessions = {}
+        self.row_classes = {}
+        self.fetch_statements = {}
 
         self.engine = self.__get_db_engine()
         self.async_session = self.__get_db_session_maker()
 
+        event.listen(TrackedSession, 'after_flush', self.__after_flush)
+        event.listen(TrackedSession, 'do_orm_execute', self.__do_orm_execute)
+        event.listen(TrackedSession, 'after_commit', self.__after_commit)
+        event.listen(TrackedSession, 'after_rollback', self.__after_rollback)
+
+    def on_commit(self, model: type[Base], hook: Callable[[Any], None]) -> None:
+        '''
+        Register a callback to be invoked when changes to a model are committed.
+        The callback is invoked with each added, updated or deleted object,
+        or with None after a bulk UPDATE / DELETE statement, as the affected rows are unknown in that case.
+
+        Args:
+            model (type[Base]): The model class
+            hook (Callable[[Any], None]): The callback
+        '''
+        self.commit_hooks.setdefault(model, []).append(hook)
+
+    def __after_flush(self, session: Session, flush_context: UOWTransaction) -> None:
+        '''
+        Record the objects that were flushed, so the commit hooks can be invoked once they are committed.
+        The new, dirty and deleted collections still contain the flushed objects at this point.
+        '''
+        session.info.setdefault('changes', []).extend(o for o in [*session.new, *session.dirty, *session.deleted] if type(o) in self.commit_hooks)
+
+    def __do_orm_execute(self, state: ORMExecuteState) -> None:
+        '''
+        Record the model of bulk UPDATE / DELETE statements, so the commit hooks can be invoked once they are committed.
+        '''
+        if (state.is_update or state.is_delete) and state.bind_mapper and state.bind_mapper.class_ in self.commit_hooks:
+            state.session.info.setdefault('changes', []).append(state.bind_mapper.class_)
+
+    def __after_commit(self, session: Session) -> None:
+        '''
+        Invoke the commit hooks for all changes in the committed transaction.
+        '''
+        for change in session.info.pop('changes', []):
+            model: type[Base] = change if isinstance(change, type) else type(change)
+            for hook in self.commit_hooks.get(model, []):
+                hook(None if isinstance(change, type) else change)
+
+    def __after_rollback(self, session: Session) -> None:
+        '''
+        Discard the changes of a rolled back transaction.
+        '''
+        session.info.pop('changes', None)
+
     def __get_db_engine(self) -> AsyncEngine:
         '''
         Get AsyncEngine to connect with the database
@@ -223,7 +512,7 @@ class Database():
         '''
         connection_string: str = (f'postgresql+asyncpg://{self.config["postgres_username"]}:{self.config["postgres_password"]}'
             + f'@{self.config["postgres_ip"]}:{self.config["postgres_port"]}/{self.config["postgres_db_name"]}')
-        return create_async_engine(connection_string, pool_size=100, max_overflow=90)
+        return create_async_engine(connection_string, pool_size=100, max_overflow=90, poolclass=TimedQueuePool)
 
     def __get_db_session_maker(self) -> async_sessionmaker[AsyncSession]:
         '''
@@ -234,7 +523,8 @@ class Database():
         '''
         # async_sessionmaker: a factory for new AsyncSession objects.
         # expire_on_commit - don't expire objects after transaction commit
-        return async_sessionmaker(self.engine, expire_on_commit=False)
+        # sync_session_class - keep track of changes for cache invalidation
+        return async_sessionmaker(self.engine, expire_on_commit=False, sync_session_class=TrackedSession)
 
     async def create_all_database_tables(self) -> None:
         '''
@@ -243,6 +533,110 @@ class Database():
         async with self.engine.begin() as connection:
             await connection.run_sync(Base.metadata.create_all)
 
+    async def migrate(self, dry_run: bool = False) -> list[Migration]:
+        '''
+        Apply all pending migrations, in order of their version.
+        create_all only creates missing tables, so changes to existing tables (columns, indexes) are applied by migrations.
+        Each migration runs in its own transaction, so a failing migration leaves the database at the previous version.
+
+        Args:
+            dry_run (bool, optional): Only determine which migrations are pending, without applying them. Defaults to False.
+
+        Returns:
+            list[Migration]: The pending migrations, which have been applied unless dry_run is set
+        '''
+        async with self.engine.begin() as connection:
+            applied: set[int] = set((await connection.execute(select(SchemaMigration.version))).scalars().all())
+        pending: list[Migration] = sorted([m for m in migrations if m.version not in applied], key=lambda m: m.version)
+        for migration in pending:
+            if dry_run:
+                continue
+            async with self.engine.begin() as connection:
+                for statement in migration.statements:
+                    await connection.execute(text(statement))
+                await connection.execute(SchemaMigration.__table__.insert().values(version=migration.version, description=migration.description))
+        return pending
+
+    def __row_class(self, model: type[Base]) -> type[Row]:
+        '''
+        Get the read-only row class for a model: a frozen dataclass with the same attributes as the model's columns.
+
+        Args:
+            model (type[Base]): The model class
+
+        Returns:
+            type[Row]: The row class
+        '''
+        row_class: type[Row] | None = self.row_classes.get(model)
+        if not row_class:
+            row_class = make_dataclass(f'{model.__name__}Row', [(attribute.key, Any) for attribute in model.__mapper__.column_attrs], bases=(Row,), frozen=True, slots=True)
+            self.row_classes[model] = row_class
+        return row_class
+
+    def __fetch_statement(self, model: type[Base], columns: tuple[str, ...], one: bool) -> str:
+        '''
+        Get the SQL selecting all columns of a model, filtered on equality of the given attributes.
+        The SQL is built once per combination of arguments, and prepared by asyncpg once per connection.
+
+        Args:
+            model (type[Base]): The model class
+            columns (tuple[str, ...]): The names of the attributes to filter on, in order of the query parameters
+            one (bool): Whether to select at most a single row
+
+        Returns:
+            str: The SQL statement
+        '''
+        key: tuple[type[Base], tuple[str, ...], bool] = (model, columns, one)
+        statement: str | None = self.fetch_statements.get(key)
+        if not statement:
+            attributes: dict[str, str] = {attribute.key: attribute.columns[0].name for attribute in model.__mapper__.column_attrs}
+            selected: str = ', '.join(f'"{column}"' for column in attributes.values())
+            conditions: str = ' AND '.join(f'"{attributes[column]}" = ${i+1}' for i, column in enumerate(columns))
+            statement = f'SELECT {selected} FROM "{model.__tablename__}"{f" WHERE {conditions}" if conditions else ""}{" LIMIT 1" if one else ""}'
+            self.fetch_statements[key] = statement
+        return statement
+
+    async def __fetch(self, model: type[Base], filters: dict[str, Any], one: bool) -> list[Row]:
+        '''
+        Fetch rows of a model directly through asyncpg, bypassing the ORM.
+        '''
+        statement: str = self.__fetch_statement(model, tuple(filters), one)
+        row_class: type[Row] = self.__row_class(model)
+        async with self.engine.connect() as connection:
+            raw_connection = await connection.get_raw_connection()
+            # asyncpg caches prepared statements per connection, so repeated lookups skip parsing and planning
+            records: list[Any] = await raw_connection.driver_connection.fetch(statement, *filters.values())
+        return [row_class(*record) for record in records]
+
+    async def fetch_one(self, model: type[Base], **filters: Any) -> Row | None:
+        '''
+        Fast path for hot single-row lookups, e.g. cache misses on message and presence events.
+        Rows are fetched with a single round trip using a prepared statement, without a session or ORM object hydration.
+        The returned row is a frozen dataclass with the same attributes as the model, it can not be modified or added to a session.
+
+        Args:
+            model (type[Base]): The model class
+            filters (Any): Attribute values to filter on, e.g. id=user_id
+
+        Returns:
+            Row | None: The read-only row, if found
+        '''
+        rows: list[Row] = await self.__fetch(model, filters, True)
+        return rows[0] if rows else None
+
+    async def fetch_all(self, model: type[Base], **filters: Any) -> list[Row]:
+        '''
+        Fast path for hot lookups of multiple rows, e.g. all custom commands of a guild. See fetch_one.
+
+        Args:
+            model (type[Base]): The model class
+            filters (Any): Attribute values to filter on, e.g. guild_id=guild_id
+
+        Returns:
+            list[Row]: The read-only rows
+        '''
+        return await self.__fetch(model, filters, False)
+
     async def close_connection(self) -> None:
         '''
         Close the database connection by disposing the engine.
@@ -262,6 +656,11 @@ class Database():
             Iterator[AsyncGenerator[AsyncSession]]: AsyncSession
         '''
         session: AsyncSession | None = None
+        frame: FrameType = self.__call_site_frame()
+        call_site: str = f'{self.__source_path(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        token: object = object()
+        start: float = time.monotonic()
+        self.open_sessions[token] = (call_site, start)
         try:
             async with self.async_session() as session:
                 yield session
@@ -269,7 +668,9 @@ class Database():
             # In case of unexpected database connection errors, restart the bot.
             # TimeoutError can be caused by a timeout due to hitting the QueuePool limit.
             # TooManyConnectionsError occurs when we exceed the total number of connections allowed by the database.
-            # Currently unclear what is causing these issues to occur.
+            # Log the pool status and the call sites holding sessions the longest, to find the cause.
+            logging.critical(f'Database connection error at {call_site}: {type(e).__name__}: {e}\n{self.pool_status()}\n'
+                + '\n'.join(f'{site}: {stats.count} sessions, max {stats.maximum:.1f} s' for site, stats in self.top_session_holders(10)))
             await self.restart('Restarting after TimeoutError or TooManyConnectionsError...')
         except:
             if session:
@@ -277,4 +678,59 @@ class Database():
             raise
         finally:
             if session:
-                await session.close()
\ No newline at end of file
+                await session.close()
+            del self.open_sessions[token]
+            duration: float = time.monotonic() - start
+            stack: str | None = ''.join(traceback.format_stack(frame)) if duration >= self.long_hold_threshold else None
+            self.session_stats.setdefault(call_site, HoldTimeStats()).record(duration, stack)
+
+    def __call_site_frame(self) -> FrameType:
+        '''
+        Get the frame of the code that called get_session, skipping frames of this module and contextlib.
+
+        Returns:
+            FrameType: The frame of the call site
+        '''
+        frame: FrameType = sys._getframe(1)
+        while frame.f_back and frame.f_code.co_filename in [__file__, asynccontextmanager.__code__.co_filename]:
+            frame = frame.f_back
+        return frame
+
+    def __source_path(self, filename: str) -> str:
+        '''
+        Get the path of a source file relative to the working directory, for readable call sites.
+
+        Args:
+            filename (str): The path of the source file
+
+        Returns:
+            str: The relative path, or the path as is if it has no relative path, e.g. on another drive on Windows
+        '''
+        try:
+            return os.path.relpath(filename)
+        except ValueError:
+            return filename
+
+    def pool_status(self) -> str:
+        '''
+        Get a summary of the state of the connection pool.
+
+        Returns:
+            str: The pool status
+        '''
+        pool: TimedQueuePool = self.engine.pool # type: ignore
+        wait_time: list[float] = pool.wait_time.percentiles(50, 95, 99)
+        return (f'Checked out: {pool.checkedout()} (peak {pool.peak_checked_out}), pool size: {pool.size()}, overflow: {max(pool.overflow(), 0)} / {pool.max_overflow}\n'
+            + f'Wait time (p50 / p95 / p99): {" / ".join(f"{p*1000:.0f}" for p in wait_time)} ms, timeouts: {pool.timeouts}')
+
+    def top_session_holders(self, count: int = 10) -> list[tuple[str, HoldTimeStats]]:
+        '''
+        Get the call sites of get_session that held sessions the longest in total.
+
+        Args:
+            count (int, optional): The number of call sites. Defaults to 10.
+
+        Returns:
+            list[tuple[str, HoldTimeStats]]: The call sites and their hold time statistics, longest total first
+        '''
+        return sorted(self.session_stats.items(), key=lambda item: item[1].total, reverse=True)[:count]
\ No newline at end of file
@@ -1,6 +1,6 @@
-from typing import Sequence
+from typing import Sequence, TypeVar
 from discord import Guild as DiscordGuild
-from src.database import ClanBankTransaction, CustomRoleReaction, Guild, Command, Mute, Notification, OSRSItem, OnlineNotification, Poll, RS3Item, Repository, Role, StickyMessage
+from src.database import CustomRoleReaction, Guild, Command, OSRSItem, RS3Item, Role, Row, StickyMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import delete, select
 from discord.ext.commands import CommandError
@@ -90,13 +90,30 @@ async def find_custom_db_command(session: AsyncSession, guild_or_id: DiscordGuil
     guild_id: int = guild_or_id.id if isinstance(guild_or_id, DiscordGuild) else guild_or_id
 
     custom_db_commands: Sequence[Command] = (await session.execute(select(Command).where(Command.guild_id == guild_id))).scalars().all()
+    return match_custom_db_command(custom_db_commands, command_name_or_alias)
+
+# Custom commands as ORM objects, or as read-only rows from the cache
+C = TypeVar('C', Command, Row)
+
+def match_custom_db_command(custom_db_commands: Sequence[C], command_name_or_alias: str) -> C | None:
+    '''
+    Finds a custom command by name, or otherwise by alias.
+
+    Args:
+        custom_db_commands (Sequence[C]): The custom commands of a guild, as ORM objects or read-only rows
+        command_name_or_alias (str): The command name or an alias
+
+    Returns:
+        C | None: The command if found.
+    '''
     for custom_db_command in custom_db_commands:
         if custom_db_command.name == command_name_or_alias:
             return custom_db_command
     for custom_db_command in custom_db_commands:
         if custom_db_command.aliases and command_name_or_alias in custom_db_command.aliases:
             return custom_db_command
-    
+    return None
+
 async def get_custom_db_commands(session: AsyncSession, guild_or_id: DiscordGuild | int | None) -> Sequence[Command]:
     '''
     Gets all custom commands for the given guild from the database.
@@ -181,6 +198,23 @@ async def get_rs3_item_by_id(session: AsyncSession, id: int) -> RS3Item:
         raise CommandError(f'Item with ID {id} was not found.')
     return item
 
+async def purge_guilds(session: AsyncSession, guilds: Sequence[Guild]) -> None:
+    '''
+    Purge all data relating to the given Guilds from the database.
+    Guild data is removed by ON DELETE CASCADE foreign keys when the guilds are deleted, except for roles, which have no foreign key.
+    The guilds are deleted in a single batch, such that purging many guilds takes one statement per table.
+
+    Args:
+        session (AsyncSession): The database session
+        guilds (Sequence[Guild]): The guilds whose data to purge
+    '''
+    if not guilds:
+        return
+    await session.execute(delete(Role).where(Role.guild_id.in_([guild.id for guild in guilds])))
+    # Deleting the objects rather than a bulk DELETE lets commit hooks, e.g. of the cache, see which guilds were removed
+    for guild in guilds:
+        await session.delete(guild)
+
 async def purge_guild(session: AsyncSession, guild: Guild) -> None:
     '''
     Purge all data relating to a specific Guild from the database
@@ -189,17 +223,7 @@ async def purge_guild(session: AsyncSession, guild: Guild) -> None:
         session (AsyncSession): The database session
         guild (Guild): The guild whose data to purge
     '''
-    await session.execute(delete(Role).where(Role.guild_id == guild.id))
-    await session.execute(delete(Mute).where(Mute.guild_id == guild.id))
-    await session.execute(delete(Command).where(Command.guild_id == guild.id))
-    await session.execute(delete(Repository).where(Repository.guild_id == guild.id))
-    await session.execute(delete(Notification).where(Notification.guild_id == guild.id))
-    await session.execute(delete(OnlineNotification).where(OnlineNotification.guild_id == guild.id))
-    await session.execute(delete(Poll).where(Poll.guild_id == guild.id))
-    await session.execute(delete(ClanBankTransaction).where(ClanBankTransaction.guild_id == guild.id))
-    await session.execute(delete(CustomRoleReaction).where(CustomRoleReaction.guild_id == guild.id))
-    await session.execute(delete(StickyMessage).where(StickyMessage.guild_id == guild.id))
-    await session.delete(guild)
+    await purge_guilds(session, [guild])
 
 async def get_role_reactions(session: AsyncSession, guild_id: int) -> Sequence[CustomRoleReaction]:
     '''
@@ -1,6 +1,6 @@
 from datetime import UTC, date, datetime, timedelta
 import pytz
-from src.database import Uptime
+from src.database import UptimeDay
 from typing import Sequence
 from discord.ext.commands import CommandError
 from src.number_utils import is_int
@@ -62,12 +62,52 @@ def timedelta_to_string(time: timedelta) -> str:
             time_str += "s"
     return f'{time_str}{postfix}'
 
-def uptime_fraction(events: Sequence[Uptime], year: int | None = None, month: int | None = None, day: int | None = None) -> float:
+def uptime_per_day(start: datetime, end: datetime) -> dict[date, timedelta]:
     '''
-    Calculate the fraction of time that the bot was up from a sequence of uptime records.
+    Split a period of uptime at midnight (UTC) into the uptime per day.
 
     Args:
-        events (Sequence[Uptime]): Sequence of uptime events.
+        start (datetime): The start of the period
+        end (datetime): The end of the period
+
+    Returns:
+        dict[date, timedelta]: The uptime per day
+    '''
+    uptime: dict[date, timedelta] = {}
+    start = start.astimezone(UTC)
+    end = end.astimezone(UTC)
+    while start < end:
+        midnight: datetime = start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        uptime[start.date()] = min(end, midnight) - start
+        start = midnight
+    return uptime
+
+def daily_uptime_fractions(days: Sequence[UptimeDay]) -> dict[date, float]:
+    '''
+    Calculate the fraction of time that the bot was up on each day, from the daily uptime rollups.
+
+    Args:
+        days (Sequence[UptimeDay]): Sequence of daily uptime rollups.
+
+    Returns:
+        dict[date, float]: The uptime fraction per day, for days on which the bot was up
+    '''
+    now: datetime = datetime.now(UTC)
+    fractions: dict[date, float] = {}
+    for day in days:
+        elapsed: timedelta = timedelta(hours=24) if day.day != now.date() else now - now.replace(hour=0, minute=0, second=0, microsecond=0)
+        up: float = day.seconds + 10 # add a 10 second margin because that is the interval at which heartbeats are tracked
+        fractions[day.day] = min(1, up / max(elapsed.total_seconds(), 1))
+    return fractions
+
+def uptime_fraction(fractions: dict[date, float], year: int | None = None, month: int | None = None, day: int | None = None) -> float:
+    '''
+    Calculate the fraction of time that the bot was up in a period, from the uptime fractions per day.
+    The fraction of a month is the average of the days on which the bot was up, and likewise for years and the lifetime.
+    Looking up a single day takes constant time, other periods take a single pass over the days.
+
+    Args:
+        fractions (dict[date, float]): The uptime fraction per day, see daily_uptime_fractions
         year (int, optional): The year during which to measure the uptime (optional). Defaults to None.
         month (int, optional): The month during which to measure the uptime (optional). Defaults to None.
         day (int, optional): The day during which to measure the uptime (optional). Defaults to None.
@@ -76,31 +116,22 @@ def uptime_fraction(events: Sequence[Uptime], year: int | None = None, month: in
         float: The fraction of time during which the bot was up in the given time period
     '''
     if day and month and year:
-        day_events: list[Uptime] = [event for event in events if event.time.year == year and event.time.month == month and event.time.day == day]
-        if not any(day_events):
-            return 0
-        now: datetime = datetime.now(UTC)
-        start_time: datetime = now.replace(year=year, month=month, day=day, hour=0, minute=0, second=0, microsecond=0)
-        elapsed: timedelta = timedelta(hours=24) if now.year != year or now.month != month or now.day != day else now - start_time
-        up = timedelta(seconds=10) # start with a 10 second margin because that is the margin of error with which uptime events are tracked
-        for event in day_events:
-            if event.status == 'started':
-                start_time = event.time
-            elif event.status == 'running':
-                up += event.time - start_time
-        return min(1, up.total_seconds() / elapsed.total_seconds())
-    elif year and month:
-        days: set[int] = set([event.time.day for event in events if event.time.year == year and event.time.month == month])
-        percentages: list[float] = [uptime_fraction([event for event in events if event.time.year == year and event.time.month == month and event.time.day == day], year=year, month=month, day=day) for day in days]
-        return sum(percentages) / len(percentages)
-    elif year:
-        months: set[int] = set([event.time.month for event in events if event.time.year == year])
-        percentages = [uptime_fraction([event for event in events if event.time.year == year and event.time.month == month], year=year, month=month) for month in months]
-        return sum(percentages) / len(percentages)
-    else:
-        years: set[int] = set([event.time.year for event in events])
-        percentages = [uptime_fraction([event for event in events if event.time.year == year], year=year) for year in years]
-        return sum(percentages) / len(percentages)
+        return fractions.get(date(year, month, day), 0)
+
+    months: dict[tuple[int, int], list[float]] = {}
+    for d, fraction in fractions.items():
+        if (year and d.year != year) or (month and d.month != month):
+            continue
+        months.setdefault((d.year, d.month), []).append(fraction)
+    if not months:
+        return 0
+    if year and month:
+        return sum(months[(year, month)]) / len(months[(year, month)])
+    years: dict[int, list[float]] = {}
+    for (y, _), month_fractions in months.items():
+        years.setdefault(y, []).append(sum(month_fractions) / len(month_fractions))
+    averages: list[float] = [sum(month_averages) / len(month_averages) for month_averages in years.values()]
+    return sum(averages) / len(averages)
     
 def parse_datetime_string(input: str) -> datetime:
     '''
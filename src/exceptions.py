@@ -9,4 +9,21 @@ class PriceTrackingException(Exception):
     def __init__(self, message: str, status: int | None = None, delay_before_retry: int | None = None) -> None:
         super().__init__(message)
         self.status = status
-        self.delay_before_retry = delay_before_retry
\ No newline at end of file
+        self.delay_before_retry = delay_before_retry
+
+class MessageRetryException(Exception):
+    '''
+    Exception used when sending a queued message failed in a way that warrants a retry,
+    i.e. when we were rate limited or Discord returned a server error.
+    '''
+
+    status: int | None = None
+    retry_after: float | None = None
+    # Whether the rate limit applies to all requests of the bot, rather than to a single channel or route
+    is_global: bool = False
+
+    def __init__(self, message: str, status: int | None = None, retry_after: float | None = None, is_global: bool = False) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.is_global = is_global
@@ -1,29 +1,163 @@
 import asyncio
+from datetime import UTC, datetime
+import time
 import discord
-from collections import deque
+from collections import deque, OrderedDict
+import json
+from enum import IntEnum, StrEnum
 import logging
-from src.async_utils import chunk_coroutines
+from typing import Callable
+from src.async_utils import ConcurrencyLimiter, TokenBucket
+from src.discord_utils import max_message_length
+from src.exceptions import MessageRetryException
+from src.metrics import RollingHistogram
+
+# Discord allows up to 10 embeds per message, with a combined length of at most 6000 characters
+max_embeds_per_message: int = 10
+max_total_embed_length: int = 6000
+
+class MessagePriority(IntEnum):
+    '''
+    Priority lanes for queued messages.
+    Lower values are served first and receive a larger share of the rate limit.
+    '''
+    HIGH = 0 # Interactive traffic, e.g. modmail, moderation logs and reminders
+    NORMAL = 1
+    LOW = 2 # Bulk broadcasts, e.g. D&D notifications and news posts
+
+class MessageSource(StrEnum):
+    '''
+    The feature that produced a queued message, used to break down queue latency.
+    '''
+    NOTIFICATIONS = 'notifications'
+    NEWS = 'news'
+    LOGS = 'logs'
+    MODMAIL = 'modmail'
+    TIMERS = 'timers'
+    OTHER = 'other'
 
 class QueueMessage:
     channel: discord.TextChannel
     message: str | None
-    embed: discord.Embed | None
+    embeds: list[discord.Embed]
     files: list[discord.File] | discord.File | None
+    priority: MessagePriority
+    # Time after which the message is no longer relevant, and will be dropped instead of sent
+    expiration: datetime | None
+    source: MessageSource
+    # Monotonic time at which the message was added to the queue
+    enqueued_at: float
+    # Source and enqueue time of the messages that were merged into this one
+    merged: list[tuple[MessageSource, float]]
+    # Number of failed attempts to send the message
+    attempts: int
+    # Webhook to send the message with instead of the bot's own account, if any
+    webhook: discord.Webhook | None
+    # Content of the message to detect duplicates by, computed on first use, see duplicate_key
+    _duplicate_key: tuple[str | None, tuple[str, ...]] | None
 
-    def __init__(self, channel: discord.TextChannel, message: str | None = None, embed: discord.Embed | None = None, files: list[discord.File] | discord.File | None = None) -> None:
+    def __init__(self, channel: discord.TextChannel, message: str | None = None, embed: discord.Embed | None = None, files: list[discord.File] | discord.File | None = None, priority: MessagePriority = MessagePriority.NORMAL, expiration: datetime | None = None, webhook: discord.Webhook | None = None, source: MessageSource = MessageSource.OTHER) -> None:
         self.channel = channel
 
         if not message and not embed:
             raise Exception('Tried to create an empty message.')
 
         self.message = message
-        self.embed = embed
+        self.embeds = [embed] if embed else []
         self.files = files
+        self.priority = priority
+        self.expiration = expiration
+        self.source = source
+        self.enqueued_at = time.monotonic()
+        self.merged = []
+        self.attempts = 0
+        self.webhook = webhook
+        self._duplicate_key = None
+
+    @property
+    def bucket_id(self) -> int:
+        '''
+        The id of the rate limit bucket this message is sent in.
+        Webhook executions have their own rate limits, separate from those of the bot's own messages in the channel.
+
+        Returns:
+            int: The webhook id for webhook messages, otherwise the channel id
+        '''
+        return self.webhook.id if self.webhook else self.channel.id
+
+    def is_expired(self, now: datetime) -> bool:
+        '''
+        Whether the message has expired.
+
+        Args:
+            now (datetime): The current time
+
+        Returns:
+            bool: True if the message has an expiration time which has passed
+        '''
+        return self.expiration is not None and self.expiration <= now
+
+    def duplicate_key(self) -> tuple[str | None, tuple[str, ...]] | None:
+        '''
+        The content of the message, such that messages to the same channel with equal keys are duplicates.
+        The key is computed once, as it requires serializing the embeds, and recomputed after merging.
+
+        Returns:
+            tuple[str | None, tuple[str, ...]] | None: The text and serialized embeds, or None for messages with files, which are never considered duplicates
+        '''
+        if self.files:
+            return None
+        if self._duplicate_key is None:
+            self._duplicate_key = (self.message, tuple(json.dumps(embed.to_dict(), sort_keys=True) for embed in self.embeds))
+        return self._duplicate_key
+
+    def can_merge(self, other: 'QueueMessage') -> bool:
+        '''
+        Whether another message can be merged into this one without exceeding Discord's message limits.
+        Only messages without files are merged, and text is only merged with text, and embeds only with embeds,
+        such that the merged message reads the same as the separate messages would have.
+
+        Args:
+            other (QueueMessage): The message to merge into this one
+
+        Returns:
+            bool: True if the messages can be merged
+        '''
+        if self.files or other.files or self.bucket_id != other.bucket_id:
+            return False
+        if self.embeds and other.embeds:
+            return (not self.message and not other.message
+                and len(self.embeds) + len(other.embeds) <= max_embeds_per_message
+                and sum(len(embed) for embed in self.embeds + other.embeds) <= max_total_embed_length)
+        if self.message and other.message:
+            return (not self.embeds and not other.embeds
+                and len(self.message) + 1 + len(other.message) <= max_message_length)
+        return False
+
+    def merge(self, other: 'QueueMessage') -> None:
+        '''
+        Merge another message into this one.
+        Use can_merge to check whether this is possible first.
+
+        Args:
+            other (QueueMessage): The message to merge into this one
+        '''
+        if other.message:
+            self.message = f'{self.message}\n{other.message}' if self.message else other.message
+        self.embeds.extend(other.embeds)
+        self._duplicate_key = None
+        self.merged.append((other.source, other.enqueued_at))
+        self.merged.extend(other.merged)
 
     async def send(self) -> None:
         '''
         Safely send a message to a text channel.
-        Safely here means that any exceptions are handled.
+        If the message has a webhook, it is sent by executing the webhook.
+        Safely here means that any exceptions are handled,
+        except for rate limits, server errors and missing webhooks, which are raised as MessageRetryException such that the message can be retried.
+
+        Raises:
+            MessageRetryException: If the message should be retried
         '''
         try:
             files: list[discord.File] = []
@@ -32,54 +166,704 @@ class QueueMessage:
             elif self.files:
                 files.append(self.files)
 
-            if self.embed:
-                await self.channel.send(self.message, embed=self.embed, files=files)
+            if self.webhook:
+                await self.webhook.send(self.message, embeds=self.embeds, files=files)
+            elif self.embeds:
+                await self.channel.send(self.message, embeds=self.embeds, files=files)
             else:
                 await self.channel.send(self.message, files=files)
+        except discord.NotFound as e:
+            if self.webhook:
+                raise MessageRetryException(f'Webhook {self.webhook.id} was not found', e.status)
+            error: str = f'Encountered error while sending a message:\n{type(e).__name__}: {e}'
+            logging.critical(error)
+            print(error)
         except discord.Forbidden:
             pass
+        except discord.HTTPException as e:
+            if e.status == 429 or e.status >= 500:
+                headers = e.response.headers if e.response is not None else {}
+                retry_after: str | None = headers.get('Retry-After')
+                is_global: bool = headers.get('X-RateLimit-Global', '').lower() == 'true' or headers.get('X-RateLimit-Scope') == 'global'
+                raise MessageRetryException(f'{e.status} {e.text}', e.status, float(retry_after) if retry_after else None, is_global)
+            error: str = f'Encountered error while sending a message:\n{type(e).__name__}: {e}'
+            logging.critical(error)
+            print(error)
         except Exception as e:
             error: str = f'Encountered error while sending a message:\n{type(e).__name__}: {e}'
             logging.critical(error)
             print(error)
 
-class MessageQueue(deque[QueueMessage]):
-    def __init__(self, **kwargs) -> None:
-        super().__init__(
-            iterable=kwargs.pop('iterable', []),
-            maxlen=kwargs.pop('maxlen', None)
-        )
+class ChannelBucket:
+    '''
+    Keeps track of the messages sent to a single channel.
+    Discord limits message sends per channel to 5 messages per 5 seconds.
+    '''
+    limit: int
+    period: float
+    sent: deque[float]
+    # Monotonic time until which the channel is blocked after Discord told us we were rate limited
+    blocked_until: float
+
+    def __init__(self, limit: int = 5, period: float = 5) -> None:
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+        self.blocked_until = 0
+
+    def last_sent(self) -> float | None:
+        '''
+        The time of the most recent send to this channel within the rate limit window, if any.
+
+        Returns:
+            float | None: The monotonic time of the last send
+        '''
+        return self.sent[-1] if self.sent else None
+
+    def expire(self, now: float) -> None:
+        '''
+        Forget about any sends that fall outside of the rate limit window.
+
+        Args:
+            now (float): The current monotonic time
+        '''
+        while self.sent and self.sent[0] <= now - self.period:
+            self.sent.popleft()
+
+    def is_ready(self, now: float) -> bool:
+        '''
+        Whether a message can be sent to this channel without hitting the rate limit.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            bool: True if the channel has capacity left in the current window
+        '''
+        self.expire(now)
+        return len(self.sent) < self.limit and now >= self.blocked_until
+
+    def is_idle(self, now: float) -> bool:
+        '''
+        Whether the bucket no longer tracks any sends and can be discarded.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            bool: True if no sends are tracked within the current window
+        '''
+        self.expire(now)
+        return not self.sent and now >= self.blocked_until
+
+    def next_ready(self, now: float, coalesce_window: float) -> float:
+        '''
+        The earliest time at which a message can be dispatched to this channel.
+
+        Args:
+            now (float): The current monotonic time
+            coalesce_window (float): Time in seconds after a send during which new messages are held back
+
+        Returns:
+            float: The monotonic time at which the channel is ready
+        '''
+        self.expire(now)
+        ready: float = max(now, self.blocked_until)
+        if len(self.sent) >= self.limit:
+            ready = max(ready, self.sent[0] + self.period)
+        if self.sent:
+            ready = max(ready, self.sent[-1] + coalesce_window)
+        return ready
+
+    def record(self, now: float) -> None:
+        '''
+        Register a send to this channel.
+
+        Args:
+            now (float): The current monotonic time
+        '''
+        self.sent.append(now)
+
+    def block(self, until: float) -> None:
+        '''
+        Block sends to this channel until the given time.
+
+        Args:
+            until (float): The monotonic time until which the channel is blocked
+        '''
+        self.blocked_until = max(self.blocked_until, until)
+
+class MessageLane:
+    '''
+    Pending messages of a single priority, grouped per channel.
+    Channels are served round-robin, such that a burst of messages to a single channel cannot delay messages to other channels.
+    '''
+    weight: int
+    deficit: float
+    # Pending messages per bucket id, i.e. per channel, or per webhook for webhook messages. The order of the keys determines the round-robin order.
+    channels: OrderedDict[int, deque[QueueMessage]]
+    # Number of pending messages per duplicate key, per bucket id, such that duplicates are detected without comparing to every pending message
+    duplicate_keys: dict[int, dict[tuple[str | None, tuple[str, ...]], int]]
+    length: int
+
+    def __init__(self, weight: int) -> None:
+        self.weight = weight
+        self.deficit = 0
+        self.channels = OrderedDict()
+        self.duplicate_keys = {}
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __track(self, bucket_id: int, message: QueueMessage) -> None:
+        '''
+        Count a message that was added to the queue of a channel in its duplicate keys.
+        '''
+        key: tuple[str | None, tuple[str, ...]] | None = message.duplicate_key()
+        if key is not None:
+            keys: dict[tuple[str | None, tuple[str, ...]], int] = self.duplicate_keys.setdefault(bucket_id, {})
+            keys[key] = keys.get(key, 0) + 1
+
+    def __untrack(self, bucket_id: int, message: QueueMessage) -> None:
+        '''
+        Remove a message that was taken from the queue of a channel from its duplicate keys.
+        Must be called before the message is merged with others, as that changes its key.
+        '''
+        key: tuple[str | None, tuple[str, ...]] | None = message.duplicate_key()
+        keys: dict[tuple[str | None, tuple[str, ...]], int] | None = self.duplicate_keys.get(bucket_id)
+        if key is None or keys is None or key not in keys:
+            return
+        keys[key] -= 1
+        if not keys[key]:
+            del keys[key]
+            if not keys:
+                del self.duplicate_keys[bucket_id]
+
+    def append(self, message: QueueMessage) -> bool:
+        '''
+        Add a message to the queue of its channel.
+        If an identical message is already pending for the channel, the message is collapsed into it instead.
+
+        Args:
+            message (QueueMessage): The message
+
+        Returns:
+            bool: True if the message was added, False if it was a duplicate
+        '''
+        bucket_id: int = message.bucket_id
+        key: tuple[str | None, tuple[str, ...]] | None = message.duplicate_key()
+        if key is not None and key in self.duplicate_keys.get(bucket_id, {}):
+            return False
+        if not bucket_id in self.channels:
+            self.channels[bucket_id] = deque()
+        self.channels[bucket_id].append(message)
+        self.__track(bucket_id, message)
+        self.length += 1
+        return True
+
+    def requeue(self, message: QueueMessage) -> None:
+        '''
+        Put a message that failed to send back at the front of the queue of its channel, to preserve message order.
+
+        Args:
+            message (QueueMessage): The message
+        '''
+        bucket_id: int = message.bucket_id
+        if not bucket_id in self.channels:
+            self.channels[bucket_id] = deque()
+        self.channels[bucket_id].appendleft(message)
+        self.__track(bucket_id, message)
+        self.length += 1
+
+    def drop_expired(self, now: datetime) -> int:
+        '''
+        Remove all expired messages from the lane.
+
+        Args:
+            now (datetime): The current time
+
+        Returns:
+            int: The number of messages that were removed
+        '''
+        dropped: int = 0
+        for bucket_id in list(self.channels.keys()):
+            pending: deque[QueueMessage] = self.channels[bucket_id]
+            remaining: deque[QueueMessage] = deque()
+            for message in pending:
+                if message.is_expired(now):
+                    self.__untrack(bucket_id, message)
+                else:
+                    remaining.append(message)
+            dropped += len(pending) - len(remaining)
+            if remaining:
+                self.channels[bucket_id] = remaining
+            else:
+                del self.channels[bucket_id]
+        self.length -= dropped
+        return dropped
+
+    def drop_oldest(self) -> QueueMessage | None:
+        '''
+        Remove the first message of the channel that is next in round-robin order.
+        As this is the channel that has been waiting the longest, this is (approximately) the oldest message in the lane.
+
+        Returns:
+            QueueMessage | None: The removed message, if any
+        '''
+        for bucket_id, pending in self.channels.items():
+            message: QueueMessage = pending.popleft()
+            self.__untrack(bucket_id, message)
+            self.length -= 1
+            if not pending:
+                del self.channels[bucket_id]
+            return message
+        return None
+
+    def oldest_age(self, now: float) -> float:
+        '''
+        The time that the oldest message in this lane has been waiting.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            float: The age in seconds, or 0 if the lane is empty
+        '''
+        return max((now - pending[0].enqueued_at for pending in self.channels.values()), default=0)
+
+    def pop_next(self, get_bucket: Callable[[int], ChannelBucket], admit: Callable[[QueueMessage], bool], now: float, utc_now: datetime, coalesce_window: float) -> tuple[QueueMessage | None, int]:
+        '''
+        Take the next message from the first channel in round-robin order whose rate limit bucket is not exhausted,
+        and which is admitted by the global rate limit.
+        Any directly following messages to the same channel are merged into it, as far as Discord's message limits allow.
+        Channels which have been sent to within the coalescing window are held back until the window has passed,
+        such that a burst of messages is merged into a few messages instead of using up the channel's rate limit.
+        Expired messages are dropped along the way.
+
+        Args:
+            get_bucket (Callable[[int], ChannelBucket]): Function to get the rate limit bucket for a bucket id
+            admit (Callable[[QueueMessage], bool]): Function that checks whether a message fits in the global rate limit, and reserves capacity for it if so
+            now (float): The current monotonic time
+            utc_now (datetime): The current time, to check message expiration
+            coalesce_window (float): Time in seconds after a send to a channel during which new messages to it are held back
+
+        Returns:
+            tuple[QueueMessage | None, int]: The message, if any channel is ready, and the number of expired messages that were dropped
+        '''
+        expired: int = 0
+        for bucket_id, pending in self.channels.items():
+            bucket: ChannelBucket = get_bucket(bucket_id)
+            if not bucket.is_ready(now):
+                continue
+            last_sent: float | None = bucket.last_sent()
+            if last_sent is not None and now - last_sent < coalesce_window and len(pending) < max_embeds_per_message:
+                continue
+            while pending and pending[0].is_expired(utc_now):
+                self.__untrack(bucket_id, pending.popleft())
+                self.length -= 1
+                expired += 1
+            if not pending:
+                del self.channels[bucket_id]
+                # The channel order changed, so we can not continue iterating here
+                return None, expired
+            if not admit(pending[0]):
+                continue
+            message: QueueMessage = pending.popleft()
+            self.__untrack(bucket_id, message)
+            self.length -= 1
+            while pending and message.can_merge(pending[0]):
+                other: QueueMessage = pending.popleft()
+                self.__untrack(bucket_id, other)
+                if other.is_expired(utc_now):
+                    expired += 1
+                else:
+                    message.merge(other)
+                self.length -= 1
+            bucket.record(now)
+            # Move the channel to the back of the line, or drop it if it has no more messages
+            if pending:
+                self.channels.move_to_end(bucket_id)
+            else:
+                del self.channels[bucket_id]
+            return message, expired
+        return None, expired
+
+class MessageQueue:
+    '''
+    Queue of outgoing messages.
+    Messages are divided over priority lanes, which share the rate limit by weighted fair queuing (deficit round-robin).
+    This way, interactive traffic is not held up by large broadcasts, while broadcasts still make progress.
+    Pending messages to the same channel are coalesced into a single message where possible.
+    The queue is bounded: when it is full, expired messages are dropped first,
+    then the oldest messages of the least important lane, as long as that lane is not more important than the new message.
+    '''
+    # Share of the rate limit per priority lane, relative to the other lanes
+    weights: dict[MessagePriority, int] = {
+        MessagePriority.HIGH: 8,
+        MessagePriority.NORMAL: 3,
+        MessagePriority.LOW: 1
+    }
+    # Time in seconds after a send to a channel during which further messages to it are held back to be coalesced
+    coalesce_window: float = 0.5
+    # The global rate limit is 50 requests per second. To be on the safe side, we work with a max of 40 requests per second here.
+    # A small burst on top of that is allowed after idle periods, which keeps us below 50 requests in any second.
+    # Webhook executions do not count towards the bot's global rate limit, so they are tracked separately, at the same rate.
+    rate_limit: int = 40
+    rate_limit_period: float = 1
+    rate_limit_burst: int = 10
+    # Maximum number of send requests in flight at any time
+    max_in_flight: int = 40
+    # When Discord rate limits us, the global rate is reduced multiplicatively, down to this minimum.
+    # Every successful send then increases the rate again by a small step, up to the normal rate limit.
+    min_rate_limit: int = 10
+    rate_limit_decrease: float = 0.75
+    rate_limit_increase: float = 0.05
+    # Maximum number of attempts to send a message, when sends fail due to rate limits or server errors
+    max_attempts: int = 3
+    # Maximum time in seconds to wait for a send. discord.py waits for rate limits of the channel before sending, and retries after a 429,
+    # which would hold a send slot for as long as the rate limit lasts. Sends that take longer are re-queued instead, behind the blocked channel.
+    max_send_time: float = 30
+    # Time in seconds between checks whether a full queue has drained, see wait_until_not_full
+    full_poll_interval: float = 1
+
+    # Maximum number of pending messages
+    max_size: int
+    # Number of messages dropped per reason: 'expired', 'duplicate', 'overflow' or 'failed'
+    dropped: dict[str, int]
+    # Monotonic time of the last sweep for expired messages, to avoid sweeping the full queue on every overflow
+    last_expiry_sweep: float
+
+    lanes: dict[MessagePriority, MessageLane]
+    # Rate limit buckets per channel id, shared by all lanes
+    buckets: dict[int, ChannelBucket]
+    # Global rate limit, shared by all lanes
+    rate: TokenBucket
+    # Rate limit for webhook executions, shared by all lanes
+    webhook_rate: TokenBucket
+    # Ids of webhooks that turned out to no longer exist
+    invalid_webhooks: set[int]
+    # Executes send requests, starting new ones as soon as others complete
+    senders: ConcurrencyLimiter
+    # Set whenever a message is queued, to wake up the sender
+    wakeup: asyncio.Event
+    # Time spent in the queue and duration of send requests per source, over the last hour
+    queue_time: dict[MessageSource, RollingHistogram]
+    send_time: dict[MessageSource, RollingHistogram]
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.dropped = {'expired': 0, 'duplicate': 0, 'overflow': 0, 'failed': 0}
+        self.last_expiry_sweep = 0
+        self.lanes = {priority: MessageLane(self.weights[priority]) for priority in sorted(MessagePriority)}
+        self.buckets = {}
+        self.rate = TokenBucket(self.rate_limit, self.rate_limit_period, self.rate_limit_burst)
+        self.webhook_rate = TokenBucket(self.rate_limit, self.rate_limit_period, self.rate_limit_burst)
+        self.invalid_webhooks = set()
+        self.senders = ConcurrencyLimiter(self.max_in_flight)
+        self.wakeup = asyncio.Event()
+        self.queue_time = {source: RollingHistogram() for source in MessageSource}
+        self.send_time = {source: RollingHistogram() for source in MessageSource}
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def append(self, message: QueueMessage) -> bool:
+        '''
+        Add a message to the lane of its priority, and wake up the sender.
+
+        Args:
+            message (QueueMessage): The message
+
+        Returns:
+            bool: True if the message was queued, False if it was dropped
+        '''
+        if message.is_expired(datetime.now(UTC)):
+            self.dropped['expired'] += 1
+            return False
+        if len(self) >= self.max_size and not self.make_room(message.priority):
+            self.dropped['overflow'] += 1
+            return False
+        if not self.lanes[message.priority].append(message):
+            self.dropped['duplicate'] += 1
+            return False
+        self.wakeup.set()
+        return True
+
+    def make_room(self, priority: MessagePriority) -> bool:
+        '''
+        Free up space in a full queue for a message of the given priority.
+        Expired messages are dropped first (at most once per second). If that is not enough, the oldest message of the least important lane is dropped,
+        provided that this lane is not more important than the given priority.
+
+        Args:
+            priority (MessagePriority): The priority of the message that needs space
+
+        Returns:
+            bool: True if there is space for the message
+        '''
+        now: float = time.monotonic()
+        if now - self.last_expiry_sweep >= 1:
+            self.last_expiry_sweep = now
+            utc_now: datetime = datetime.now(UTC)
+            for lane in self.lanes.values():
+                self.dropped['expired'] += lane.drop_expired(utc_now)
+            if len(self) < self.max_size:
+                return True
+        for lane_priority in sorted(self.lanes.keys(), reverse=True):
+            if lane_priority < priority:
+                break
+            if self.lanes[lane_priority].drop_oldest():
+                self.dropped['overflow'] += 1
+                return True
+        return False
+
+    def is_full(self) -> bool:
+        '''
+        Whether the queue has reached its maximum size.
+
+        Returns:
+            bool: True if the queue is full
+        '''
+        return len(self) >= self.max_size
+
+    async def wait_until_not_full(self, timeout: float | None = None) -> bool:
+        '''
+        Wait until the queue is no longer full.
+        Producers of bulk messages use this to hold off until the queue has drained, rather than pushing their own older messages out of the queue.
+
+        Args:
+            timeout (float | None, optional): Maximum time to wait in seconds. Defaults to None (no limit).
+
+        Returns:
+            bool: True if the queue has space, False if it was still full when the timeout passed
+        '''
+        try:
+            async with asyncio.timeout(timeout):
+                while self.is_full():
+                    await asyncio.sleep(self.full_poll_interval)
+        except TimeoutError:
+            return False
+        return True
+
+    def depth(self) -> dict[MessagePriority, tuple[int, float]]:
+        '''
+        Get the number of pending messages and the age of the oldest pending message for each priority lane.
+
+        Returns:
+            dict[MessagePriority, tuple[int, float]]: Number of messages and age of the oldest message in seconds, per priority
+        '''
+        now: float = time.monotonic()
+        return {priority: (len(lane), lane.oldest_age(now)) for priority, lane in self.lanes.items()}
+
+    def latency(self, *percentiles: float) -> dict[MessageSource, tuple[list[float], list[float], int]]:
+        '''
+        Get percentiles of the time spent in the queue and the duration of send requests, for each source that sent messages in the last hour.
+
+        Args:
+            percentiles (float): The percentiles, between 0 and 100
+
+        Returns:
+            dict[MessageSource, tuple[list[float], list[float], int]]: Queue time percentiles, send duration percentiles and number of messages, per source
+        '''
+        return {source: (histogram.percentiles(*percentiles), self.send_time[source].percentiles(*percentiles), len(histogram))
+            for source, histogram in self.queue_time.items() if len(histogram)}
+
+    def bucket(self, bucket_id: int) -> ChannelBucket:
+        '''
+        Get the rate limit bucket for a channel.
+
+        Args:
+            bucket_id (int): The channel id
+
+        Returns:
+            ChannelBucket: The bucket
+        '''
+        if not bucket_id in self.buckets:
+            self.buckets[bucket_id] = ChannelBucket()
+        return self.buckets[bucket_id]
+
+    def rate_for(self, message: QueueMessage) -> TokenBucket:
+        '''
+        Get the global rate limit that applies to a message.
+
+        Args:
+            message (QueueMessage): The message
+
+        Returns:
+            TokenBucket: The webhook rate limit for webhook messages, otherwise the bot's global rate limit
+        '''
+        return self.webhook_rate if message.webhook else self.rate
+
+    def pop_ready(self, now: float) -> list[QueueMessage]:
+        '''
+        Take as many messages from the queue as the rate limits and the maximum number of requests in flight allow.
+        In every round, each lane is credited its weight and may send as many messages as it has credit for.
+        Channels whose rate limit bucket is exhausted are skipped, and keep their messages queued.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            list[QueueMessage]: The messages that can be sent now
+        '''
+        messages: list[QueueMessage] = []
+        utc_now: datetime = datetime.now(UTC)
+        slots: int = self.senders.free()
+        tokens: dict[TokenBucket, int] = {self.rate: self.rate.available(now), self.webhook_rate: self.webhook_rate.available(now)}
+
+        def admit(message: QueueMessage) -> bool:
+            nonlocal slots
+            rate: TokenBucket = self.rate_for(message)
+            if slots <= 0 or tokens[rate] <= 0:
+                return False
+            slots -= 1
+            tokens[rate] -= 1
+            return True
+
+        progress: bool = True
+        while progress and slots > 0:
+            progress = False
+            for lane in self.lanes.values():
+                if not lane:
+                    lane.deficit = 0
+                    continue
+                lane.deficit += lane.weight
+                while lane.deficit >= 1 and slots > 0:
+                    message, expired = lane.pop_next(self.bucket, admit, now, utc_now, self.coalesce_window)
+                    self.dropped['expired'] += expired
+                    if message:
+                        messages.append(message)
+                        lane.deficit -= 1
+                        progress = True
+                    elif not expired:
+                        # None of the channels in this lane can be sent to right now, so don't let it build up credit
+                        lane.deficit = 0
+                        break
+                if slots <= 0:
+                    break
+        return messages
+
+    def prune_buckets(self, now: float) -> None:
+        '''
+        Discard rate limit buckets of channels without pending messages or recent sends.
+
+        Args:
+            now (float): The current monotonic time
+        '''
+        pending: set[int] = set(bucket_id for lane in self.lanes.values() for bucket_id in lane.channels.keys())
+        for bucket_id in [id for id, bucket in self.buckets.items() if not id in pending and bucket.is_idle(now)]:
+            del self.buckets[bucket_id]
+
+    def next_wakeup(self, now: float) -> float | None:
+        '''
+        Time in seconds until the next queued message can be sent.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            float | None: The delay in seconds, or None if there is nothing to do until a message is queued or a send completes
+        '''
+        if not len(self) or not self.senders.free():
+            return None
+        delays: dict[TokenBucket, float] = {self.rate: self.rate.delay(now), self.webhook_rate: self.webhook_rate.delay(now)}
+        ready: float = min(max(self.bucket(bucket_id).next_ready(now, self.coalesce_window), now + delays[self.rate_for(pending[0])])
+            for lane in self.lanes.values() for bucket_id, pending in lane.channels.items())
+        return max(0, ready - now)
+
+    async def send(self, message: QueueMessage) -> None:
+        '''
+        Send a message, handle the outcome, and record its latency.
+
+        Args:
+            message (QueueMessage): The message
+        '''
+        start: float = time.monotonic()
+        try:
+            async with asyncio.timeout(self.max_send_time):
+                await message.send()
+            # Retried messages keep their original enqueue time, so time spent waiting for a retry counts as time in the queue
+            for source, enqueued_at in [(message.source, message.enqueued_at)] + message.merged:
+                self.queue_time[source].record(start - enqueued_at)
+            self.send_time[message.source].record(time.monotonic() - start)
+            rate: TokenBucket = self.rate_for(message)
+            rate.rate = min(self.rate_limit, rate.rate + self.rate_limit_increase)
+        except MessageRetryException as e:
+            self.retry(message, e)
+        except TimeoutError:
+            self.retry(message, MessageRetryException(f'Not sent within {self.max_send_time} s, the channel is likely rate limited'))
+
+    def retry(self, message: QueueMessage, e: MessageRetryException) -> None:
+        '''
+        Re-queue a message that failed to send at its original priority, after the delay requested by Discord or an exponential backoff.
+        The channel is blocked until then. If we hit the global rate limit, the global rate is reduced as well.
+        Messages with files can not be retried, because discord.py closes the files after a request.
+
+        Args:
+            message (QueueMessage): The message
+            e (MessageRetryException): The exception that caused the send to fail
+        '''
+        now: float = time.monotonic()
+        if e.status == 404 and message.webhook:
+            # The webhook was deleted, so send the message as a regular message instead
+            self.invalid_webhooks.add(message.webhook.id)
+            message.webhook = None
+            self.lanes[message.priority].requeue(message)
+            self.wakeup.set()
+            return
+
+        message.attempts += 1
+        rate: TokenBucket = self.rate_for(message)
+        if e.status == 429 and e.is_global:
+            rate.rate = max(self.min_rate_limit, rate.rate * self.rate_limit_decrease)
+        delay: float = e.retry_after if e.retry_after else min(60, 2 ** message.attempts)
+        self.bucket(message.bucket_id).block(now + delay)
+
+        if message.attempts >= self.max_attempts or message.files:
+            self.dropped['failed'] += 1
+            error: str = f'Failed to send a message to channel {message.channel.id} after {message.attempts} attempt(s):\n{e}'
+            logging.critical(error)
+            print(error)
+            return
+
+        self.lanes[message.priority].requeue(message)
+        self.wakeup.set()
 
     async def send_queued_messages(self) -> None:
         '''
-        Sends queued messages in chunks according to rate limit availability.
-        The global rate limit is 50 requests per second. 
-        To be on the safe side, we work with a max of 40 requests per second here.
-        The queue is checked every 25 ms, or whenever the rate limit has expired.
-        Numbers here assume that any processing is instant.
+        Sends queued messages according to rate limit availability.
+        The global rate limit is shared between the priority lanes, and enforced by a token bucket.
+        Webhook messages are rate limited separately, as they do not count towards the bot's global rate limit.
+        Sends are executed concurrently by a sliding window: a new send starts as soon as a previous one completes,
+        rather than waiting for a whole batch of sends to complete.
+        On top of that, each channel is limited to 5 messages per 5 seconds, tracked by its ChannelBucket.
+        Every coalesced message counts as a single request.
+        Messages that fail due to rate limits or server errors are retried, and rate limits reduce the global rate temporarily.
+        The sender sleeps until a message is queued or a send completes, or until the earliest moment a pending message can be sent,
+        such that it uses no resources while the queue is empty, and sends new messages immediately.
         '''
-        rate_limit: int = 40
-        # Keeps track of messages sent in previous iterations
-        # Each element denotes the number of messages sent in a 25 ms chunk
-        messages_sent: deque[int] = deque([0 for _ in range(rate_limit)], rate_limit)
+        last_prune: float = time.monotonic()
         while True:
-            current: int = sum(messages_sent)
-            limit: int = rate_limit - current
-            
-            messages: list[QueueMessage] = [self.popleft() for _ in range(min(len(self), limit))]
-            await chunk_coroutines([message.send() for message in messages], rate_limit)
-            sent: int = len(messages)
-
-            # Wait to avoid hitting rate limits.
-            # However, we don't want to simply wait a second between every time we check the message queue.
-            # Instead, as a baseline we check the queue every 25 ms.
-            # However, when we hit the rate limit, we wait until the rate limit has expired
-            first_change: int = messages_sent.popleft()
-            while first_change == 0 and len(messages_sent) > 0 and sum(messages_sent) >= rate_limit:
-                first_change = messages_sent.popleft()
-            iterations_to_wait: int = rate_limit - len(messages_sent)
-            messages_sent.append(sent)
-            while len(messages_sent) < rate_limit:
-                messages_sent.append(0)
-            
-            await asyncio.sleep(iterations_to_wait / rate_limit)
\ No newline at end of file
+            # Clear the wakeup event before taking messages, such that messages queued while sending still wake us up
+            self.wakeup.clear()
+
+            now: float = time.monotonic()
+            messages: list[QueueMessage] = self.pop_ready(now)
+            for message in messages:
+                self.rate_for(message).take(now)
+                self.senders.submit(self.send(message), lambda _: self.wakeup.set())
+
+            now = time.monotonic()
+            if now - last_prune >= 1:
+                self.prune_buckets(now)
+                last_prune = now
+
+            delay: float | None = self.next_wakeup(now)
+            if delay == 0:
+                continue
+            try:
+                async with asyncio.timeout(delay):
+                    await self.wakeup.wait()
+            except TimeoutError:
+                pass
@@ -0,0 +1,140 @@
+from bisect import bisect_left
+import time
+
+class RollingHistogram:
+    '''
+    Histogram of durations over a rolling time window.
+    Samples are counted in exponentially growing buckets, such that recording a sample and computing percentiles
+    take constant time and memory, regardless of the number of samples.
+    The window is divided into slots, and the oldest slot is discarded as time moves on.
+    '''
+    # Upper bounds of the buckets in seconds, growing by a factor ~1.25 from 1 ms to ~20 minutes
+    bounds: list[float] = [0.001 * 1.25 ** i for i in range(64)]
+
+    window: float
+    slot_duration: float
+    # Sample counts per bucket, per slot. The last bucket counts samples that exceed all bounds.
+    slots: list[list[int]]
+    # Index of the slot covering the current time, and the time at which that slot started
+    current: int
+    current_start: float
+    maximum: float
+
+    def __init__(self, window: float = 3600, slot_count: int = 60) -> None:
+        '''
+        Args:
+            window (float, optional): Length of the rolling window in seconds. Defaults to 3600.
+            slot_count (int, optional): Number of slots the window is divided in. Defaults to 60.
+        '''
+        self.window = window
+        self.slot_duration = window / slot_count
+        self.slots = [[0] * (len(self.bounds) + 1) for _ in range(slot_count)]
+        self.current = 0
+        self.current_start = time.monotonic()
+        self.maximum = 0
+
+    def rotate(self, now: float) -> None:
+        '''
+        Advance the current slot to the given time, clearing the slots that fell out of the window.
+
+        Args:
+            now (float): The current monotonic time
+        '''
+        elapsed: int = int((now - self.current_start) // self.slot_duration)
+        if elapsed <= 0:
+            return
+        for _ in range(min(elapsed, len(self.slots))):
+            self.current = (self.current + 1) % len(self.slots)
+            self.slots[self.current] = [0] * (len(self.bounds) + 1)
+        self.current_start += elapsed * self.slot_duration
+        if elapsed >= len(self.slots):
+            self.maximum = 0
+
+    def record(self, value: float) -> None:
+        '''
+        Add a sample to the histogram.
+
+        Args:
+            value (float): The duration in seconds
+        '''
+        self.rotate(time.monotonic())
+        self.slots[self.current][bisect_left(self.bounds, value)] += 1
+        self.maximum = max(self.maximum, value)
+
+    def counts(self) -> list[int]:
+        '''
+        Get the sample counts per bucket over the whole window.
+
+        Returns:
+            list[int]: The number of samples per bucket
+        '''
+        self.rotate(time.monotonic())
+        return [sum(bucket) for bucket in zip(*self.slots)]
+
+    def __len__(self) -> int:
+        return sum(self.counts())
+
+    def percentiles(self, *percentiles: float) -> list[float]:
+        '''
+        Get percentiles of the samples in the window.
+        Values are the upper bound of the bucket the percentile falls in, so they are accurate to within ~25%.
+
+        Args:
+            percentiles (float): The percentiles, between 0 and 100
+
+        Returns:
+            list[float]: The value in seconds for each percentile, 0 if there are no samples
+        '''
+        counts: list[int] = self.counts()
+        total: int = sum(counts)
+        results: list[float] = []
+        for percentile in percentiles:
+            if not total:
+                results.append(0)
+                continue
+            rank: float = percentile / 100 * total
+            cumulative: int = 0
+            for i, count in enumerate(counts):
+                cumulative += count
+                if cumulative >= rank and cumulative > 0:
+                    results.append(min(self.bounds[i], self.maximum) if i < len(self.bounds) else self.maximum)
+                    break
+        return results
+
+class HoldTimeStats:
+    '''
+    Statistics on how long a resource, e.g. a database session, is held by a single call site.
+    The stack of the longest hold that exceeded the threshold is kept, to find out what the call site was waiting for.
+    '''
+    count: int
+    total: float
+    maximum: float
+    histogram: RollingHistogram
+    # Number of holds that exceeded the threshold, and the stack of the longest of them
+    long_holds: int
+    long_hold_stack: str | None
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+        self.histogram = RollingHistogram()
+        self.long_holds = 0
+        self.long_hold_stack = None
+
+    def record(self, duration: float, stack: str | None = None) -> None:
+        '''
+        Record a hold.
+
+        Args:
+            duration (float): The time in seconds the resource was held
+            stack (str | None, optional): The stack of the call site, for holds that exceeded the threshold. Defaults to None.
+        '''
+        if stack is not None:
+            self.long_holds += 1
+            if duration >= self.maximum:
+                self.long_hold_stack = stack
+        self.count += 1
+        self.total += duration
+        self.maximum = max(self.maximum, duration)
+        self.histogram.record(duration)
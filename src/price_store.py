@@ -0,0 +1,251 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Sequence
+import numpy as np
+from src.database import OSRSItem, RS3Item
+
+# Version of the snapshot format, snapshots with a different version are ignored
+snapshot_version: int = 1
+
+# Multipliers of the abbreviations used by the GE API for large prices, e.g. '1.2m'
+price_abbreviations: dict[str, int] = {'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000}
+
+def parse_price(price: str | int) -> int:
+    '''
+    Parse a price or price change as stored in the item tables.
+    Prices computed by the bot are plain integers, but prices taken from the GE API use its display format,
+    with thousands separators, a sign separated by a space, and abbreviations, e.g. '1,234', '- 5', '+12.5k' or '1.2m'.
+
+    Args:
+        price (str | int): The price
+
+    Raises:
+        ValueError: If the price is not in any of these formats
+
+    Returns:
+        int: The price
+    '''
+    text: str = str(price).replace(' ', '').replace(',', '').lower()
+    multiplier: int = 1
+    if text and text[-1] in price_abbreviations:
+        multiplier = price_abbreviations[text[-1]]
+        text = text[:-1]
+    try:
+        return int(Decimal(text) * multiplier)
+    except InvalidOperation:
+        raise ValueError(f'Invalid price: {price!r}')
+
+def parse_graph_data(graph_data: dict[str, dict[str, str]]) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Parse the daily prices from GE graph data into arrays.
+
+    Args:
+        graph_data (dict[str, dict[str, str]]): The graph data, as returned by the GE API, with prices per timestamp in ms
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The timestamps in seconds and prices, as sorted int64 arrays
+    '''
+    daily: dict[str, str] = graph_data.get('daily', {}) if graph_data else {}
+    timestamps: np.ndarray = np.fromiter((int(ms) // 1000 for ms in daily.keys()), dtype=np.int64, count=len(daily))
+    prices: np.ndarray = np.fromiter((int(price) for price in daily.values()), dtype=np.int64, count=len(daily))
+    order: np.ndarray = np.argsort(timestamps, kind='stable')
+    return timestamps[order], prices[order]
+
+def history_from_rows(rows: Sequence[tuple[int, date, int]]) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    '''
+    Build the price history arrays of items from rows of the price_history table.
+
+    Args:
+        rows (Sequence[tuple[int, date, int]]): (item id, day, price) rows, ordered by item id and day
+
+    Returns:
+        dict[int, tuple[np.ndarray, np.ndarray]]: The timestamps in seconds and prices per item id, as sorted int64 arrays
+    '''
+    if not rows:
+        return {}
+    item_ids: np.ndarray = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    # Days since the epoch, as the ordinal of 1970-01-01 is 719163
+    timestamps: np.ndarray = (np.fromiter((row[1].toordinal() for row in rows), dtype=np.int64, count=len(rows)) - 719163) * 86400
+    prices: np.ndarray = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+    starts: np.ndarray = np.flatnonzero(np.concatenate(([True], item_ids[1:] != item_ids[:-1])))
+    ends: np.ndarray = np.append(starts[1:], len(rows))
+    return {int(item_ids[start]): (timestamps[start:end], prices[start:end]) for start, end in zip(starts, ends)}
+
+def history_to_rows(game: str, item_id: int, timestamps: np.ndarray, prices: np.ndarray) -> list[dict[str, Any]]:
+    '''
+    Convert price history arrays of an item to rows of the price_history table.
+
+    Args:
+        game (str): The game, 'osrs' or 'rs3'
+        item_id (int): The item id
+        timestamps (np.ndarray): The timestamps in seconds
+        prices (np.ndarray): The prices
+
+    Returns:
+        list[dict[str, Any]]: The rows
+    '''
+    return [{'game': game, 'item_id': item_id, 'day': date(1970, 1, 1) + timedelta(days=int(t) // 86400), 'price': int(p)} for t, p in zip(timestamps, prices)]
+
+class ItemPrices:
+    '''
+    Compact in-memory representation of a GE item and its price history.
+    The price history is kept as int64 arrays rather than the graph data dict stored in the database,
+    which takes a fraction of the memory and needs no parsing when rendering prices or graphs.
+    '''
+    __slots__ = ('id', 'name', 'icon_url', 'type', 'description', 'members', 'current', 'today', 'day30', 'day90', 'day180', 'timestamps', 'prices')
+
+    id: int
+    name: str
+    icon_url: str
+    type: str
+    description: str
+    members: bool
+    current: int
+    today: int
+    day30: str
+    day90: str
+    day180: str
+    # Timestamps (in seconds) and prices of the daily price history, oldest first
+    timestamps: np.ndarray
+    prices: np.ndarray
+
+    def __init__(self, item: OSRSItem | RS3Item, history: tuple[np.ndarray, np.ndarray] | None = None) -> None:
+        '''
+        Args:
+            item (OSRSItem | RS3Item): The database item to copy
+            history (tuple[np.ndarray, np.ndarray] | None, optional): The timestamps and prices of the price history,
+                e.g. from the price_history table. Defaults to None, in which case the graph data of the item is used.
+        '''
+        self.id = item.id
+        self.name = item.name
+        self.icon_url = item.icon_url
+        self.type = item.type
+        self.description = item.description
+        self.members = item.members
+        # A single item with an invalid price should not prevent the whole cache from loading
+        try:
+            self.current = parse_price(item.current)
+            self.today = parse_price(item.today)
+        except ValueError as e:
+            logging.error(f'Item {item.id}: {e}')
+            self.current, self.today = 0, 0
+        self.day30 = item.day30
+        self.day90 = item.day90
+        self.day180 = item.day180
+        self.timestamps, self.prices = history if history is not None else parse_graph_data(item.graph_data)
+
+    @classmethod
+    def from_snapshot(cls, metadata: dict[str, Any], timestamps: np.ndarray, prices: np.ndarray) -> 'ItemPrices':
+        '''
+        Create an item from snapshot metadata and its slice of the snapshot price arrays.
+
+        Args:
+            metadata (dict[str, Any]): The item metadata
+            timestamps (np.ndarray): The timestamps of the price history
+            prices (np.ndarray): The prices of the price history
+
+        Returns:
+            ItemPrices: The item
+        '''
+        item: ItemPrices = cls.__new__(cls)
+        for attribute in metadata_attributes:
+            setattr(item, attribute, metadata[attribute])
+        item.timestamps = timestamps
+        item.prices = prices
+        return item
+
+    def history(self, days: int) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Get the price history for the given number of days, up to the latest price.
+
+        Args:
+            days (int): The number of days
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The timestamps in seconds and prices within the period
+        '''
+        if not len(self.timestamps):
+            return self.timestamps, self.prices
+        start: int = int(np.searchsorted(self.timestamps, self.timestamps[-1] - 86400 * days))
+        return self.timestamps[start:], self.prices[start:]
+
+# Attributes of ItemPrices that are stored in the JSON metadata of a snapshot
+metadata_attributes: list[str] = [a for a in ItemPrices.__slots__ if a not in ['timestamps', 'prices']]
+
+def write_snapshot(path: Path, items: list[ItemPrices], created_at: datetime) -> None:
+    '''
+    Write items to a snapshot on disk.
+    A snapshot consists of the price histories of all items concatenated into two .npy files (timestamps and prices),
+    which can be memory-mapped when loading, and a JSON file with the metadata of every item and its offset in the arrays.
+
+    Args:
+        path (Path): The path of the snapshot, without extension, e.g. data/cache/osrs_items
+        items (list[ItemPrices]): The items
+        created_at (datetime): Time up to which the snapshot reflects the database
+    '''
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lengths: list[int] = [len(item.timestamps) for item in items]
+    offsets: np.ndarray = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+    timestamps: np.ndarray = np.concatenate([item.timestamps for item in items]) if items else np.empty(0, dtype=np.int64)
+    prices: np.ndarray = np.concatenate([item.prices for item in items]) if items else np.empty(0, dtype=np.int64)
+    metadata: dict[str, Any] = {
+        'version': snapshot_version,
+        'created_at': created_at.isoformat(),
+        'items': [{**{a: getattr(item, a) for a in metadata_attributes}, 'offset': int(offsets[i]), 'length': lengths[i]} for i, item in enumerate(items)]
+    }
+
+    # The arrays are written to new files, named after the creation time, which are only referenced once the metadata is replaced.
+    # This way, a crash while writing never leaves metadata pointing to arrays of a different snapshot.
+    stamp: str = created_at.strftime('%Y%m%d%H%M%S')
+    metadata['timestamps_file'] = f'{path.name}_{stamp}_timestamps.npy'
+    metadata['prices_file'] = f'{path.name}_{stamp}_prices.npy'
+    np.save(path.with_name(metadata['timestamps_file']), timestamps.astype(np.int64, copy=False))
+    np.save(path.with_name(metadata['prices_file']), prices.astype(np.int64, copy=False))
+    metadata_file: Path = path.with_name(f'{path.name}.json')
+    with open(f'{metadata_file}.tmp', 'w') as f:
+        json.dump(metadata, f)
+    os.replace(f'{metadata_file}.tmp', metadata_file)
+
+    # Remove the arrays of older snapshots. Cached items loaded from an older snapshot may still memory-map its arrays.
+    # On POSIX systems, those remain readable until they are unmapped. On Windows, mapped files can not be deleted,
+    # so they are skipped here, and removed by a later write once they are no longer mapped.
+    for old in path.parent.glob(f'{path.name}_*.npy'):
+        if old.name not in [metadata['timestamps_file'], metadata['prices_file']]:
+            try:
+                old.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+def read_snapshot(path: Path) -> tuple[datetime, dict[int, ItemPrices]] | None:
+    '''
+    Read items from a snapshot on disk. The price arrays are memory-mapped, so loading takes time proportional to the number of items,
+    not the size of their price histories.
+
+    Args:
+        path (Path): The path of the snapshot, without extension, e.g. data/cache/osrs_items
+
+    Returns:
+        tuple[datetime, dict[int, ItemPrices]] | None: The time up to which the snapshot reflects the database, and the items by id,
+        or None if there is no valid snapshot
+    '''
+    try:
+        with open(path.with_name(f'{path.name}.json')) as f:
+            metadata: dict[str, Any] = json.load(f)
+        if metadata.get('version') != snapshot_version:
+            return None
+        timestamps: np.ndarray = np.load(path.with_name(metadata['timestamps_file']), mmap_mode='r')
+        prices: np.ndarray = np.load(path.with_name(metadata['prices_file']), mmap_mode='r')
+        items: dict[int, ItemPrices] = {}
+        for item_metadata in metadata['items']:
+            start: int = item_metadata['offset']
+            end: int = start + item_metadata['length']
+            if end > len(timestamps) or end > len(prices):
+                return None
+            items[item_metadata['id']] = ItemPrices.from_snapshot(item_metadata, timestamps[start:end], prices[start:end])
+        return datetime.fromisoformat(metadata['created_at']), items
+    except (OSError, ValueError, KeyError):
+        return None
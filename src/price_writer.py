@@ -0,0 +1,163 @@
+import asyncio
+import time
+from typing import Any, Callable
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert, Insert
+from src.database import Database, OSRSItem, PriceHistory, RS3Item
+from src.price_store import ItemPrices, history_to_rows, parse_graph_data
+
+class PriceWriter:
+    '''
+    Buffered writer for GE price updates of a single game.
+    Updates are applied to the cache immediately, and written to the database in batches, with a single INSERT ... ON CONFLICT DO UPDATE
+    statement per batch. The cached item is used as the pre-image of the row, so no read is needed before writing.
+    Only days that are not in the cached price history yet are appended to the price_history table.
+    '''
+    db: Database
+    model: type[OSRSItem] | type[RS3Item]
+    game: str
+    # Gets the cached item by id, and updates the cache with a changed item and its price history
+    get_cached: Callable[[int], ItemPrices | None]
+    set_cached: Callable[[Any, tuple[np.ndarray, np.ndarray]], None]
+    # Full rows of pending updates by item id, and the time (monotonic) at which the oldest pending update was added
+    pending: dict[int, dict[str, Any]]
+    oldest: float | None
+    # Pending price_history rows by item id
+    pending_history: dict[int, list[dict[str, Any]]]
+    # Held while flushing, such that flushes are written one at a time
+    flush_lock: asyncio.Lock
+
+    # Pending updates are flushed once there are this many, or once the oldest has waited this many seconds
+    batch_size: int = 50
+    max_delay: float = 60
+    # Maximum number of price_history rows per statement
+    history_chunk_size: int = 5000
+
+    # Columns changed by price updates
+    price_columns: list[str] = ['current', 'today', 'day30', 'day90', 'day180']
+
+    def __init__(self, db: Database, model: type[OSRSItem] | type[RS3Item], game: str, get_cached: Callable[[int], ItemPrices | None], set_cached: Callable[[Any, tuple[np.ndarray, np.ndarray]], None]) -> None:
+        '''
+        Args:
+            db (Database): The database
+            model (type[OSRSItem] | type[RS3Item]): The item model
+            game (str): The game of the items in the price_history table, 'osrs' or 'rs3'
+            get_cached (Callable[[int], ItemPrices | None]): Gets a cached item by id
+            set_cached (Callable[[Any, tuple[np.ndarray, np.ndarray]], None]): Adds / updates an item and its price history in the cache, e.g. Cache.osrs_item
+        '''
+        self.db = db
+        self.model = model
+        self.game = game
+        self.get_cached = get_cached
+        self.set_cached = set_cached
+        self.pending = {}
+        self.oldest = None
+        self.pending_history = {}
+        self.flush_lock = asyncio.Lock()
+
+    def add(self, item: ItemPrices, current: str, today: str, day30: str, day90: str, day180: str, graph_data: dict[str, dict[str, str]]) -> None:
+        '''
+        Add a price update for an item, and apply it to the cache.
+
+        Args:
+            item (ItemPrices): The cached item
+            current (str): The current price
+            today (str): The change in price since yesterday
+            day30 (str): The change in price over 30 days, as percentage
+            day90 (str): The change in price over 90 days, as percentage
+            day180 (str): The change in price over 180 days, as percentage
+            graph_data (dict[str, dict[str, str]]): The graph data, as returned by the GE API
+        '''
+        row: dict[str, Any] = {
+            'id': item.id,
+            'name': item.name,
+            'icon_url': item.icon_url,
+            'type': item.type,
+            'description': item.description,
+            'members': item.members,
+            'current': current,
+            'today': today,
+            'day30': day30,
+            'day90': day90,
+            'day180': day180
+        }
+        # Append the days after the last day in the cached history
+        timestamps, prices = parse_graph_data(graph_data)
+        if len(item.timestamps):
+            new: np.ndarray = timestamps > item.timestamps[-1]
+            timestamps, prices = timestamps[new], prices[new]
+        self.set_cached(self.model(**row), (np.concatenate((item.timestamps, timestamps)), np.concatenate((item.prices, prices))))
+        self.pending[item.id] = row
+        if len(timestamps):
+            self.pending_history.setdefault(item.id, []).extend(history_to_rows(self.game, item.id, timestamps, prices))
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+
+    def is_due(self) -> bool:
+        '''
+        Whether the pending updates should be flushed.
+
+        Returns:
+            bool: True if there are enough pending updates, or the oldest has waited long enough
+        '''
+        return len(self.pending) >= self.batch_size or (self.oldest is not None and time.monotonic() - self.oldest >= self.max_delay)
+
+    async def flush(self) -> int:
+        '''
+        Write all pending updates to the database in a single transaction, with one statement for the items,
+        and one for the new days of their price histories (per chunk of rows, to stay within the limit on query parameters).
+        Updates of items that have been removed from the cache in the meantime are discarded, such that removed items are not inserted again.
+        If writing fails, the updates remain pending, and are retried on the next flush.
+        Flushes wait for any flush in progress to complete, such that once a flush returns, all updates that were added before it was called
+        have been written, even if the flush in progress failed.
+
+        Returns:
+            int: The number of items written
+        '''
+        async with self.flush_lock:
+            return await self.__flush()
+
+    async def __flush(self) -> int:
+        '''
+        Write all pending updates to the database, see flush.
+
+        Returns:
+            int: The number of items written
+        '''
+        rows: list[dict[str, Any]] = [row for id, row in self.pending.items() if self.get_cached(id)]
+        history: list[dict[str, Any]] = [row for id, rows in self.pending_history.items() if self.get_cached(id) for row in rows]
+        pending: dict[int, dict[str, Any]] = self.pending
+        pending_history: dict[int, list[dict[str, Any]]] = self.pending_history
+        self.pending, self.oldest, self.pending_history = {}, None, {}
+        if not rows:
+            return 0
+        try:
+            statement: Insert = insert(self.model).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[self.model.id],
+                set_={**{column: statement.excluded[column] for column in self.price_columns}, 'updated_at': func.now()}
+            )
+            async with self.db.get_session() as session:
+                await session.execute(statement)
+                for i in range(0, len(history), self.history_chunk_size):
+                    await session.execute(insert(PriceHistory).values(history[i:i+self.history_chunk_size]).on_conflict_do_nothing())
+                await session.commit()
+        except:
+            # Keep the failed updates, unless they have been superseded by newer updates in the meantime.
+            # New days are kept in any case, as later updates only append the days after them.
+            self.pending = {**pending, **self.pending}
+            for id, history_rows in pending_history.items():
+                self.pending_history[id] = history_rows + self.pending_history.get(id, [])
+            self.oldest = time.monotonic()
+            raise
+        return len(rows)
+
+    async def flush_if_due(self) -> int:
+        '''
+        Flush the pending updates if they are due, see is_due.
+
+        Returns:
+            int: The number of items written
+        '''
+        return await self.flush() if self.is_due() else 0
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, UTC
 import logging
 from pathlib import Path
@@ -8,7 +9,8 @@ from src.bot import Bot
 import string
 import traceback
 from src.message_queue import QueueMessage
-from src.database import Guild, Uptime
+from src.database import Guild, UptimeInterval
+from src.channel_features import ChannelFeatures
 from src.discord_utils import find_text_channel, get_custom_command
 from src.database_utils import find_or_create_db_guild
 from src.startup_tasks import role_setup, check_guilds
@@ -37,12 +39,20 @@ class RuneClock(Bot):
     async def setup_database(self) -> None:
         '''
         Initialize the database engine and session.
-        Ensure all tables are created.
+        Ensure all tables are created, and apply pending migrations.
         '''
         print('Setting up database connection...')
 
         try:
             await self.db.create_all_database_tables()
+            # Set migrations_dry_run in the config to only report pending migrations
+            dry_run: bool = self.config.get('migrations_dry_run', False)
+            for migration in await self.db.migrate(dry_run):
+                msg: str = f'{"Pending" if dry_run else "Applied"} migration {migration.version}: {migration.description}'
+                if dry_run:
+                    msg += ''.join(f'\n  {statement};' for statement in migration.statements)
+                print(msg)
+                logging.critical(msg)
         except Exception as e:
             error: str = f'Error encountered while setting up database: \n{type(e).__name__}: {e}'
             logging.critical(error)
@@ -60,10 +70,12 @@ class RuneClock(Bot):
         await self.setup_database()
 
         async with self.db.get_session() as session:
-            session.add(Uptime(time=self.start_time, status='started'))
+            session.add(UptimeInterval(start=self.start_time, last_heartbeat=self.start_time))
             await session.commit()
 
-        await self.cache.build()
+        # Load the cache in the background. Only guilds are needed before loading extensions, other features wait for their own data.
+        cache_build: asyncio.Task = asyncio.create_task(self.cache.build())
+        await self.cache.wait_until_ready('guilds')
 
         print(f'Loading Discord...')
 
@@ -84,6 +96,13 @@ class RuneClock(Bot):
         if channel:
             self.queue_message(QueueMessage(channel, msg))
 
+        await cache_build
+        cache_msg: str = 'Cache ready: ' + ', '.join(f'{name} in {load_time:.2f} s' for name, load_time in self.cache.load_times.items())
+        print(cache_msg)
+        logging.critical(cache_msg)
+        if channel:
+            self.queue_message(QueueMessage(channel, cache_msg))
+
     async def load_all_extensions(self) -> None:
         '''
         Attempts to load all .py files in /cogs/ as cog extensions
@@ -128,41 +147,63 @@ class RuneClock(Bot):
     async def on_message(self, message: discord.Message) -> None:
         '''
         This event triggers on every message received by the bot. Including ones that it sent itself.
-        Processes commands and logs processing time.
+        Routes guild messages to the handlers of the features that apply to their channel (sticky messages, modmail),
+        according to the precomputed channel features of the guild, and processes commands and logs processing time.
         '''
-        if message.author.bot:
-            return  # ignore all bots
-
         # For now, ignore messages that were not sent from guilds, because this might break certain commands
         if message.guild is None or not isinstance(message.channel, discord.TextChannel):
             return
-        
+
+        await self.cache.wait_until_ready('guilds')
+        await self.cache.wait_until_ready('sticky_messages')
+
         # Get guild from cache, or fetch it from the database / create it if it is not cached yet
         # This can happen e.g. if the bot was added to the guild while it was down, such that it was unable to receive the on_guild_join event
         guild: Guild | None = self.cache.get_guild(message.guild)
         if not guild:
+            if message.author.bot:
+                return
             async with self.db.get_session() as session:
                 guild = await find_or_create_db_guild(session, message.guild)
             self.cache.guild(guild)
+        features: ChannelFeatures = self.cache.get_channel_features(guild, self.user.id if self.user else None)
+
+        # Sticky messages are re-sent after any message, including those of bots
+        if features.is_sticky(message.channel.id) and 'sticky' in self.message_handlers:
+            await self.message_handlers['sticky'](message)
+
+        if message.author.bot:
+            return  # ignore all bots
+
+        # Messages in the modmail channel are forwarded, and still processed as commands below
+        if features.is_modmail(message.channel.id) and 'modmail' in self.message_handlers:
+            await self.message_handlers['modmail'](message)
 
         now: datetime = datetime.now(UTC)
         msg: str = message.content
-        prefix: str = guild.prefix if guild.prefix else '-'
 
-        for command_name in (guild.disabled_commands if guild.disabled_commands else []):
-            if msg.startswith(f'{prefix}{command_name}') or (self.user and msg.startswith(f'{self.user.mention} {command_name}')):
-                self.queue_message(QueueMessage(message.channel, f'The command `{command_name}` has been disabled in this server. Please contact a server admin to enable it.'))
-                return
+        # Messages without a command prefix can not invoke any command, so they are not passed to the command framework
+        prefix: str | None = features.match_prefix(msg)
+        if prefix is None:
+            return
 
-        if msg.startswith(prefix):
-            txt: str = f'{datetime.now(UTC)}: Command \"{msg}\" received; processing...'
-            logging.info(str(filter(lambda x: x in string.printable, txt)))
-            print(txt)
+        disabled_command: str | None = features.disabled_command(msg, prefix)
+        if disabled_command:
+            self.queue_message(QueueMessage(message.channel, f'The command `{disabled_command}` has been disabled in this server. Please contact a server admin to enable it.'))
+            return
 
-        await self.process_commands(message)
+        txt: str = f'{datetime.now(UTC)}: Command \"{msg}\" received; processing...'
+        logging.info(str(filter(lambda x: x in string.printable, txt)))
+        print(txt)
 
-        if msg.startswith(prefix):
-            time: float = (datetime.now(UTC) - now).total_seconds() * 1000
-            txt = f'Command \"{msg}\" processed in {time} ms.'
-            logging.info(str(filter(lambda x: x in string.printable, txt)))
-            print(txt)
\ No newline at end of file
+        # The resolved prefix is reused by get_command_prefix while the command is processed
+        self.resolved_prefixes[message.id] = prefix
+        try:
+            await self.process_commands(message)
+        finally:
+            self.resolved_prefixes.pop(message.id, None)
+
+        time: float = (datetime.now(UTC) - now).total_seconds() * 1000
+        txt = f'Command \"{msg}\" processed in {time} ms.'
+        logging.info(str(filter(lambda x: x in string.printable, txt)))
+        print(txt)
\ No newline at end of file
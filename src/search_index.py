@@ -0,0 +1,170 @@
+from bisect import bisect_left, insort
+from collections import Counter
+import re
+
+def normalize_name(name: str) -> str:
+    '''
+    Normalize a name for searching: case-insensitive, ignoring punctuation and redundant whitespace.
+
+    Args:
+        name (str): The name
+
+    Returns:
+        str: The normalized name
+    '''
+    return ' '.join(re.sub(r'[^\w\s]', '', name.casefold()).split())
+
+def trigrams(name: str) -> set[str]:
+    '''
+    Get the trigrams (substrings of 3 characters) of a normalized name.
+
+    Args:
+        name (str): The normalized name
+
+    Returns:
+        set[str]: The trigrams
+    '''
+    return set(name[i:i+3] for i in range(len(name) - 2))
+
+class NameSearchIndex:
+    '''
+    Search index over names, e.g. of GE items.
+    Names are normalized, and indexed by sorted name and word lists for prefix searches, and by trigrams for substring and fuzzy searches.
+    The index is updated incrementally as names are added or removed.
+    '''
+    # Normalized name per id
+    names: dict[int, str]
+    # Sorted (normalized name, id) pairs, for prefix searches on the full name
+    sorted_names: list[tuple[str, int]]
+    # Sorted (word, id) pairs, for prefix searches on single words, which is used for queries shorter than a trigram
+    sorted_words: list[tuple[str, int]]
+    # Ids of the names containing each trigram
+    postings: dict[str, set[int]]
+    # Number of trigrams per id, for computing similarities
+    trigram_counts: dict[int, int]
+
+    # Minimum trigram similarity for a name to be suggested when there is no match
+    min_similarity: float = 0.3
+
+    def __init__(self) -> None:
+        self.names = {}
+        self.sorted_names = []
+        self.sorted_words = []
+        self.postings = {}
+        self.trigram_counts = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, id: int, name: str) -> None:
+        '''
+        Add a name to the index, or update it if the id is already indexed.
+
+        Args:
+            id (int): The id of the named object, e.g. an item id
+            name (str): The name
+        '''
+        normalized: str = normalize_name(name)
+        if self.names.get(id) == normalized:
+            return
+        self.remove(id)
+        self.names[id] = normalized
+        insort(self.sorted_names, (normalized, id))
+        for word in set(normalized.split()):
+            insort(self.sorted_words, (word, id))
+        name_trigrams: set[str] = trigrams(normalized)
+        self.trigram_counts[id] = len(name_trigrams)
+        for trigram in name_trigrams:
+            self.postings.setdefault(trigram, set()).add(id)
+
+    def remove(self, id: int) -> None:
+        '''
+        Remove a name from the index, if it is indexed.
+
+        Args:
+            id (int): The id of the named object
+        '''
+        normalized: str | None = self.names.pop(id, None)
+        if normalized is None:
+            return
+        del self.trigram_counts[id]
+        self.sorted_names.pop(bisect_left(self.sorted_names, (normalized, id)))
+        for word in set(normalized.split()):
+            self.sorted_words.pop(bisect_left(self.sorted_words, (word, id)))
+        for trigram in trigrams(normalized):
+            ids: set[int] = self.postings[trigram]
+            ids.discard(id)
+            if not ids:
+                del self.postings[trigram]
+
+    def prefix_matches(self, sorted_entries: list[tuple[str, int]], prefix: str) -> list[int]:
+        '''
+        Get the ids of all entries in a sorted list that start with the given prefix.
+
+        Args:
+            sorted_entries (list[tuple[str, int]]): Sorted (text, id) pairs
+            prefix (str): The normalized prefix
+
+        Returns:
+            list[int]: The matching ids
+        '''
+        ids: list[int] = []
+        for i in range(bisect_left(sorted_entries, (prefix, -1)), len(sorted_entries)):
+            text, id = sorted_entries[i]
+            if not text.startswith(prefix):
+                break
+            ids.append(id)
+        return ids
+
+    def rank(self, query: str, id: int) -> tuple[int, int, str]:
+        '''
+        Sort key for a name that contains the query: exact matches first, then names starting with the query,
+        then names with a word starting with the query, then any other names. Shorter names are closer to the query, so they come first.
+
+        Args:
+            query (str): The normalized query
+            id (int): The id of a name containing the query
+
+        Returns:
+            tuple[int, int, str]: The sort key
+        '''
+        name: str = self.names[id]
+        kind: int = 0 if name == query else 1 if name.startswith(query) else 2 if f' {query}' in name else 3
+        return (kind, len(name), name)
+
+    def search(self, query: str, limit: int = 5) -> tuple[int | None, list[int]]:
+        '''
+        Search for the name that best matches a query.
+        Names containing the query are matches. If there are none, names that share enough trigrams with the query are suggested instead.
+
+        Args:
+            query (str): The query
+            limit (int, optional): Maximum number of suggestions. Defaults to 5.
+
+        Returns:
+            tuple[int | None, list[int]]: The id of the best match, if any, and the ids of other suggestions (did you mean), best first
+        '''
+        query = normalize_name(query)
+        if not query:
+            return None, []
+
+        matches: set[int]
+        query_trigrams: set[str] = trigrams(query)
+        if query_trigrams:
+            postings: list[set[int]] = sorted((self.postings.get(trigram, set()) for trigram in query_trigrams), key=len)
+            matches = set(postings[0]).intersection(*postings[1:])
+            matches = set(id for id in matches if query in self.names[id])
+        else:
+            matches = set(self.prefix_matches(self.sorted_words, query)) | set(self.prefix_matches(self.sorted_names, query))
+
+        if matches:
+            ranked: list[int] = sorted(matches, key=lambda id: self.rank(query, id))
+            return ranked[0], ranked[1:limit+1]
+
+        # No matches, so find names with the most trigrams in common with the query (Jaccard similarity)
+        shared: Counter[int] = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.postings.get(trigram, ()))
+        similarity: dict[int, float] = {id: count / (len(query_trigrams) + self.trigram_counts[id] - count) for id, count in shared.items()}
+        suggestions: list[int] = sorted((id for id, s in similarity.items() if s >= self.min_similarity), key=lambda id: (-similarity[id], len(self.names[id])))
+        return None, suggestions[:limit]
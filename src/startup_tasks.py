@@ -8,7 +8,8 @@ from src.database import Guild
 from src.discord_utils import find_text_channel, get_text_channel
 from src.message_queue import QueueMessage
 from src.runescape_utils import dnd_names
-from src.database_utils import purge_guild
+from src.database_utils import purge_guilds
+from src.async_utils import execute_concurrently
 
 async def role_setup(bot: Bot) -> None:
     '''
@@ -47,7 +48,8 @@ async def role_setup(bot: Bot) -> None:
             notif_emojis.append(emoji)
             msg += str(emoji) + ' ' + r + '\n'
     msg += "\nIf you wish to stop receiving notifications, simply remove your reaction. If your reaction isn't there anymore, then you can add a new one and remove it."
-    for c in channels:
+
+    async def setup_channel(c: discord.TextChannel) -> None:
         try:
             messages = 0
             async for message in c.history(limit=1):
@@ -60,7 +62,10 @@ async def role_setup(bot: Bot) -> None:
                 except Exception as e:
                     print(f'Exception: {e}')
         except discord.Forbidden:
-            continue
+            pass
+
+    # Set up channels concurrently, while staying well below the global rate limit
+    await execute_concurrently([setup_channel(c) for c in channels], 10, 20)
 
     msg = f'Role management ready'
     print(msg)
@@ -80,8 +85,7 @@ async def check_guilds(bot: Bot) -> None:
 
     async with bot.db.get_session() as session:
         db_guilds: Sequence[Guild] = (await session.execute(select(Guild).where(Guild.id.not_in([g.id for g in bot.guilds])))).scalars().all()
-        for db_guild in db_guilds:
-            await purge_guild(session, db_guild)
+        await purge_guilds(session, db_guilds)
         await session.commit()
 
     msg: str = f'{str(len(bot.guilds))} guilds checked'
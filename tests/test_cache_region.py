@@ -0,0 +1,158 @@
+import asyncio
+import time
+import pytest
+from src.cache_region import CacheRegion
+
+class Loader:
+    '''
+    Loader that counts its calls, and optionally waits for an event before returning, to simulate a slow database query.
+    '''
+    calls: list[int]
+    values: dict[int, str]
+    release: asyncio.Event | None
+
+    def __init__(self, release: asyncio.Event | None = None) -> None:
+        self.calls = []
+        self.values = {}
+        self.release = release
+
+    async def __call__(self, key: int) -> str:
+        self.calls.append(key)
+        value: str = self.values.get(key, f'value {key}')
+        if self.release:
+            await self.release.wait()
+        return value
+
+def test_hits_and_misses() -> None:
+    async def run() -> None:
+        loader: Loader = Loader()
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        assert await region.get(1) == 'value 1'
+        assert await region.get(1) == 'value 1'
+        assert await region.get(2) == 'value 2'
+        assert loader.calls == [1, 2]
+        assert (region.hits, region.misses) == (1, 2)
+
+    asyncio.run(run())
+
+def test_expired_entries_are_reloaded(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def run() -> None:
+        now: list[float] = [time.monotonic()]
+        monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+        loader: Loader = Loader()
+        region: CacheRegion[int, str] = CacheRegion('test', loader, ttl=10)
+        await region.get(1)
+        now[0] += 9
+        await region.get(1)
+        assert loader.calls == [1]
+        now[0] += 1
+        loader.values[1] = 'new value'
+        assert await region.get(1) == 'new value'
+        assert loader.calls == [1, 1]
+
+    asyncio.run(run())
+
+def test_least_recently_used_entries_are_evicted() -> None:
+    async def run() -> None:
+        loader: Loader = Loader()
+        region: CacheRegion[int, str] = CacheRegion('test', loader, max_size=2)
+        await region.get(1)
+        await region.get(2)
+        await region.get(1)
+        await region.get(3)
+        assert list(region.entries.keys()) == [1, 3]
+        await region.get(2)
+        assert loader.calls == [1, 2, 3, 2]
+
+    asyncio.run(run())
+
+def test_concurrent_misses_share_a_load() -> None:
+    async def run() -> None:
+        loader: Loader = Loader(asyncio.Event())
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        gets: asyncio.Future[list[str]] = asyncio.gather(*(region.get(1) for _ in range(3)))
+        await asyncio.sleep(0)
+        loader.release.set()
+        assert await gets == ['value 1'] * 3
+        assert loader.calls == [1]
+        assert not region.loading
+
+    asyncio.run(run())
+
+def test_invalidation_during_load_is_not_overwritten() -> None:
+    async def run() -> None:
+        loader: Loader = Loader(asyncio.Event())
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        get: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        while not loader.calls:
+            await asyncio.sleep(0)
+        # The row changes while the load is in flight, so the loaded value may be stale
+        region.invalidate(1)
+        loader.release.set()
+        assert await get == 'value 1'
+        assert len(region) == 0
+
+        loader.values[1] = 'new value'
+        assert await region.get(1) == 'new value'
+        assert len(region) == 1
+        region.clear()
+        assert len(region) == 0
+
+    asyncio.run(run())
+
+def test_cancelled_caller_does_not_cancel_load() -> None:
+    async def run() -> None:
+        loader: Loader = Loader(asyncio.Event())
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        first: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        second: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        loader.release.set()
+        assert await second == 'value 1'
+        assert first.cancelled()
+        assert len(region) == 1
+
+    asyncio.run(run())
+
+def test_access_after_invalidation_starts_new_load() -> None:
+    async def run() -> None:
+        loader: Loader = Loader(asyncio.Event())
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        stale: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        while not loader.calls:
+            await asyncio.sleep(0)
+        region.invalidate(1)
+
+        loader.values[1] = 'new value'
+        fresh: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert loader.calls == [1, 1]
+        loader.release.set()
+        assert await stale == 'value 1'
+        assert await fresh == 'new value'
+        # The stale load finished first, but must not have detached the new load, nor stored its value
+        assert not region.loading
+        assert await region.get(1) == 'new value'
+        assert loader.calls == [1, 1]
+
+    asyncio.run(run())
+
+def test_access_after_clear_starts_new_load() -> None:
+    async def run() -> None:
+        loader: Loader = Loader(asyncio.Event())
+        region: CacheRegion[int, str] = CacheRegion('test', loader)
+        stale: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        while not loader.calls:
+            await asyncio.sleep(0)
+        region.clear()
+        fresh: asyncio.Task[str] = asyncio.create_task(region.get(1))
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert loader.calls == [1, 1]
+        loader.release.set()
+        await asyncio.gather(stale, fresh)
+        assert len(region) == 1
+
+    asyncio.run(run())
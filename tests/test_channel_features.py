@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+import pytest
+from src.channel_features import ChannelFeatures, CommandTrie
+
+def guild(prefix: str | None = None, disabled_commands: list[str] | None = None, modmail_public: int | None = None, modmail_private: int | None = None) -> SimpleNamespace:
+    return SimpleNamespace(id=1, prefix=prefix, disabled_commands=disabled_commands, modmail_public=modmail_public, modmail_private=modmail_private)
+
+@pytest.mark.parametrize('content, start, expected', [
+    ('price', 0, 'price'),
+    ('price abyssal whip', 0, 'price'),
+    ('-price whip', 1, 'price'),
+    ('pricehistory', 0, 'price'),
+    ('pric', 0, None),
+    ('', 0, None),
+    ('-', 1, None),
+    ('ping', 0, 'ping'),
+    ('pin', 0, None),
+    ('stats', 0, None),
+    ('-price', 0, None),
+])
+def test_command_trie_match(content: str, start: int, expected: str | None) -> None:
+    trie: CommandTrie = CommandTrie(['price', 'pricehistory', 'ping', ''])
+    assert trie.match(content, start) == expected
+
+def test_empty_command_trie() -> None:
+    trie: CommandTrie = CommandTrie([])
+    assert not trie
+    assert trie.match('price') is None
+
+def test_match_prefix() -> None:
+    features: ChannelFeatures = ChannelFeatures(guild(prefix='!'), set(), 123)
+    assert features.match_prefix('!price') == '!'
+    assert features.match_prefix('<@123> price') == '<@123> '
+    assert features.match_prefix('<@!123> price') == '<@!123> '
+    assert features.match_prefix('<@123>price') is None
+    assert features.match_prefix('-price') is None
+
+def test_default_prefix() -> None:
+    features: ChannelFeatures = ChannelFeatures(guild(), set(), None)
+    assert features.command_prefixes == ['-']
+    assert features.match_prefix('-price') == '-'
+
+def test_disabled_command() -> None:
+    features: ChannelFeatures = ChannelFeatures(guild(prefix='!', disabled_commands=['price']), set(), 123)
+    assert features.disabled_command('!price whip', '!') == 'price'
+    assert features.disabled_command('<@123> price whip', '<@123> ') == 'price'
+    assert features.disabled_command('!ping', '!') is None
+    assert ChannelFeatures(guild(prefix='!'), set(), 123).disabled_command('!price', '!') is None
+
+def test_sticky_and_modmail_channels() -> None:
+    features: ChannelFeatures = ChannelFeatures(guild(modmail_public=10, modmail_private=11), {20, 21}, 123)
+    assert features.is_sticky(20)
+    assert not features.is_sticky(10)
+    assert features.is_modmail(10)
+    assert not features.is_modmail(11)
+    # Modmail is only forwarded if the private channel is configured as well
+    assert not ChannelFeatures(guild(modmail_public=10), set(), 123).is_modmail(10)
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+import time
+import discord
+from src.exceptions import MessageRetryException
+from src.message_queue import MessagePriority, MessageQueue, QueueMessage
+
+def message(channel_id: int, text: str | None = None, embed: discord.Embed | None = None, priority: MessagePriority = MessagePriority.NORMAL, expiration: datetime | None = None) -> QueueMessage:
+    return QueueMessage(SimpleNamespace(id=channel_id), text, embed, priority=priority, expiration=expiration)
+
+def test_coalesce_text_messages() -> None:
+    queue: MessageQueue = MessageQueue()
+    for text in ['a', 'b', 'c']:
+        assert queue.append(message(1, text))
+    queue.append(message(2, 'd'))
+
+    sent: list[QueueMessage] = queue.pop_ready(time.monotonic())
+    assert [(m.channel.id, m.message) for m in sent] == [(1, 'a\nb\nc'), (2, 'd')]
+    assert len(sent[0].merged) == 2
+    assert len(queue) == 0
+
+def test_text_is_not_merged_with_embeds() -> None:
+    queue: MessageQueue = MessageQueue()
+    queue.append(message(1, 'a'))
+    queue.append(message(1, embed=discord.Embed(title='b')))
+    queue.append(message(1, embed=discord.Embed(title='c')))
+
+    now: float = time.monotonic()
+    sent: list[QueueMessage] = queue.pop_ready(now)
+    assert [m.message for m in sent] == ['a']
+    # The channel was just sent to, so the embeds are held back for the coalescing window, and then sent as one message
+    assert queue.pop_ready(now) == []
+    sent = queue.pop_ready(now + queue.coalesce_window)
+    assert [[e.title for e in m.embeds] for m in sent] == [['b', 'c']]
+
+def test_duplicates_are_dropped_while_pending() -> None:
+    queue: MessageQueue = MessageQueue()
+    assert queue.append(message(1, 'a', embed=discord.Embed(title='x')))
+    assert not queue.append(message(1, 'a', embed=discord.Embed(title='x')))
+    assert queue.append(message(1, 'a', embed=discord.Embed(title='y')))
+    assert queue.append(message(2, 'a', embed=discord.Embed(title='x')))
+    assert queue.dropped['duplicate'] == 1
+    assert len(queue) == 3
+
+    now: float = time.monotonic()
+    assert len(queue.pop_ready(now)) == 2
+    assert len(queue.pop_ready(now + queue.coalesce_window)) == 1
+    assert len(queue) == 0
+    assert not any(lane.duplicate_keys for lane in queue.lanes.values())
+    # Once sent, the same message can be queued again
+    assert queue.append(message(1, 'a', embed=discord.Embed(title='x')))
+
+def test_duplicate_of_merged_message_is_not_dropped() -> None:
+    queue: MessageQueue = MessageQueue()
+    queue.append(message(1, 'a'))
+    queue.append(message(1, 'b'))
+    sent: list[QueueMessage] = queue.pop_ready(time.monotonic())
+    assert [m.message for m in sent] == ['a\nb']
+    queue.retry(sent[0], MessageRetryException('500 Internal Server Error', 500))
+
+    assert queue.append(message(1, 'a'))
+    assert not queue.append(message(1, 'a\nb'))
+
+def test_higher_priority_is_served_first() -> None:
+    queue: MessageQueue = MessageQueue()
+    for channel_id in range(1, 6):
+        queue.append(message(channel_id, 'low', priority=MessagePriority.LOW))
+    for channel_id in range(6, 8):
+        queue.append(message(channel_id, 'high', priority=MessagePriority.HIGH))
+
+    now: float = queue.rate.updated
+    queue.rate.tokens = 3
+    sent: list[QueueMessage] = queue.pop_ready(now)
+    assert [m.channel.id for m in sent] == [6, 7, 1]
+    assert queue.depth()[MessagePriority.LOW][0] == 4
+
+def test_full_queue_drops_less_important_messages() -> None:
+    queue: MessageQueue = MessageQueue(max_size=2)
+    queue.append(message(1, 'low 1', priority=MessagePriority.LOW))
+    queue.append(message(2, 'low 2', priority=MessagePriority.LOW))
+
+    assert queue.append(message(3, 'high', priority=MessagePriority.HIGH))
+    assert [m.message for m in queue.lanes[MessagePriority.LOW].channels[2]] == ['low 2']
+    assert queue.append(message(4, 'normal'))
+    assert not queue.append(message(5, 'low 3', priority=MessagePriority.LOW))
+    assert queue.dropped['overflow'] == 3
+    assert len(queue) == 2
+
+def test_expired_messages_are_dropped() -> None:
+    queue: MessageQueue = MessageQueue()
+    now: datetime = datetime.now(UTC)
+    assert not queue.append(message(1, 'a', expiration=now - timedelta(seconds=1)))
+    queue.append(message(1, 'b', expiration=now + timedelta(milliseconds=10)))
+    queue.append(message(2, 'c'))
+    time.sleep(0.02)
+
+    sent: list[QueueMessage] = queue.pop_ready(time.monotonic())
+    assert [m.message for m in sent] == ['c']
+    assert queue.dropped['expired'] == 2
+    assert len(queue) == 0
+
+def test_retry_requeues_and_blocks_channel() -> None:
+    queue: MessageQueue = MessageQueue()
+    queue.append(message(1, 'a'))
+    queue.append(message(1, 'b', embed=discord.Embed(title='b')))
+    first: QueueMessage = queue.pop_ready(time.monotonic())[0]
+
+    queue.retry(first, MessageRetryException('429 Too Many Requests', 429, retry_after=2))
+    assert first.attempts == 1
+    # A rate limit of the channel does not affect the global rate
+    assert queue.rate.rate == queue.rate_limit
+    assert queue.bucket(1).blocked_until >= time.monotonic() + 1
+    # The failed message is put back in front of the messages that were queued after it
+    assert [m.message for m in queue.lanes[MessagePriority.NORMAL].channels[1]] == ['a', 'b']
+    assert queue.pop_ready(time.monotonic()) == []
+
+def test_global_rate_limit_reduces_rate() -> None:
+    queue: MessageQueue = MessageQueue()
+    queue.append(message(1, 'a'))
+    sent: QueueMessage = queue.pop_ready(time.monotonic())[0]
+
+    queue.retry(sent, MessageRetryException('429 Too Many Requests', 429, retry_after=1, is_global=True))
+    assert queue.rate.rate == queue.rate_limit * queue.rate_limit_decrease
+    assert queue.webhook_rate.rate == queue.rate_limit
+
+def test_retry_gives_up_after_max_attempts() -> None:
+    queue: MessageQueue = MessageQueue()
+    queue.append(message(1, 'a'))
+    now: float = time.monotonic()
+    sent: QueueMessage = queue.pop_ready(now)[0]
+
+    for attempt in range(queue.max_attempts):
+        queue.retry(sent, MessageRetryException('503 Service Unavailable', 503))
+        if attempt < queue.max_attempts - 1:
+            # Retry as soon as the backoff has passed
+            now = queue.bucket(1).blocked_until
+            assert queue.pop_ready(now) == [sent]
+    assert queue.dropped['failed'] == 1
+    assert len(queue) == 0
+
+def test_slow_send_is_retried() -> None:
+    async def hang() -> None:
+        await asyncio.sleep(1)
+
+    async def run() -> None:
+        queue: MessageQueue = MessageQueue()
+        queue.max_send_time = 0.01
+        queue.append(message(1, 'a'))
+        sent: QueueMessage = queue.pop_ready(time.monotonic())[0]
+        sent.send = hang
+        await queue.send(sent)
+        assert sent.attempts == 1
+        assert len(queue) == 1
+
+    asyncio.run(run())
+
+def test_wait_until_not_full() -> None:
+    async def run() -> None:
+        queue: MessageQueue = MessageQueue(max_size=1)
+        queue.full_poll_interval = 0.01
+        assert await queue.wait_until_not_full(0)
+        queue.append(message(1, 'a'))
+        assert queue.is_full()
+        assert not await queue.wait_until_not_full(0.05)
+
+        wait: asyncio.Task[bool] = asyncio.create_task(queue.wait_until_not_full(1))
+        await asyncio.sleep(0.02)
+        assert not wait.done()
+        queue.pop_ready(time.monotonic())
+        assert await wait
+
+    asyncio.run(run())
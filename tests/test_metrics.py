@@ -0,0 +1,19 @@
+from src.metrics import HoldTimeStats
+
+def test_hold_time_stats() -> None:
+    stats: HoldTimeStats = HoldTimeStats()
+    stats.record(0.5)
+    stats.record(7, 'stack 1')
+    stats.record(6, 'stack 2')
+    stats.record(1)
+
+    assert stats.count == 4
+    assert stats.total == 14.5
+    assert stats.maximum == 7
+    assert len(stats.histogram) == 4
+    # Only the stack of the longest hold is kept
+    assert stats.long_holds == 2
+    assert stats.long_hold_stack == 'stack 1'
+
+    stats.record(9, 'stack 3')
+    assert stats.long_hold_stack == 'stack 3'
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Sequence
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from src.database import Base, UptimeDay, UptimeInterval, migrations
+
+# The migrations are run against a throwaway PostgreSQL server, which requires pgserver (pip install pgserver)
+pgserver = pytest.importorskip('pgserver')
+
+@pytest.fixture(scope='module')
+def database_url(tmp_path_factory: pytest.TempPathFactory) -> Any:
+    directory: Path = tmp_path_factory.mktemp('postgres')
+    server = pgserver.get_server(directory, cleanup_mode='stop')
+    yield f'postgresql+asyncpg://postgres@/postgres?host={directory}'
+    server.cleanup()
+
+def legacy_uptime_seconds(events: Sequence[tuple[datetime, str]]) -> dict[date, int]:
+    '''
+    Uptime per day as computed by the uptime command from the legacy uptime table, without its 10 second margin:
+    every 'running' event counts the time since the last 'started' event on the same day, or since midnight.
+    '''
+    seconds: dict[date, int] = {}
+    start: datetime | None = None
+    for time, status in sorted(events):
+        if start is None or start.date() != time.date():
+            start = time.replace(hour=0, minute=0, second=0)
+        if status == 'started':
+            start = time
+        else:
+            seconds[time.date()] = seconds.get(time.date(), 0) + int((time - start).total_seconds())
+    return seconds
+
+def test_uptime_history_is_migrated_to_uptime_days(database_url: str) -> None:
+    day: datetime = datetime(2024, 3, 1, tzinfo=UTC)
+    events: list[tuple[datetime, str]] = [
+        # Started at 06:00, running until 23:59:55, and through midnight until 02:00 the next day
+        (day + timedelta(hours=6), 'started'),
+        (day + timedelta(hours=23, minutes=59, seconds=55), 'running'),
+        (day + timedelta(days=1, hours=2), 'running'),
+        # Restarted at 10:00, running until 12:00
+        (day + timedelta(days=1, hours=10), 'started'),
+        (day + timedelta(days=1, hours=12), 'running'),
+        # Started at 20:00 two days later, running until 21:30
+        (day + timedelta(days=3, hours=20), 'started'),
+        (day + timedelta(days=3, hours=21, minutes=30), 'running'),
+    ]
+
+    async def migrate() -> tuple[list[tuple[datetime, datetime]], dict[date, int], bool]:
+        engine: AsyncEngine = create_async_engine(database_url)
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(text('CREATE TABLE uptime (time TIMESTAMP WITH TIME ZONE PRIMARY KEY, status VARCHAR)'))
+                await connection.execute(text('INSERT INTO uptime (time, status) VALUES (:time, :status)'), [{'time': t, 'status': s} for t, s in events])
+                await connection.run_sync(Base.metadata.create_all, tables=[UptimeInterval.__table__, UptimeDay.__table__])
+            for migration in [m for m in migrations if m.version in [3, 4]]:
+                async with engine.begin() as connection:
+                    for statement in migration.statements:
+                        await connection.execute(text(statement))
+            async with engine.connect() as connection:
+                intervals = [tuple(row) for row in (await connection.execute(text('SELECT start, last_heartbeat FROM uptime_intervals ORDER BY start'))).all()]
+                days = {row[0]: row[1] for row in (await connection.execute(text('SELECT day, seconds FROM uptime_days'))).all()}
+                dropped: bool = (await connection.execute(text("SELECT to_regclass('uptime') IS NULL"))).scalar_one()
+            return intervals, days, dropped
+        finally:
+            await engine.dispose()
+
+    intervals, days, dropped = asyncio.run(migrate())
+    assert intervals == [
+        (day + timedelta(hours=6), day + timedelta(days=1, hours=2)),
+        (day + timedelta(days=1, hours=10), day + timedelta(days=1, hours=12)),
+        (day + timedelta(days=3, hours=20), day + timedelta(days=3, hours=21, minutes=30)),
+    ]
+    # History is carried over, except that the gap between the last heartbeat before midnight and midnight itself now counts as up,
+    # as the bot kept running through midnight
+    expected: dict[date, int] = legacy_uptime_seconds(events)
+    expected[date(2024, 3, 1)] += 5
+    assert days == expected
+    assert dropped
@@ -0,0 +1,115 @@
+from datetime import UTC, datetime
+import json
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from src.price_store import ItemPrices, metadata_attributes, parse_price, read_snapshot, write_snapshot
+
+# Formats of the 'price' fields of the current price and today's change in GE API responses,
+# e.g. {"current": {"trend": "neutral", "price": "1.2m"}, "today": {"trend": "negative", "price": "- 5"}}
+@pytest.mark.parametrize('price, expected', [
+    (343, 343),
+    ('343', 343),
+    ('1,234', 1234),
+    ('12.5k', 12500),
+    ('1.2m', 1200000),
+    ('2.1b', 2100000000),
+    ('0', 0),
+    ('+5', 5),
+    ('- 5', -5),
+    ('-1.2k', -1200),
+    ('+ 12.3m', 12300000),
+    ('- 1,234', -1234),
+])
+def test_parse_price(price: str | int, expected: int) -> None:
+    assert parse_price(price) == expected
+
+@pytest.mark.parametrize('price', ['', 'abc', '1.2x', 'k'])
+def test_parse_price_invalid(price: str) -> None:
+    with pytest.raises(ValueError):
+        parse_price(price)
+
+def item(current: str, today: str, id: int = 1, name: str = 'Abyssal whip', graph_data: dict[str, dict[str, str]] | None = None) -> SimpleNamespace:
+    return SimpleNamespace(id=id, name=name, icon_url='', type='Weapons', description='', members=True,
+                           current=current, today=today, day30='+1.0%', day90='-2.0%', day180='0.0%', graph_data=graph_data)
+
+def test_item_prices_api_format() -> None:
+    prices: ItemPrices = ItemPrices(item('1.2m', '- 5'), (np.array([86400], dtype=np.int64), np.array([5], dtype=np.int64)))
+    assert prices.current == 1200000
+    assert prices.today == -5
+    assert list(prices.timestamps) == [86400]
+
+def test_item_prices_invalid_price() -> None:
+    prices: ItemPrices = ItemPrices(item('unknown', '0'))
+    assert prices.current == 0
+    assert prices.today == 0
+    assert len(prices.timestamps) == 0
+
+def graph_data(*days: int) -> dict[str, dict[str, str]]:
+    return {'daily': {str(d * 86400 * 1000): str(100 + d) for d in days}}
+
+def test_snapshot_round_trip(tmp_path: Path) -> None:
+    items: list[ItemPrices] = [
+        ItemPrices(item('1,200,000', '-5', graph_data=graph_data(1, 2, 3))),
+        ItemPrices(item('343', '+2', id=2, name='Dragon bones')),
+        ItemPrices(item('12,500', '0', id=3, name='Rune platebody', graph_data=graph_data(2, 5))),
+    ]
+    created_at: datetime = datetime(2026, 10, 18, 12, 0, tzinfo=UTC)
+    write_snapshot(tmp_path / 'osrs_items', items, created_at)
+
+    snapshot: tuple[datetime, dict[int, ItemPrices]] | None = read_snapshot(tmp_path / 'osrs_items')
+    assert snapshot is not None
+    assert snapshot[0] == created_at
+    assert list(snapshot[1].keys()) == [1, 2, 3]
+    for original in items:
+        loaded: ItemPrices = snapshot[1][original.id]
+        assert [getattr(loaded, a) for a in metadata_attributes] == [getattr(original, a) for a in metadata_attributes]
+        assert list(loaded.timestamps) == list(original.timestamps)
+        assert list(loaded.prices) == list(original.prices)
+
+def test_snapshot_replaces_previous(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'cache' / 'osrs_items'
+    write_snapshot(path, [ItemPrices(item('1', '0', graph_data=graph_data(1)))], datetime(2026, 10, 18, 12, 0, tzinfo=UTC))
+    write_snapshot(path, [ItemPrices(item('2', '0', graph_data=graph_data(1, 2)))], datetime(2026, 10, 18, 12, 5, tzinfo=UTC))
+
+    snapshot: tuple[datetime, dict[int, ItemPrices]] | None = read_snapshot(path)
+    assert snapshot is not None
+    assert snapshot[1][1].current == 2
+    assert list(snapshot[1][1].prices) == [101, 102]
+    # The arrays of the previous snapshot are removed
+    assert len(list(path.parent.glob('osrs_items_*.npy'))) == 2
+
+def test_invalid_snapshot(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'osrs_items'
+    assert read_snapshot(path) is None
+
+    write_snapshot(path, [ItemPrices(item('1', '0', graph_data=graph_data(1, 2)))], datetime(2026, 10, 18, 12, 0, tzinfo=UTC))
+    metadata_file: Path = tmp_path / 'osrs_items.json'
+    metadata: dict = json.loads(metadata_file.read_text())
+    metadata['items'][0]['length'] = 3
+    metadata_file.write_text(json.dumps(metadata))
+    assert read_snapshot(path) is None
+
+    metadata['version'] = -1
+    metadata_file.write_text(json.dumps(metadata))
+    assert read_snapshot(path) is None
+
+def test_snapshot_keeps_arrays_that_can_not_be_removed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path: Path = tmp_path / 'osrs_items'
+    write_snapshot(path, [ItemPrices(item('1', '0', graph_data=graph_data(1)))], datetime(2026, 10, 18, 12, 0, tzinfo=UTC))
+
+    # On Windows, the arrays of the previous snapshot can not be deleted while cached items memory-map them
+    def unlink(self: Path, missing_ok: bool = False) -> None:
+        raise PermissionError(13, 'The process cannot access the file because it is being used by another process', str(self))
+    with monkeypatch.context() as m:
+        m.setattr(Path, 'unlink', unlink)
+        write_snapshot(path, [ItemPrices(item('2', '0', graph_data=graph_data(1, 2)))], datetime(2026, 10, 18, 12, 5, tzinfo=UTC))
+    snapshot: tuple[datetime, dict[int, ItemPrices]] | None = read_snapshot(path)
+    assert snapshot is not None
+    assert snapshot[1][1].current == 2
+    assert len(list(tmp_path.glob('osrs_items_*.npy'))) == 4
+
+    # The next write removes them
+    write_snapshot(path, [ItemPrices(item('3', '0', graph_data=graph_data(1, 2, 3)))], datetime(2026, 10, 18, 12, 10, tzinfo=UTC))
+    assert len(list(tmp_path.glob('osrs_items_*.npy'))) == 2
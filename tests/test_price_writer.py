@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+import numpy as np
+import pytest
+from src.database import OSRSItem
+from src.price_store import ItemPrices
+from src.price_writer import PriceWriter
+
+day: int = 86400
+
+class FakeSession:
+    '''
+    Session that records the executed statements, and optionally fails on execute.
+    '''
+    statements: list[Any]
+    committed: bool
+    on_execute: Callable[[], Awaitable[None]] | None
+
+    def __init__(self, on_execute: Callable[[], Awaitable[None]] | None = None) -> None:
+        self.statements = []
+        self.committed = False
+        self.on_execute = on_execute
+
+    async def execute(self, statement: Any) -> None:
+        if self.on_execute:
+            await self.on_execute()
+        self.statements.append(statement)
+
+    async def commit(self) -> None:
+        self.committed = True
+
+class FakeDatabase:
+    sessions: list[FakeSession]
+    on_execute: Callable[[], Awaitable[None]] | None
+
+    def __init__(self, on_execute: Callable[[], Awaitable[None]] | None = None) -> None:
+        self.sessions = []
+        self.on_execute = on_execute
+
+    @asynccontextmanager
+    async def get_session(self) -> AsyncIterator[FakeSession]:
+        session: FakeSession = FakeSession(self.on_execute)
+        self.sessions.append(session)
+        yield session
+
+def graph_data(*days: int) -> dict[str, dict[str, str]]:
+    return {'daily': {str(d * day * 1000): str(100 + d) for d in days}}
+
+def writer(db: FakeDatabase) -> tuple[PriceWriter, dict[int, ItemPrices]]:
+    cache: dict[int, ItemPrices] = {}
+    item: OSRSItem = OSRSItem(id=4151, name='Abyssal whip', icon_url='', type='Weapons', description='', members=True,
+                              current='1,500,000', today='0', day30='0%', day90='0%', day180='0%')
+    cache[item.id] = ItemPrices(item, (np.array([day], dtype=np.int64), np.array([101], dtype=np.int64)))
+    price_writer: PriceWriter = PriceWriter(db, OSRSItem, 'osrs', cache.get, lambda item, history: cache.__setitem__(item.id, ItemPrices(item, history)))
+    return price_writer, cache
+
+def add(price_writer: PriceWriter, cache: dict[int, ItemPrices], current: str, *days: int) -> None:
+    price_writer.add(cache[4151], current, '+5', '+1.0%', '+2.0%', '+3.0%', graph_data(*days))
+
+def test_add_updates_cache() -> None:
+    price_writer, cache = writer(FakeDatabase())
+    add(price_writer, cache, '1,600,000', 1, 2, 3)
+
+    assert cache[4151].current == 1600000
+    assert list(cache[4151].timestamps) == [day, 2 * day, 3 * day]
+    assert list(cache[4151].prices) == [101, 102, 103]
+    assert price_writer.pending[4151]['current'] == '1,600,000'
+    # Only the days after the cached history are written
+    assert [row['price'] for row in price_writer.pending_history[4151]] == [102, 103]
+    assert not price_writer.is_due()
+
+def test_flush() -> None:
+    db: FakeDatabase = FakeDatabase()
+    price_writer, cache = writer(db)
+    add(price_writer, cache, '1,600,000', 1, 2)
+
+    assert asyncio.run(price_writer.flush()) == 1
+    assert len(db.sessions) == 1
+    assert len(db.sessions[0].statements) == 2
+    assert db.sessions[0].committed
+    assert not price_writer.pending and not price_writer.pending_history
+    assert price_writer.oldest is None
+    assert asyncio.run(price_writer.flush()) == 0
+    assert len(db.sessions) == 1
+
+def test_flush_discards_removed_items() -> None:
+    db: FakeDatabase = FakeDatabase()
+    price_writer, cache = writer(db)
+    add(price_writer, cache, '1,600,000', 1, 2)
+    del cache[4151]
+
+    assert asyncio.run(price_writer.flush()) == 0
+    assert not db.sessions
+    assert not price_writer.pending and not price_writer.pending_history
+
+def test_failed_flush_keeps_updates() -> None:
+    price_writer: PriceWriter
+    cache: dict[int, ItemPrices]
+
+    async def fail() -> None:
+        # A newer update arrives while the failed write is in flight
+        add(price_writer, cache, '1,700,000', 1, 2, 3)
+        raise ConnectionError('connection lost')
+
+    price_writer, cache = writer(FakeDatabase(fail))
+    add(price_writer, cache, '1,600,000', 1, 2)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(price_writer.flush())
+    # The newer update supersedes the failed one, and the failed new days are kept in front of the newer ones
+    assert price_writer.pending[4151]['current'] == '1,700,000'
+    assert [row['price'] for row in price_writer.pending_history[4151]] == [102, 103]
+    assert price_writer.oldest is not None
+
+    price_writer.db = FakeDatabase()
+    assert asyncio.run(price_writer.flush()) == 1
+    assert not price_writer.pending and not price_writer.pending_history
+
+def test_flush_waits_for_flush_in_progress() -> None:
+    async def run() -> None:
+        release: asyncio.Event = asyncio.Event()
+        attempts: int = 0
+
+        async def fail_first() -> None:
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                await release.wait()
+                raise ConnectionError('connection lost')
+
+        db: FakeDatabase = FakeDatabase(fail_first)
+        price_writer, cache = writer(db)
+        add(price_writer, cache, '1,600,000', 1, 2)
+        first: asyncio.Task[int] = asyncio.create_task(price_writer.flush())
+        await asyncio.sleep(0)
+        # E.g. a snapshot, which needs the updates of the first flush to be written as well
+        second: asyncio.Task[int] = asyncio.create_task(price_writer.flush())
+        await asyncio.sleep(0)
+        assert not second.done()
+
+        release.set()
+        with pytest.raises(ConnectionError):
+            await first
+        assert await second == 1
+        # The second flush writes the item and the new day that the first flush failed to write
+        assert len(db.sessions) == 2
+        assert len(db.sessions[1].statements) == 2
+        assert db.sessions[1].committed
+        assert not price_writer.pending and not price_writer.pending_history
+
+    asyncio.run(run())
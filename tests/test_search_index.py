@@ -0,0 +1,50 @@
+from src.search_index import NameSearchIndex, normalize_name
+
+def index(*names: str) -> NameSearchIndex:
+    search_index: NameSearchIndex = NameSearchIndex()
+    for id, name in enumerate(names):
+        search_index.add(id, name)
+    return search_index
+
+def test_normalize_name() -> None:
+    assert normalize_name("  Karil's   Leathertop ") == 'karils leathertop'
+
+def test_exact_match_comes_first() -> None:
+    search_index: NameSearchIndex = index('Rune platebody', 'Rune', 'Rune scimitar', 'Runite ore')
+    assert search_index.search('rune') == (1, [2, 0])
+
+def test_matches_are_ranked() -> None:
+    search_index: NameSearchIndex = index('Dragon bones', 'Bones', 'Big bones', 'Bones to peaches', 'Jogre bones')
+    match, suggestions = search_index.search('BONES')
+    assert match == 1
+    # Names starting with the query, then names with a word starting with it, shortest first
+    assert suggestions == [3, 2, 4, 0]
+    assert search_index.search('bones', limit=2) == (1, [3, 2])
+
+def test_substring_match() -> None:
+    search_index: NameSearchIndex = index('Abyssal whip', 'Abyssal dagger', 'Volcanic abyssal whip')
+    assert search_index.search('sal whi') == (0, [2])
+
+def test_short_query_matches_word_prefixes() -> None:
+    search_index: NameSearchIndex = index('Coal', 'Iron ore', 'Cooked chicken', 'Bronze bar')
+    assert search_index.search('co') == (0, [2])
+    assert search_index.search('b') == (3, [])
+
+def test_suggestions_without_match() -> None:
+    search_index: NameSearchIndex = index('Abyssal whip', 'Abyssal dagger', 'Dragon scimitar')
+    assert search_index.search('abysal whip') == (None, [0])
+    assert search_index.search('xyz') == (None, [])
+    assert search_index.search('!!') == (None, [])
+
+def test_update_and_remove() -> None:
+    search_index: NameSearchIndex = index('Abyssal whip', 'Abyssal dagger')
+    search_index.add(0, 'Dragon dagger')
+    assert search_index.search('whip') == (None, [])
+    assert search_index.search('dagger') == (0, [1])
+
+    search_index.remove(0)
+    search_index.remove(0)
+    assert len(search_index) == 1
+    assert search_index.search('dagger') == (1, [])
+    assert search_index.search('dragon') == (None, [])
+    assert 'dra' not in search_index.postings